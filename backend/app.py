@@ -1,10 +1,16 @@
-from flask import Flask, jsonify
+from services.thread_config import configure_native_threads
+
+# Size OpenCV and BLAS thread pools for this worker before numpy loads them
+configure_native_threads()
+
+from flask import Flask, Response, jsonify
 from flask_cors import CORS
 from models.database import db_instance
 from dotenv import load_dotenv
 import os
 import json
 import numpy as np
+from services.logging_service import get_logger, configure_logging
 
 # Custom JSON encoder to handle numpy arrays
 class NumpyEncoder(json.JSONEncoder):
@@ -20,8 +26,11 @@ class NumpyEncoder(json.JSONEncoder):
 # Load environment variables
 load_dotenv()
 
+logger = get_logger(__name__)
+
 def create_app():
     """Create Flask application"""
+    configure_logging()
     app = Flask(__name__)
     
     # Configuration
@@ -38,14 +47,19 @@ def create_app():
     # Import flexible routes only
     try:
         from routes.api_routes_flexible import api
-        print("Using flexible API routes with automatic face recognition method detection")
+        logger.info("Using flexible API routes with automatic face recognition method detection")
     except ImportError:
-        print("ERROR: Could not import flexible API routes")
+        logger.error("Could not import flexible API routes")
         return None
     
     # Register blueprints
     app.register_blueprint(api, url_prefix='/api')
     
+    # Warm up the database, face model and gallery in the background; /api/ready reports progress
+    if os.getenv('WARMUP_ON_START', 'true').lower() == 'true':
+        from routes.api_routes_flexible import start_warm_up
+        start_warm_up()
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
@@ -63,6 +77,12 @@ def create_app():
     def internal_error(error):
         return jsonify({'error': 'Internal server error'}), 500
     
+    # Prometheus scrape endpoint
+    @app.route('/metrics')
+    def prometheus_metrics():
+        from services.metrics import registry
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+    
     # Root endpoint
     @app.route('/')
     def index():
@@ -74,30 +94,43 @@ def create_app():
                 'detect': '/api/detect (POST)',
                 'users': '/api/users (GET)',
                 'user': '/api/user/<user_id> (GET, DELETE)',
+                'registration_status': '/api/user/<user_id>/status (GET)',
+                'verify': '/api/user/<user_id>/verify (POST)',
+                'match': '/api/match (POST)',
+                'templates': '/api/user/<user_id>/templates (GET, POST)',
+                'import': '/api/import (POST), /api/import/<job_id> (GET)',
                 'health': '/api/health (GET)',
+                'ready': '/api/ready (GET)',
+                'metrics': '/metrics (GET)',
                 'info': '/api/info (GET)'
             }
         })
     
     return app
 
+def create_asgi_app():
+    """Create the ASGI application (e.g. uvicorn app:create_asgi_app --factory)"""
+    app = create_app()
+    if app is None:
+        return None
+    from routes.async_routes import AsyncApp
+    return AsyncApp(app)
+
 def main():
     """Main function to run the application"""
     try:
-        # Test database connection
-        db = db_instance.get_database()
-        print("Database connection successful")
-        
-        # Create Flask app
+        # Create Flask app (MongoDB and the face model are connected/loaded in the background)
         app = create_app()
         
         # Get port from environment or use default
         port = int(os.getenv('PORT', 5000))
         debug = os.getenv('FLASK_ENV') == 'development'
         
-        print(f"Starting Face Detection API on port {port}")
-        print(f"Debug mode: {debug}")
-        print(f"Upload folder: {app.config['UPLOAD_FOLDER']}")
+        logger.info("Starting Face Detection API", extra={
+            'port': port,
+            'debug': debug,
+            'upload_folder': app.config['UPLOAD_FOLDER']
+        })
         
         # Run the application
         app.run(
@@ -107,12 +140,14 @@ def main():
         )
         
     except Exception as e:
-        print(f"Error starting application: {e}")
+        logger.error("Error starting application: %s", e)
         return 1
     
     finally:
-        # Close database connection on shutdown
+        # Write buffered recognition events, then close the database connection on shutdown
         try:
+            from routes.api_routes_flexible import recognition_events
+            recognition_events.close()
             db_instance.close_connection()
         except:
             pass
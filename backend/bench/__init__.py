@@ -0,0 +1,14 @@
+"""
+Offline microbenchmarks for the hot paths of the Face Detection Backend.
+
+Run from the repository root with ``python -m backend.bench``. The backend
+directory is put on sys.path so the suite imports services and models the
+same way app.py does.
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
@@ -0,0 +1,87 @@
+"""
+Usage:
+    python -m backend.bench [--gallery-sizes 1000,10000,100000,1000000] [--images DIR]
+                            [--filter NAME] [--output FILE] [--save-baseline] [--baseline FILE]
+
+Times detect_faces_opencv, extract_face_encoding, compare_faces(_opencv),
+find_best_match, the vectorised gallery match and the User serialisation
+helpers on synthetic images and galleries, and prints a JSON report. When a
+baseline exists, cases slower than it by more than --threshold are flagged
+and the exit status is 1.
+"""
+
+import argparse
+import json
+import os
+import sys
+from backend.bench import BACKEND_DIR
+from backend.bench.suite import DEFAULT_GALLERY_SIZES, run_suite, compare_to_baseline
+from services.face_service_loader import create_face_service
+
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, 'bench', 'baseline.json')
+
+def main():
+    """Run the microbenchmark suite from the command line"""
+    parser = argparse.ArgumentParser(prog='python -m backend.bench', description='Microbenchmarks for the face pipeline')
+    parser.add_argument('--gallery-sizes', default=','.join(str(size) for size in DEFAULT_GALLERY_SIZES),
+                        help='Comma-separated gallery sizes (up to 1000000)')
+    parser.add_argument('--images', default=None, help='Directory of real photos to use instead of synthetic images')
+    parser.add_argument('--filter', default=None, help='Only run cases whose name contains this text')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case')
+    parser.add_argument('--min-seconds', type=float, default=0.2, help='Minimum duration of one timed run')
+    parser.add_argument('--output', default=None, help='Write the JSON report to this file instead of stdout')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline report to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed slowdown before flagging (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    face_service, method = create_face_service()
+    if face_service is None:
+        print("❌ No face recognition service available", file=sys.stderr)
+        return 1
+
+    def progress(name, result):
+        print(f"  {name:<45} {result['median_seconds'] * 1000:>10.3f} ms", file=sys.stderr)
+
+    print(f"🚀 Running benchmarks with {method} recognition...", file=sys.stderr)
+    report = run_suite(
+        face_service,
+        method,
+        gallery_sizes=[int(size) for size in args.gallery_sizes.split(',') if size],
+        image_dir=args.images,
+        case_filter=args.filter,
+        repeat=args.repeat,
+        min_seconds=args.min_seconds,
+        progress=progress
+    )
+
+    exit_code = 0
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Baseline saved to {args.baseline}", file=sys.stderr)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        comparison = compare_to_baseline(report, baseline, args.threshold)
+        report['comparison'] = comparison
+        regressions = [row for row in comparison if row['regressed']]
+        if baseline.get('environment', {}).get('method') != method:
+            print("⚠️  Baseline was recorded with a different recognition method", file=sys.stderr)
+        for row in regressions:
+            print(f"❌ {row['case']}: {row['ratio']:.2f}x baseline", file=sys.stderr)
+        if regressions:
+            exit_code = 1
+        else:
+            print(f"✅ No regressions against {args.baseline}", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    return exit_code
+
+if __name__ == '__main__':
+    sys.exit(main())
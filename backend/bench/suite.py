@@ -0,0 +1,213 @@
+"""
+Benchmark cases and the timing harness behind ``python -m backend.bench``.
+
+Every case is a zero-argument callable timed with an auto-calibrated loop;
+results report seconds per call so runs on different machines, or before
+and after a change, can be compared case by case.
+"""
+
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime
+import cv2
+import numpy as np
+from models.user import User
+
+IMAGE_SIZES = [(640, 480), (1280, 720), (1920, 1080)]
+DEFAULT_GALLERY_SIZES = [1000, 10000, 100000]
+# The per-encoding Python loops of compare_faces/find_best_match get too slow beyond this
+LEGACY_MAX_GALLERY = 100000
+
+def time_case(function, repeat=5, min_seconds=0.2):
+    """Time function; returns per-call seconds (min, median, max) over repeat calibrated runs"""
+    # Calibrate the loop count so each run takes at least min_seconds
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds or number >= 1 << 20:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_seconds / elapsed) + 1))
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        samples.append((time.perf_counter() - started) / number)
+
+    return {
+        'min_seconds': min(samples),
+        'median_seconds': statistics.median(samples),
+        'max_seconds': max(samples),
+        'loops': number,
+        'repeat': repeat
+    }
+
+def synthetic_image(width, height, seed=0):
+    """Smooth gradients plus noise and a few blobs, so detectors and codecs do realistic work"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = (np.sin(x / 37.0) + np.cos(y / 23.0)) * 40 + 128
+    image = np.dstack([base + rng.normal(0, 12, (height, width)) for _ in range(3)])
+    for _ in range(6):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        axes = (int(rng.integers(20, width // 6)), int(rng.integers(20, height // 5)))
+        cv2.ellipse(image, center, axes, 0, 0, 360, [float(v) for v in rng.integers(40, 220, 3)], -1)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+def write_images(directory, sizes=IMAGE_SIZES):
+    """Write one synthetic JPEG per size; returns {label: path}"""
+    paths = {}
+    for index, (width, height) in enumerate(sizes):
+        path = os.path.join(directory, f"synthetic_{width}x{height}.jpg")
+        cv2.imwrite(path, synthetic_image(width, height, seed=index))
+        paths[f"{width}x{height}"] = path
+    return paths
+
+def collect_images(directory):
+    """Real photos from a directory; returns {file name: path}"""
+    return {
+        name: os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if name.lower().rsplit('.', 1)[-1] in ('jpg', 'jpeg', 'png')
+    }
+
+def synthetic_encoding(method, rng, face_region=True):
+    """
+    One random encoding in the format the given recognition method stores. Matching
+    reads only the histogram, so galleries leave out the 10 KB face_region.
+    """
+    if method == 'advanced':
+        return rng.normal(0, 0.1, 128)
+    histogram = rng.random(256).astype(np.float32)
+    encoding = {
+        'histogram': histogram / histogram.sum(),
+        'coordinates': (10, 20, 100, 100)
+    }
+    if face_region:
+        encoding['face_region'] = rng.integers(0, 255, (100, 100), dtype=np.uint8)
+    return encoding
+
+def image_cases(face_service, images):
+    cases = {}
+    for label, path in images.items():
+        cases[f"detect_faces_opencv[{label}]"] = lambda path=path: face_service.detect_faces_opencv(path)
+        cases[f"extract_face_encoding[{label}]"] = lambda path=path: face_service.extract_face_encoding(path)
+    return cases
+
+def gallery_cases(face_service, method, gallery_sizes):
+    rng = np.random.default_rng(42)
+    probe = synthetic_encoding(method, rng, face_region=False)
+    probe_matrix = face_service.encoding_vector(probe)[None, :]
+    compare = face_service.compare_faces if method == 'advanced' else face_service.compare_faces_opencv
+    cases = {}
+
+    for size in gallery_sizes:
+        if size <= LEGACY_MAX_GALLERY:
+            known = [synthetic_encoding(method, rng, face_region=False) for _ in range(size)]
+            names = [f"user_{i}" for i in range(size)]
+            cases[f"compare_faces[{size}]"] = lambda known=known: compare(known, probe)
+            # Tolerance 2.0 accepts every candidate so the best-match scan always runs to completion
+            cases[f"find_best_match[{size}]"] = (
+                lambda known=known, names=names: face_service.find_best_match(known, probe, names, 2.0)
+            )
+            gallery = np.vstack([face_service.encoding_vector(encoding) for encoding in known])
+            del known
+        else:
+            # Build large galleries directly as a matrix; per-encoding objects would not fit in memory
+            dims = probe_matrix.shape[1]
+            gallery = rng.normal(0, 0.1, (size, dims)) if method == 'advanced' else rng.random((size, dims))
+
+        # The vectorised path GalleryService.match uses: one distance matrix and an argmin
+        cases[f"gallery_match[{size}]"] = (
+            lambda gallery=gallery: np.argmin(face_service.distance_matrix(probe_matrix, gallery), axis=1)
+        )
+    return cases
+
+def serialization_cases():
+    """User model helpers that run on every registration, gallery rebuild and user listing"""
+    user_model = User()
+    rng = np.random.default_rng(7)
+    advanced = synthetic_encoding('advanced', rng)
+    opencv = synthetic_encoding('opencv', rng)
+    stored_advanced = user_model._serialize_encoding(advanced)
+    stored_opencv = user_model._serialize_encoding(opencv)
+
+    def stored_user(encoding):
+        return {
+            'name': 'bench',
+            'face_encoding': encoding,
+            'face_templates': [{'encoding': encoding, 'image_path': 'x.jpg'} for _ in range(4)]
+        }
+
+    return {
+        'serialize_encoding[advanced]': lambda: user_model._serialize_encoding(advanced),
+        'serialize_encoding[opencv]': lambda: user_model._serialize_encoding(opencv),
+        'deserialize_encoding[advanced]': lambda: user_model._deserialize_encoding(stored_advanced),
+        'deserialize_encoding[opencv]': lambda: user_model._deserialize_encoding(stored_opencv),
+        'deserialize_user_encodings[advanced,5]': lambda: user_model._deserialize_user_encodings(stored_user(stored_advanced)),
+        'deserialize_user_encodings[opencv,5]': lambda: user_model._deserialize_user_encodings(stored_user(stored_opencv))
+    }
+
+def environment(method):
+    return {
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'method': method
+    }
+
+def run_suite(face_service, method, gallery_sizes=None, image_dir=None, case_filter=None,
+              repeat=5, min_seconds=0.2, progress=None):
+    """Run every case (optionally only those whose name contains case_filter); returns the report dict"""
+    gallery_sizes = gallery_sizes or DEFAULT_GALLERY_SIZES
+    results = {}
+
+    with tempfile.TemporaryDirectory(prefix='bench_') as directory:
+        images = collect_images(image_dir) if image_dir else write_images(directory)
+        groups = [
+            lambda: image_cases(face_service, images),
+            lambda: gallery_cases(face_service, method, gallery_sizes),
+            serialization_cases
+        ]
+        # Build each group only when it runs so large galleries are freed before the next one
+        for build in groups:
+            cases = build()
+            for name, function in cases.items():
+                if case_filter and case_filter not in name:
+                    continue
+                results[name] = time_case(function, repeat, min_seconds)
+                if progress is not None:
+                    progress(name, results[name])
+            del cases
+
+    return {'environment': environment(method), 'results': results}
+
+def compare_to_baseline(report, baseline, threshold=0.2):
+    """
+    Compare median per-call times with a baseline report.
+    Returns one row per shared case with the ratio and whether it regressed by more than threshold.
+    """
+    rows = []
+    for name, result in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or not previous.get('median_seconds'):
+            continue
+        ratio = result['median_seconds'] / previous['median_seconds']
+        rows.append({
+            'case': name,
+            'baseline_seconds': previous['median_seconds'],
+            'current_seconds': result['median_seconds'],
+            'ratio': round(ratio, 3),
+            'regressed': ratio > 1 + threshold
+        })
+    return rows
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Speed/accuracy benchmark of the pipeline profiles for Face Detection Backend
+
+Usage:
+    python benchmark_profiles.py <directory | manifest.csv | archive.zip> [--profiles fast,balanced,accurate] [--json]
+
+Uses the same labelled layouts as import_users.py. The first photo of each person
+is enrolled with the default encoder; every further photo is a probe that runs
+detection, encoding and matching under each profile. People with a single photo
+only act as distractors in the gallery.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from services.face_service_loader import create_face_service
+from services.file_service import FileService
+from services.import_service import ImportService
+from services.profile_service import ProfileService
+
+def build_gallery(face_service, entries):
+    """Enroll the first photo of each person; returns (names, gallery matrix)"""
+    names = []
+    vectors = []
+    for name, paths in entries.items():
+        vector = face_service.encoding_vector(face_service.extract_face_encoding(paths[0]))
+        if vector is not None:
+            names.append(name)
+            vectors.append(vector)
+    return names, np.vstack(vectors) if vectors else None
+
+def run_profile(face_service, profile_service, profile_name, entries, names, gallery):
+    """Run every probe photo through one profile and collect latency and accuracy"""
+    _, profile = profile_service.resolve(profile_name)
+    options = profile_service.pipeline_options(profile)
+    tolerance = profile_service.tolerance(profile, face_service.METHOD)
+    if tolerance is None:
+        tolerance = face_service.DEFAULT_TOLERANCE
+
+    latencies = []
+    result = {'profile': profile_name, 'probes': 0, 'detected': 0, 'correct': 0, 'wrong': 0, 'rejected': 0}
+    for name, paths in entries.items():
+        for path in paths[1:]:
+            started = time.perf_counter()
+            faces = face_service.extract_face_encodings(path, options)
+            best = None
+            if faces and gallery is not None:
+                probe = face_service.encoding_vector(faces[0]['encoding'])
+                if probe is not None:
+                    distances = face_service.distance_matrix(probe[None, :], gallery)[0]
+                    index = int(np.argmin(distances))
+                    if distances[index] <= tolerance:
+                        best = names[index]
+            latencies.append(time.perf_counter() - started)
+
+            result['probes'] += 1
+            result['detected'] += 1 if faces else 0
+            if best is None:
+                result['rejected'] += 1
+            elif best == name:
+                result['correct'] += 1
+            else:
+                result['wrong'] += 1
+
+    probes = result['probes']
+    result['accuracy'] = round(result['correct'] / probes, 4) if probes else 0.0
+    result['false_match_rate'] = round(result['wrong'] / probes, 4) if probes else 0.0
+    result['mean_ms'] = round(float(np.mean(latencies)) * 1000, 1) if latencies else 0.0
+    result['p50_ms'] = round(float(np.percentile(latencies, 50)) * 1000, 1) if latencies else 0.0
+    result['p95_ms'] = round(float(np.percentile(latencies, 95)) * 1000, 1) if latencies else 0.0
+    return result
+
+def main():
+    """Benchmark each pipeline profile from the command line"""
+    parser = argparse.ArgumentParser(description='Report latency and accuracy of each pipeline profile')
+    parser.add_argument('source', help='Directory, CSV manifest or zip archive of labelled photos')
+    parser.add_argument('--profiles', default=','.join(Config.PIPELINE_PROFILES), help='Comma-separated profiles to run')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"❌ Source not found: {args.source}")
+        return 1
+
+    face_service, method = create_face_service()
+    profile_service = ProfileService()
+    entries, staging_dir = ImportService(None, FileService()).collect_entries(args.source)
+    try:
+        names, gallery = build_gallery(face_service, entries)
+        if not args.json:
+            print(f"🚀 Benchmarking with {method} recognition: {len(names)} enrolled users")
+
+        results = [
+            run_profile(face_service, profile_service, profile_name.strip(), entries, names, gallery)
+            for profile_name in args.profiles.split(',')
+        ]
+    finally:
+        if staging_dir:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({'method': method, 'enrolled': len(names), 'results': results}, indent=2))
+        return 0
+
+    print(f"{'profile':<10} {'probes':>6} {'accuracy':>9} {'false':>7} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for result in results:
+        print(f"{result['profile']:<10} {result['probes']:>6} {result['accuracy']:>9.2%} "
+              f"{result['false_match_rate']:>7.2%} {result['mean_ms']:>8} {result['p50_ms']:>8} {result['p95_ms']:>8}")
+    return 0
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,101 @@
+"""
+Configuration settings for Face Detection Backend
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class Config:
+    """Base configuration"""
+    SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
+    
+    # Database settings
+    MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+    DATABASE_NAME = os.getenv('DATABASE_NAME', 'facedetection')
+    
+    # File upload settings
+    UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+    ALLOWED_EXTENSIONS = set(os.getenv('ALLOWED_EXTENSIONS', 'png,jpg,jpeg,gif').split(','))
+    
+    # Face recognition settings
+    FACE_RECOGNITION_TOLERANCE = float(os.getenv('FACE_RECOGNITION_TOLERANCE', '0.6'))
+    OPENCV_RECOGNITION_TOLERANCE = float(os.getenv('OPENCV_RECOGNITION_TOLERANCE', '0.5'))
+
+    # Speed/accuracy pipeline profiles, selectable per request or per tenant.
+    #   cascade_passes  Haar cascade fallback passes tried (of 4; opencv method)
+    #   max_dimension   downscale longest image side before detection (None = full size)
+    #   detection_model face_recognition detector: 'hog' (CPU) or 'cnn'
+    #   upsample        face_recognition upsampling passes (finds smaller faces, slower)
+    #   landmark_model  'small' (5 points) or 'large' (68 points) for encoding alignment; keep it
+    #                   'small' like enrollment, or probes are not comparable with the gallery
+    #   num_jitters     re-samples averaged per encoding
+    #   tolerance       max match distance per recognition method (lower is stricter)
+    PIPELINE_PROFILES = {
+        'fast': {
+            'cascade_passes': 1,
+            'max_dimension': 640,
+            'detection_model': 'hog',
+            'upsample': 0,
+            'landmark_model': 'small',
+            'num_jitters': 1,
+            'tolerance': {'advanced': FACE_RECOGNITION_TOLERANCE, 'opencv': OPENCV_RECOGNITION_TOLERANCE}
+        },
+        # The default: full-resolution detection, so small or distant faces are still found
+        'balanced': {
+            'cascade_passes': 4,
+            'max_dimension': None,
+            'detection_model': 'hog',
+            'upsample': 1,
+            'landmark_model': 'small',
+            'num_jitters': 1,
+            'tolerance': {'advanced': FACE_RECOGNITION_TOLERANCE, 'opencv': OPENCV_RECOGNITION_TOLERANCE}
+        },
+        'accurate': {
+            'cascade_passes': 4,
+            'max_dimension': None,
+            'detection_model': 'cnn',
+            'upsample': 2,
+            'landmark_model': 'small',
+            'num_jitters': 5,
+            'tolerance': {'advanced': FACE_RECOGNITION_TOLERANCE - 0.1, 'opencv': OPENCV_RECOGNITION_TOLERANCE - 0.1}
+        }
+    }
+    DEFAULT_PIPELINE_PROFILE = os.getenv('PIPELINE_PROFILE', 'balanced')
+    # Per-tenant defaults as "tenant:profile,tenant:profile"
+    TENANT_PIPELINE_PROFILES = dict(
+        entry.split(':', 1)
+        for entry in os.getenv('TENANT_PIPELINE_PROFILES', '').split(',')
+        if ':' in entry
+    )
+
+    # Server settings
+    HOST = os.getenv('HOST', '0.0.0.0')
+    PORT = int(os.getenv('PORT', 5000))
+    DEBUG = os.getenv('FLASK_ENV') == 'development'
+
+class DevelopmentConfig(Config):
+    """Development configuration"""
+    DEBUG = True
+    TESTING = False
+
+class ProductionConfig(Config):
+    """Production configuration"""
+    DEBUG = False
+    TESTING = False
+
+class TestingConfig(Config):
+    """Testing configuration"""
+    DEBUG = True
+    TESTING = True
+    DATABASE_NAME = 'facedetection_test'
+
+# Configuration dictionary
+config = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+    'default': DevelopmentConfig
+}
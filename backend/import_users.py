@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Bulk enrollment importer for Face Detection Backend
+
+Usage:
+    python import_users.py <directory | manifest.csv | archive.zip> [--workers N] [--checkpoint FILE]
+
+Sources:
+    directory     one sub-folder per person (<dir>/<name>/*.jpg) or one photo per person (<dir>/<name>.jpg)
+    manifest.csv  CSV with 'name' and 'path' columns (paths relative to the CSV)
+    archive.zip   a zip of either of the above
+
+The first photo of each person becomes the registration photo, further photos
+become enrollment templates. Re-running the same command resumes an interrupted import.
+"""
+
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import User
+from services.file_service import FileService
+from services.import_service import ImportService
+
+def main():
+    """Run a bulk import from the command line"""
+    parser = argparse.ArgumentParser(description='Bulk-enroll users from labelled photos')
+    parser.add_argument('source', help='Directory, CSV manifest or zip archive')
+    parser.add_argument('--workers', type=int, default=None, help='Encoding processes (default: CPU count)')
+    parser.add_argument('--checkpoint', default=None, help='Checkpoint file (default: <source>.checkpoint.jsonl)')
+    parser.add_argument('--batch-size', type=int, default=None, help='Users per insert_many batch')
+    parser.add_argument('--tenant', default=None, help='Tenant to enroll the users into')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"❌ Source not found: {args.source}")
+        return 1
+
+    import_service = ImportService(User(), FileService())
+    if args.batch_size:
+        import_service.batch_size = args.batch_size
+
+    progress = {}
+    started = time.time()
+    print(f"🚀 Importing users from {args.source}...")
+
+    summary = import_service.run_import(
+        args.source,
+        checkpoint_path=args.checkpoint,
+        workers=args.workers,
+        progress=progress,
+        tenant=args.tenant
+    )
+
+    elapsed = time.time() - started
+    print(f"✅ Imported {summary['imported']} of {summary['total']} users in {elapsed:.1f}s")
+    print(f"   Skipped (already imported or registered): {summary['skipped']}")
+    print(f"   Failed: {summary['failed']}")
+    for error in summary['errors'][:10]:
+        print(f"   - {error['name']}: {error['error']}")
+
+    return 0
+
+if __name__ == '__main__':
+    exit(main())
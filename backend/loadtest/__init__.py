@@ -0,0 +1,14 @@
+"""
+Local load-testing harness for the Face Detection Backend.
+
+Run from the repository root with ``python -m backend.loadtest``. The backend
+directory is put on sys.path so the app can be driven in-process through
+create_app() exactly as app.py builds it.
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
@@ -0,0 +1,89 @@
+"""
+Usage:
+    python -m backend.loadtest [--url http://localhost:5000] [--fake-db]
+                               [--mix register=1,detect=8,users=1] [--concurrency 8]
+                               [--duration 30 | --requests 500] [--images DIR] [--output FILE]
+
+Without --url the app is built in-process with create_app() and driven through
+Flask's test client; --fake-db then swaps MongoDB for an in-memory mongomock
+client (pip install mongomock). With --url a running server is driven over
+HTTP. Prints throughput, latency percentiles, error rate and memory growth.
+"""
+
+import argparse
+import json
+import sys
+from backend.loadtest.harness import (
+    HttpClient, InProcessClient, LoadTest, MemorySampler, build_app, distinct_images, load_images, parse_mix,
+    wait_until_ready
+)
+
+def main():
+    """Run a load test from the command line"""
+    parser = argparse.ArgumentParser(prog='python -m backend.loadtest', description='Local load test for the face API')
+    parser.add_argument('--url', default=None, help='Base URL of a running server (default: drive create_app() in-process)')
+    parser.add_argument('--fake-db', action='store_true', help='In-process only: use an in-memory MongoDB stand-in')
+    parser.add_argument('--mix', default='register=1,detect=8,users=1', help='Weighted operations')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent workers')
+    parser.add_argument('--duration', type=float, default=None, help='Seconds to run (default 30 unless --requests)')
+    parser.add_argument('--requests', type=int, default=None, help='Total requests to issue')
+    parser.add_argument('--images', default=None, help='Directory of photos to upload (default: synthetic images)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for the operation mix')
+    parser.add_argument('--keep-users', action='store_true', help='Do not delete users registered during the run')
+    parser.add_argument('--output', default=None, help='Write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    duration = args.duration if args.duration or args.requests else 30
+
+    if args.url:
+        client = HttpClient(args.url)
+    else:
+        app = build_app(args.fake_db)
+        if app is None:
+            return 1
+        client = InProcessClient(app)
+
+    print("⏳ Waiting for the app to be ready...", file=sys.stderr)
+    if not wait_until_ready(client):
+        print("❌ App did not become ready (is MongoDB running? try --fake-db)", file=sys.stderr)
+        return 1
+
+    images = load_images(args.images)
+    if not images:
+        print("❌ No images to upload", file=sys.stderr)
+        return 1
+
+    register_images = None if args.images else distinct_images()
+    load_test = LoadTest(client, mix, images, args.concurrency, duration, args.requests, args.seed, register_images)
+    sampler = MemorySampler(client, in_process=args.url is None)
+    print(f"🚀 Running {args.mix} with {args.concurrency} workers...", file=sys.stderr)
+    sampler.start()
+    elapsed = load_test.run()
+    sampler.stop()
+
+    report = load_test.report(elapsed, sampler.report())
+    report['target'] = args.url or ('in-process (mongomock)' if args.fake_db else 'in-process')
+    if not args.keep_users:
+        load_test.cleanup()
+
+    print(f"✅ {report['requests']} requests in {report['elapsed_seconds']}s: "
+          f"{report['throughput_rps']} req/s, p95 {report['p95_ms']} ms, error rate {report['error_rate']:.2%}",
+          file=sys.stderr)
+    if report['memory']:
+        print(f"   Memory growth: {report['memory']['growth_bytes'] / 1e6:.1f} MB", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""
+Clients, workload and reporting behind ``python -m backend.loadtest``.
+
+The same workload runs either in-process against create_app() through Flask's
+test client, or over HTTP against a server on localhost. Each worker thread
+picks operations by weight from the configured mix and records the latency
+and status of every call.
+"""
+
+import io
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import urllib.error
+import urllib.request
+import cv2
+import numpy as np
+
+OPERATIONS = ('register', 'detect', 'users')
+
+def parse_mix(text):
+    """Parse "register=1,detect=8,users=1" into {operation: weight}"""
+    mix = {}
+    for entry in text.split(','):
+        if not entry.strip():
+            continue
+        name, _, weight = entry.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}', expected one of: {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError('The mix needs at least one operation with a positive weight')
+    return mix
+
+def distinct_images(size=(640, 480)):
+    """
+    Endless synthetic JPEGs that are pairwise distinct under the duplicate-photo hash,
+    so registering them is never rejected as a duplicate photo
+    """
+    from backend.bench.suite import synthetic_image
+    from services.image_hash_service import ImageHashService
+    hash_service = ImageHashService()
+    hashes = []
+    seed = 0
+    while True:
+        rng = np.random.default_rng(seed)
+        # A random coarse layout dominates the 9x8 difference hash; the texture only varies the detail
+        layout = cv2.resize(rng.integers(0, 256, (8, 9)).astype(np.uint8), size, interpolation=cv2.INTER_NEAREST)
+        image = cv2.addWeighted(synthetic_image(size[0], size[1], seed=seed), 0.4,
+                                cv2.cvtColor(layout, cv2.COLOR_GRAY2BGR), 0.6, 0)
+        seed += 1
+        ok, buffer = cv2.imencode('.jpg', image)
+        if not ok:
+            continue
+        image_hash = hash_service.compute_dhash(cv2.imdecode(buffer, cv2.IMREAD_COLOR))
+        if any(hash_service.hamming_distance(image_hash, other) <= hash_service.max_distance for other in hashes):
+            continue
+        hashes.append(image_hash)
+        yield f"synthetic_{seed - 1}.jpg", buffer.tobytes()
+
+def load_images(directory=None, count=32, size=(640, 480)):
+    """Encoded photos to upload: real ones from directory, else distinct synthetic images"""
+    if directory:
+        paths = [
+            os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.lower().rsplit('.', 1)[-1] in ('jpg', 'jpeg', 'png')
+        ]
+        return [(os.path.basename(path), open(path, 'rb').read()) for path in paths]
+    return list(itertools.islice(distinct_images(size), count))
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+class InProcessClient:
+    """Calls the Flask app directly through one test client per thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.app.test_client()
+        return self._local.client
+
+    def request(self, method, path, fields=None, files=None, headers=None):
+        data = dict(fields or {})
+        for name, (filename, content) in (files or {}).items():
+            data[name] = (io.BytesIO(content), filename)
+        response = self._client().open(path, method=method, data=data or None, headers=headers,
+                                       content_type='multipart/form-data' if files else None)
+        return response.status_code, response.get_json(silent=True)
+
+    def get_text(self, path):
+        return self._client().get(path).get_data(as_text=True)
+
+class HttpClient:
+    """Calls a running server over HTTP with the standard library only"""
+
+    def __init__(self, base_url, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _multipart(self, fields, files):
+        boundary = uuid.uuid4().hex
+        parts = []
+        for name, value in (fields or {}).items():
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+        for name, (filename, content) in (files or {}).items():
+            parts.append(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                f'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b'\r\n'
+            )
+        parts.append(f'--{boundary}--\r\n'.encode())
+        return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+    def request(self, method, path, fields=None, files=None, headers=None):
+        body = None
+        headers = dict(headers or {})
+        if fields or files:
+            body, headers['Content-Type'] = self._multipart(fields, files)
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            payload = e.read()
+            status = e.code
+        try:
+            return status, json.loads(payload)
+        except ValueError:
+            return status, None
+
+    def get_text(self, path):
+        with urllib.request.urlopen(self.base_url + path, timeout=self.timeout) as response:
+            return response.read().decode('utf-8')
+
+def build_app(fake_db):
+    """Create the app in this process; uploads go to a temporary folder"""
+    os.environ.setdefault('UPLOAD_FOLDER', tempfile.mkdtemp(prefix='loadtest_uploads_'))
+    if fake_db:
+        try:
+            import mongomock
+        except ImportError:
+            print("❌ --fake-db needs mongomock (pip install mongomock)", file=sys.stderr)
+            return None
+        import models.database
+        models.database.MongoClient = mongomock.MongoClient
+
+    from app import create_app
+    app = create_app()
+    if app is not None:
+        app.testing = True
+    return app
+
+def wait_until_ready(client, timeout=120):
+    """Poll /api/ready until the app has warmed up; returns True when ready"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, _ = client.request('GET', '/api/ready')
+            if status == 200:
+                return True
+        except Exception:
+            pass
+        time.sleep(0.5)
+    return False
+
+class MemorySampler:
+    """Samples resident memory of the app in the background (own process, or the server's /metrics)"""
+
+    def __init__(self, client, in_process, interval=0.5):
+        self.client = client
+        self.in_process = in_process
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        try:
+            if self.in_process:
+                from services.metrics import _resident_memory_bytes
+                return _resident_memory_bytes()
+            match = re.search(r'^facedetection_resident_memory_bytes (\S+)$', self.client.get_text('/metrics'), re.M)
+            return int(float(match.group(1))) if match else None
+        except Exception:
+            return None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            value = self.sample()
+            if value is not None:
+                self.samples.append(value)
+
+    def start(self):
+        value = self.sample()
+        if value is not None:
+            self.samples.append(value)
+        self._thread = threading.Thread(target=self._run, name='memory-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        value = self.sample()
+        if value is not None:
+            self.samples.append(value)
+
+    def report(self):
+        if not self.samples:
+            return None
+        return {
+            'start_bytes': self.samples[0],
+            'end_bytes': self.samples[-1],
+            'peak_bytes': max(self.samples),
+            'growth_bytes': self.samples[-1] - self.samples[0]
+        }
+
+class LoadTest:
+    """Drive a weighted mix of operations from concurrent workers and collect per-call results"""
+
+    def __init__(self, client, mix, images, concurrency=8, duration=None, total_requests=None, seed=None,
+                 register_images=None):
+        self.client = client
+        self.mix = mix
+        self.images = images
+        # Fresh photos for registrations; cycling through images re-registers the same photos (409)
+        self.register_images = register_images
+        self.concurrency = concurrency
+        self.duration = duration
+        self.total_requests = total_requests
+        self.random = random.Random(seed)
+        self.results = []
+        self.registered_ids = []
+        self._lock = threading.Lock()
+        self._issued = 0
+        self._image_index = 0
+
+    def _next_operation(self):
+        with self._lock:
+            if self.total_requests is not None and self._issued >= self.total_requests:
+                return None
+            self._issued += 1
+            return self.random.choices(list(self.mix), weights=list(self.mix.values()))[0]
+
+    def _next_image(self):
+        with self._lock:
+            if self.register_images is not None:
+                return next(self.register_images)
+            image = self.images[self._image_index % len(self.images)]
+            self._image_index += 1
+            return image
+
+    def _call(self, operation):
+        if operation == 'register':
+            filename, content = self._next_image()
+            return self.client.request('POST', '/api/register',
+                                       fields={'name': f"load_{uuid.uuid4().hex[:12]}"},
+                                       files={'photo': (filename, content)})
+        if operation == 'detect':
+            filename, content = self.images[self.random.randrange(len(self.images))]
+            return self.client.request('POST', '/api/detect', files={'photo': (filename, content)})
+        return self.client.request('GET', '/api/users')
+
+    def _worker(self, stop_at):
+        while stop_at is None or time.monotonic() < stop_at:
+            operation = self._next_operation()
+            if operation is None:
+                return
+            started = time.perf_counter()
+            status, body, error = None, None, None
+            try:
+                status, body = self._call(operation)
+            except Exception as e:
+                error = str(e)
+            latency = time.perf_counter() - started
+
+            with self._lock:
+                self.results.append((operation, latency, status, error))
+                if operation == 'register' and status == 201 and body:
+                    self.registered_ids.append(body.get('user_id'))
+
+    def run(self):
+        """Run the workload; returns elapsed seconds"""
+        stop_at = time.monotonic() + self.duration if self.duration else None
+        started = time.perf_counter()
+        workers = [
+            threading.Thread(target=self._worker, args=(stop_at,), name=f"load-{i}")
+            for i in range(self.concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - started
+
+    def report(self, elapsed, memory=None):
+        """
+        Throughput, latency percentiles, status counts and error rate, overall and per operation.
+        A register answered with 409 (duplicate name or photo) did not register anyone and counts
+        as an error; such conflicts are also reported on their own.
+        """
+        def failed(operation, status, error):
+            return bool(error) or status is None or status >= 500 or (operation == 'register' and status == 409)
+
+        def summarize(results):
+            latencies = [latency for _, latency, _, _ in results]
+            errors = sum(1 for operation, _, status, error in results if failed(operation, status, error))
+            statuses = {}
+            for _, _, status, error in results:
+                key = str(status) if status is not None else 'exception'
+                statuses[key] = statuses.get(key, 0) + 1
+            return {
+                'requests': len(results),
+                'throughput_rps': round(len(results) / elapsed, 2) if elapsed else 0.0,
+                'error_rate': round(errors / len(results), 4) if results else 0.0,
+                'conflicts': statuses.get('409', 0),
+                'status_counts': statuses,
+                'mean_ms': round(float(np.mean(latencies)) * 1000, 2) if latencies else 0.0,
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+                'max_ms': round(max(latencies) * 1000, 2) if latencies else 0.0
+            }
+
+        report = summarize(self.results)
+        report['elapsed_seconds'] = round(elapsed, 2)
+        report['concurrency'] = self.concurrency
+        report['mix'] = self.mix
+        report['operations'] = {
+            operation: summarize([result for result in self.results if result[0] == operation])
+            for operation in self.mix
+        }
+        report['memory'] = memory
+        sample_errors = [error for _, _, _, error in self.results if error][:5]
+        if sample_errors:
+            report['sample_errors'] = sample_errors
+        return report
+
+    def cleanup(self):
+        """Delete the users this run registered"""
+        for user_id in self.registered_ids:
+            try:
+                self.client.request('DELETE', f'/api/user/{user_id}')
+            except Exception:
+                pass
@@ -0,0 +1,184 @@
+"""
+Usage:
+    python -m backend.loadtest.replay <capture_dir> [--url http://localhost:5000] [--fake-db]
+                                      [--speed 1.0] [--concurrency 16] [--output FILE]
+
+Replays requests recorded by the opt-in request capture (CAPTURE_ENABLED or
+POST /api/admin/capture) against this version of the app, in-process or over
+HTTP, at the original pacing scaled by --speed (0 = as fast as possible).
+Only captures with consented image bytes can be replayed. Reports captured
+versus replayed latency and every request whose status or result changed.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from backend.loadtest.harness import HttpClient, InProcessClient, build_app, percentile, wait_until_ready
+from services.capture_service import summarize_result
+
+def load_captures(capture_dir):
+    """All capture records in time order"""
+    records = []
+    for path in sorted(glob.glob(os.path.join(capture_dir, '*.jsonl'))):
+        with open(path, encoding='utf-8') as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return sorted(records, key=lambda record: record['timestamp'])
+
+class Replayer:
+    """Send captured requests with their original pacing and compare the outcomes"""
+
+    def __init__(self, client, capture_dir, speed=1.0, concurrency=16):
+        self.client = client
+        self.capture_dir = capture_dir
+        self.speed = speed
+        self.concurrency = concurrency
+        self.results = []
+        self.registered_ids = []
+        self.replay_names = {}
+        self._lock = threading.Lock()
+
+    def _send(self, record):
+        with open(os.path.join(self.capture_dir, record['image_file']), 'rb') as f:
+            photo = (os.path.basename(record['image_file']), f.read())
+
+        fields = {name: value for name, value in record.get('fields', {}).items() if name != 'name'}
+        if record['endpoint'].endswith('/register'):
+            # Register under a throwaway name so replays never collide with real users
+            fields['name'] = f"replay_{record['capture_id'][:12]}"
+            self.replay_names[fields['name']] = record.get('fields', {}).get('name')
+
+        started = time.perf_counter()
+        status, body, error = None, None, None
+        try:
+            status, body = self.client.request(record['method'], record['endpoint'], fields=fields,
+                                               files={'photo': photo}, headers=record.get('headers'))
+        except Exception as e:
+            error = str(e)
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            self.results.append((record, status, summarize_result(record['endpoint'], body, include_names=True), latency_ms, error))
+            if status == 201 and body:
+                self.registered_ids.append(body.get('user_id'))
+
+    def run(self, records):
+        """Replay records; returns elapsed seconds"""
+        started = time.monotonic()
+        first = records[0]['timestamp'] if records else 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for record in records:
+                if self.speed > 0:
+                    delay = started + (record['timestamp'] - first) / self.speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                pool.submit(self._send, record)
+        return time.monotonic() - started
+
+    def report(self, elapsed, skipped):
+        changed = []
+        captured_latencies = []
+        replayed_latencies = []
+        for record, status, result, latency_ms, error in self.results:
+            captured_latencies.append(record['latency_ms'])
+            replayed_latencies.append(latency_ms)
+            # Register results carry new ids on every run; compare only whether they failed the same way
+            is_detect = record['endpoint'].endswith('/detect')
+            expected = record['result'] if is_detect else record['result'].get('error')
+            if is_detect:
+                # Faces matched to users this replay registered count under their captured names
+                result = dict(result, recognized=[self.replay_names.get(name, name) for name in result['recognized']])
+            actual = result if is_detect else result.get('error')
+            if error or status != record['status'] or expected != actual:
+                changed.append({
+                    'capture_id': record['capture_id'],
+                    'endpoint': record['endpoint'],
+                    'captured_status': record['status'],
+                    'replayed_status': status,
+                    'captured_result': record['result'],
+                    'replayed_result': result,
+                    'error': error
+                })
+
+        def latency(values):
+            return {
+                'p50_ms': round(percentile(values, 50), 2),
+                'p95_ms': round(percentile(values, 95), 2),
+                'p99_ms': round(percentile(values, 99), 2)
+            }
+
+        captured = latency(captured_latencies)
+        replayed = latency(replayed_latencies)
+        return {
+            'replayed': len(self.results),
+            'skipped_without_image': skipped,
+            'elapsed_seconds': round(elapsed, 2),
+            'speed': self.speed,
+            'latency': {
+                'captured': captured,
+                'replayed': replayed,
+                'delta_ms': {key: round(replayed[key] - captured[key], 2) for key in captured}
+            },
+            'changed': len(changed),
+            'changed_requests': changed[:50]
+        }
+
+    def cleanup(self):
+        """Delete the users this replay registered"""
+        for user_id in self.registered_ids:
+            try:
+                self.client.request('DELETE', f'/api/user/{user_id}')
+            except Exception:
+                pass
+
+def main():
+    """Replay captured traffic from the command line"""
+    parser = argparse.ArgumentParser(prog='python -m backend.loadtest.replay', description='Replay captured requests')
+    parser.add_argument('capture_dir', help='Capture directory (CAPTURE_DIR of the recording server)')
+    parser.add_argument('--url', default=None, help='Base URL of a running server (default: create_app() in-process)')
+    parser.add_argument('--fake-db', action='store_true', help='In-process only: use an in-memory MongoDB stand-in')
+    parser.add_argument('--speed', type=float, default=1.0, help='Pacing multiplier (2 = twice as fast, 0 = no pacing)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Maximum requests in flight')
+    parser.add_argument('--output', default=None, help='Write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    records = load_captures(args.capture_dir)
+    replayable = [record for record in records if record.get('image_file')]
+    if not replayable:
+        print(f"❌ No replayable captures (with consented images) in {args.capture_dir}", file=sys.stderr)
+        return 1
+
+    if args.url:
+        client = HttpClient(args.url)
+    else:
+        app = build_app(args.fake_db)
+        if app is None:
+            return 1
+        client = InProcessClient(app)
+    if not wait_until_ready(client):
+        print("❌ App did not become ready", file=sys.stderr)
+        return 1
+
+    replayer = Replayer(client, args.capture_dir, args.speed, args.concurrency)
+    print(f"🚀 Replaying {len(replayable)} of {len(records)} captured requests...", file=sys.stderr)
+    elapsed = replayer.run(replayable)
+    report = replayer.report(elapsed, len(records) - len(replayable))
+    replayer.cleanup()
+
+    print(f"✅ Replayed {report['replayed']} requests: p95 {report['latency']['captured']['p95_ms']} ms captured, "
+          f"{report['latency']['replayed']['p95_ms']} ms replayed; {report['changed']} changed", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
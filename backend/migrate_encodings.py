@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Re-encode stored faces for the active recognition method
+
+Usage:
+    python migrate_encodings.py [--workers N] [--checkpoint FILE] [--writes-per-second N]
+
+Run this after switching between the "advanced" (face_recognition) and "opencv"
+methods, or after bumping a service's ENCODING_VERSION. Users are re-encoded from
+their stored photos; re-running the command resumes an interrupted migration.
+Until it finishes the API re-encodes a bounded number of users lazily per gallery rebuild.
+"""
+
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import User
+from services.face_service_loader import create_face_service
+from services.migration_service import MigrationService
+
+def main():
+    """Run the re-encoding migration from the command line"""
+    parser = argparse.ArgumentParser(description='Re-encode stored faces for the active recognition method')
+    parser.add_argument('--workers', type=int, default=None, help='Encoding processes (default: CPU count)')
+    parser.add_argument('--checkpoint', default=None,
+                        help='Checkpoint file (default: encoding_migration.<method>-v<version>.checkpoint.jsonl)')
+    parser.add_argument('--writes-per-second', type=float, default=None, help='Throttle for MongoDB writes (0 = unlimited)')
+    args = parser.parse_args()
+
+    face_service, method = create_face_service()
+    if face_service is None:
+        print("❌ No face recognition service available")
+        return 1
+
+    migration_service = MigrationService(User(), face_service)
+    if args.writes_per_second is not None:
+        migration_service.writes_per_second = args.writes_per_second
+
+    started = time.time()
+    print(f"🚀 Re-encoding users for method '{method}'...")
+
+    summary = migration_service.run(checkpoint_path=args.checkpoint, workers=args.workers)
+
+    elapsed = time.time() - started
+    print(f"✅ Re-encoded {summary['migrated']} of {summary['total']} users in {elapsed:.1f}s")
+    print(f"   Failed: {summary['failed']}")
+    for error in summary['errors'][:10]:
+        print(f"   - {error['user_id']}: {error['error']}")
+
+    return 0
+
+if __name__ == '__main__':
+    exit(main())
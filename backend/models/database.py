@@ -0,0 +1,148 @@
+from pymongo import MongoClient, monitoring
+from services.metrics import mongo_seconds, record_timing
+from dotenv import load_dotenv
+import os
+import threading
+from services.logging_service import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Record the latency of every MongoDB command issued through the client"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_seconds.observe(event.duration_micros / 1e6, command=event.command_name, outcome='success')
+        record_timing('mongo', event.duration_micros / 1e6)
+
+    def failed(self, event):
+        mongo_seconds.observe(event.duration_micros / 1e6, command=event.command_name, outcome='failure')
+        record_timing('mongo', event.duration_micros / 1e6)
+
+class Database:
+    _instance = None
+    _client = None
+    _db = None
+    _lock = threading.Lock()
+    
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(Database, cls).__new__(cls)
+        return cls._instance
+    
+    def connect(self):
+        """Create the MongoDB client (connections are opened in the background, nothing blocks here)"""
+        try:
+            mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+            database_name = os.getenv('DATABASE_NAME', 'facedetection')
+            timeout_ms = int(os.getenv('MONGODB_TIMEOUT_MS', '5000'))
+            
+            self._client = MongoClient(
+                mongodb_uri,
+                serverSelectionTimeoutMS=timeout_ms,
+                event_listeners=[MongoCommandTimer()]
+            )
+            self._db = self._client[database_name]
+            
+        except Exception as e:
+            logger.warning("MongoDB client creation failed: %s", e)
+            # Don't raise the exception, let the app start anyway
+            self._client = None
+            self._db = None
+    
+    def ping(self):
+        """Check that MongoDB is reachable; blocks for at most the server selection timeout"""
+        try:
+            if self.get_database() is None:
+                return False
+            self._client.admin.command('ping')
+            logger.info("Connected to MongoDB database %s", self._db.name)
+            return True
+        except Exception as e:
+            logger.warning(
+                "MongoDB connection failed: %s. The app will run but database operations will fail "
+                "until MongoDB is reachable.", e
+            )
+            return False
+    
+    def get_database(self):
+        """Get the database instance"""
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    self.connect()
+        return self._db
+    
+    def get_collection(self, collection_name):
+        """Get a specific collection"""
+        db = self.get_database()
+        if db is None:
+            return None
+        return db[collection_name]
+    
+    def close_connection(self):
+        """Close the database connection"""
+        if self._client:
+            self._client.close()
+            logger.info("MongoDB connection closed")
+
+class AsyncDatabase:
+    """
+    MongoDB access for the ASGI entry point through an asyncio driver: PyMongo's
+    AsyncMongoClient (pymongo>=4.9) or Motor. Uses the same settings as Database.
+    """
+    
+    def __init__(self):
+        self._client = None
+        self._db = None
+    
+    def _client_class(self):
+        try:
+            from pymongo import AsyncMongoClient
+            return AsyncMongoClient
+        except ImportError:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            return AsyncIOMotorClient
+    
+    def connect(self):
+        """Create the async client; like Database.connect, nothing blocks and failures are logged"""
+        try:
+            client_class = self._client_class()
+            self._client = client_class(
+                os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'),
+                serverSelectionTimeoutMS=int(os.getenv('MONGODB_TIMEOUT_MS', '5000')),
+                event_listeners=[MongoCommandTimer()]
+            )
+            self._db = self._client[os.getenv('DATABASE_NAME', 'facedetection')]
+        except ImportError:
+            logger.warning("No async MongoDB driver available (pymongo>=4.9 or motor is required)")
+        except Exception as e:
+            logger.warning("Async MongoDB client creation failed: %s", e)
+            self._client = None
+            self._db = None
+    
+    def get_collection(self, collection_name):
+        """Get a specific collection (created on the running event loop on first use)"""
+        if self._db is None:
+            self.connect()
+        if self._db is None:
+            return None
+        return self._db[collection_name]
+    
+    async def close_connection(self):
+        """Close the async client"""
+        if self._client is not None:
+            result = self._client.close()
+            # AsyncMongoClient.close() is a coroutine, Motor's is not
+            if hasattr(result, '__await__'):
+                await result
+            self._client = None
+            self._db = None
+
+# Create a global database instance (connects lazily on first use)
+db_instance = Database()
+async_db_instance = AsyncDatabase()
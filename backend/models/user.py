@@ -0,0 +1,650 @@
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from datetime import datetime, timedelta
+from models.database import db_instance, async_db_instance
+import numpy as np
+import os
+import threading
+from services.logging_service import get_logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+class DuplicateUserError(Exception):
+    """Raised when a user with the same name is inserted concurrently or already exists in the tenant"""
+
+class User:
+    def __init__(self):
+        # Optional in-memory set of registered (tenant, name) pairs so taken names are rejected before any image work
+        self.name_cache_enabled = os.getenv('USER_NAME_CACHE', 'true').lower() == 'true'
+        self._names = None
+        self._names_lock = threading.Lock()
+    
+    @property
+    def collection(self):
+        """The users collection, resolved lazily so constructing User never touches MongoDB"""
+        return db_instance.get_collection('users')
+    
+    def ensure_indexes(self):
+        """Create the name, created_at and duplicate-photo indexes (called once at warm-up)"""
+        if self.collection is None:
+            return
+        try:
+            # Names used to be unique across tenants; that index would still block per-tenant names
+            if self.collection.index_information().get('name_1', {}).get('unique'):
+                self.collection.drop_index('name_1')
+        except Exception as e:
+            logger.error("Error dropping the old unique name index: %s", e)
+        indexes = [
+            # Unique so concurrent registrations of one name in a tenant cannot both succeed;
+            # also serves per-tenant gallery loads
+            ([('tenant', ASCENDING), ('name', ASCENDING)], {'unique': True}),
+            ('name', {}),
+            ('created_at', {}),
+            # Multikey index over the hash bands so near-duplicate candidates are an index scan
+            ('image_hash_bands', {}),
+            ('image_hash', {})
+        ]
+        for field, options in indexes:
+            try:
+                self.collection.create_index(field, **options)
+            except Exception as e:
+                # e.g. existing duplicate names; registration still works, just without the guarantee
+                logger.error("Error creating user index on %s: %s", field, e)
+    
+    def load_name_cache(self):
+        """Load every registered name into memory (called once at warm-up when the cache is enabled)"""
+        if not self.name_cache_enabled:
+            return
+        try:
+            names = {
+                (user.get('tenant'), user['name'])
+                for user in self.collection.find({}, {'name': 1, 'tenant': 1, '_id': 0}) if 'name' in user
+            }
+            with self._names_lock:
+                self._names = names
+            logger.info("Loaded %d user names into the name cache", len(names))
+        except Exception as e:
+            logger.error("Error loading user names: %s", e)
+    
+    def _remember_names(self, names, tenant=None):
+        if self._names is not None:
+            with self._names_lock:
+                self._names.update((tenant, name) for name in names)
+    
+    def _forget_name(self, name, tenant=None):
+        if self._names is not None:
+            with self._names_lock:
+                self._names.discard((tenant, name))
+    
+    def find_cached_name(self, name, tenant=None):
+        """
+        Return the user owning name in tenant if the in-memory cache knows it is taken, else None.
+        A hit is confirmed with one indexed lookup so names deleted by another process
+        do not stay blocked; a miss costs nothing and the unique index has the final say.
+        """
+        if self._names is None or (tenant, name) not in self._names:
+            return None
+        user = self.get_user_by_name(name, tenant)
+        if user is None:
+            self._forget_name(name, tenant)
+        return user
+    
+    def _serialize_dict_with_numpy(self, data):
+        """Recursively convert numpy arrays in dictionaries to lists for MongoDB storage"""
+        if isinstance(data, dict):
+            return {key: self._serialize_dict_with_numpy(value) for key, value in data.items()}
+        elif isinstance(data, np.ndarray):
+            return data.tolist()
+        elif isinstance(data, np.generic):
+            return data.item()
+        elif isinstance(data, (list, tuple)):
+            return [self._serialize_dict_with_numpy(item) for item in data]
+        else:
+            return data
+    
+    def _deserialize_dict_with_numpy(self, data):
+        """Recursively convert lists back to numpy arrays in dictionaries for OpenCV compatibility"""
+        if isinstance(data, dict):
+            result = {}
+            for key, value in data.items():
+                if key == 'histogram' and isinstance(value, list):
+                    # Convert histogram back to numpy array for OpenCV operations
+                    result[key] = np.array(value)
+                elif key == 'face_region' and isinstance(value, list):
+                    # Convert face region back to numpy array
+                    result[key] = np.array(value)
+                else:
+                    result[key] = self._deserialize_dict_with_numpy(value)
+            return result
+        elif isinstance(data, list):
+            return [self._deserialize_dict_with_numpy(item) for item in data]
+        else:
+            return data
+    
+    def _deserialize_encoding(self, encoding):
+        """Convert a stored face encoding back to numpy for processing"""
+        if isinstance(encoding, list):
+            # Convert list back to numpy array (for face_recognition library)
+            return np.array(encoding)
+        elif isinstance(encoding, dict):
+            # For dict (OpenCV), convert nested lists back to numpy arrays if needed
+            return self._deserialize_dict_with_numpy(encoding)
+        return encoding
+    
+    def _deserialize_user_encodings(self, user):
+        """Convert the primary encoding and every enrollment template of a user in place"""
+        if 'face_encoding' in user:
+            user['face_encoding'] = self._deserialize_encoding(user['face_encoding'])
+        for template in user.get('face_templates', []):
+            if 'encoding' in template:
+                template['encoding'] = self._deserialize_encoding(template['encoding'])
+        return user
+    
+    def _hash_fields(self, image_hash, image_hash_bands):
+        """Build the perceptual-hash fields stored alongside a user"""
+        if not image_hash:
+            return {}
+        return {
+            'image_hash': image_hash,
+            'image_hash_bands': image_hash_bands or []
+        }
+    
+    def _encoding_tag_fields(self, encoding_tag):
+        """Build the method/version fields stored alongside the primary face encoding"""
+        if not encoding_tag:
+            return {}
+        return {
+            'face_encoding_method': encoding_tag['method'],
+            'face_encoding_version': encoding_tag['version']
+        }
+    
+    def _build_template(self, face_encoding, image_path, encoding_tag=None, image_hash=None):
+        """Build a stored enrollment template"""
+        template = {
+            'encoding': self._serialize_encoding(face_encoding),
+            'image_path': image_path,
+            'added_at': datetime.utcnow()
+        }
+        if encoding_tag:
+            template['method'] = encoding_tag['method']
+            template['version'] = encoding_tag['version']
+        if image_hash:
+            template['image_hash'] = image_hash
+        return template
+    
+    def _serialize_encoding(self, face_encoding):
+        """Convert a face encoding into a MongoDB-storable structure"""
+        # Handle different types of face encodings
+        if isinstance(face_encoding, np.ndarray):
+            # face_recognition library encoding (numpy array)
+            logger.debug("Converting numpy array to list")
+            encoding_data = face_encoding.tolist()
+        elif isinstance(face_encoding, dict):
+            # OpenCV face service encoding (dictionary) - handle nested numpy arrays
+            logger.debug("Serializing dictionary with numpy arrays")
+            encoding_data = self._serialize_dict_with_numpy(face_encoding)
+        elif hasattr(face_encoding, 'tolist'):
+            # Any array-like object with tolist method
+            logger.debug("Converting array-like object to list")
+            encoding_data = face_encoding.tolist()
+        else:
+            # Store as-is for other types
+            logger.debug("Storing face encoding as-is")
+            encoding_data = face_encoding
+        
+        return encoding_data
+    
+    def create_user_simple(self, name, image_path, image_hash=None, image_hash_bands=None,
+                           registration_status=None, tenant=None):
+        """Create a new user without face encoding (just save name and image)"""
+        try:
+            logger.debug("Creating user (simple)", extra={'user_name': name, 'image_path': image_path})
+            
+            # Check if database connection exists
+            if self.collection is None:
+                logger.error("Database collection is None")
+                return None
+            
+            user_data = {
+                'name': name,
+                'image_path': image_path,
+                'created_at': datetime.utcnow(),
+                'updated_at': datetime.utcnow()
+            }
+            if registration_status:
+                user_data['registration_status'] = registration_status
+            if tenant:
+                user_data['tenant'] = tenant
+            user_data.update(self._hash_fields(image_hash, image_hash_bands))
+            
+            result = self.collection.insert_one(user_data)
+            self._remember_names([name], tenant)
+            logger.info("User created", extra={'user_id': str(result.inserted_id), 'user_name': name})
+            return str(result.inserted_id)
+            
+        except DuplicateKeyError:
+            self._remember_names([name], tenant)
+            raise DuplicateUserError(name)
+        except Exception as e:
+            logger.exception("Error creating user: %s", e)
+            return None
+
+    def create_user(self, name, image_path, face_encoding, image_hash=None, image_hash_bands=None,
+                    encoding_tag=None):
+        """Create a new user with face encoding"""
+        try:
+            logger.debug("Creating user", extra={
+                'user_name': name,
+                'image_path': image_path,
+                'encoding_type': type(face_encoding).__name__
+            })
+            
+            # Check if database connection exists
+            if self.collection is None:
+                logger.error("Database collection is None")
+                return None
+            
+            encoding_data = self._serialize_encoding(face_encoding)
+            
+            user_data = {
+                'name': name,
+                'image_path': image_path,
+                'face_encoding': encoding_data,
+                'created_at': datetime.utcnow(),
+                'updated_at': datetime.utcnow()
+            }
+            user_data.update(self._encoding_tag_fields(encoding_tag))
+            user_data.update(self._hash_fields(image_hash, image_hash_bands))
+            
+            result = self.collection.insert_one(user_data)
+            self._remember_names([name])
+            logger.info("User created", extra={'user_id': str(result.inserted_id), 'user_name': name})
+            return str(result.inserted_id)
+            
+        except DuplicateKeyError:
+            self._remember_names([name])
+            raise DuplicateUserError(name)
+        except Exception as e:
+            logger.exception("Error creating user: %s", e)
+            return None
+    
+    def insert_users(self, users):
+        """
+        Insert many users with one batched insert_many call.
+        Each item carries name, image_path and optionally tenant, face_encoding, encoding_tag,
+        image_hash, image_hash_bands and face_templates (dicts with encoding, image_path,
+        encoding_tag, image_hash).
+        Returns the list of names that were inserted.
+        """
+        if not users:
+            return []
+        
+        now = datetime.utcnow()
+        documents = []
+        for user in users:
+            document = {
+                'name': user['name'],
+                'image_path': user['image_path'],
+                'created_at': now,
+                'updated_at': now
+            }
+            if user.get('tenant'):
+                document['tenant'] = user['tenant']
+            if user.get('face_encoding') is not None:
+                document['face_encoding'] = self._serialize_encoding(user['face_encoding'])
+                document.update(self._encoding_tag_fields(user.get('encoding_tag')))
+            document.update(self._hash_fields(user.get('image_hash'), user.get('image_hash_bands')))
+            
+            templates = [
+                self._build_template(
+                    template['encoding'],
+                    template['image_path'],
+                    template.get('encoding_tag'),
+                    template.get('image_hash')
+                )
+                for template in user.get('face_templates', [])
+            ]
+            if templates:
+                document['face_templates'] = templates
+            documents.append(document)
+        
+        try:
+            # Unordered so one bad document does not abort the rest of the batch
+            self.collection.insert_many(documents, ordered=False)
+            inserted = documents
+        except BulkWriteError as e:
+            failed = {error['index'] for error in e.details.get('writeErrors', [])}
+            inserted = [document for i, document in enumerate(documents) if i not in failed]
+        except Exception as e:
+            logger.error("Error inserting users: %s", e)
+            return []
+        for document in inserted:
+            self._remember_names([document['name']], document.get('tenant'))
+        return [document['name'] for document in inserted]
+    
+    def get_existing_names(self, names, tenant=None):
+        """Return the subset of names that already belong to a user of tenant, in one query"""
+        try:
+            existing = set()
+            names = list(names)
+            # Chunk the $in list to keep each query document small
+            for start in range(0, len(names), 1000):
+                cursor = self.collection.find({'tenant': tenant, 'name': {'$in': names[start:start + 1000]}}, {'name': 1})
+                existing.update(user['name'] for user in cursor)
+            return existing
+        except Exception as e:
+            logger.error("Error checking existing names: %s", e)
+            return set()
+    
+    def get_user_by_id(self, user_id):
+        """Get user by ID"""
+        try:
+            user = self.collection.find_one({'_id': ObjectId(user_id)})
+            if user:
+                user['_id'] = str(user['_id'])
+                # Keep face_encoding as stored (don't convert to numpy) for JSON serialization
+            return user
+        except Exception as e:
+            logger.error("Error getting user by ID: %s", e)
+            return None
+    
+    def get_user_by_name(self, name, tenant=None):
+        """Get user by name within tenant (None: users without a tenant)"""
+        try:
+            user = self.collection.find_one({'tenant': tenant, 'name': name})
+            if user:
+                user['_id'] = str(user['_id'])
+                # Keep face_encoding as stored (don't convert to numpy) for JSON serialization
+            return user
+        except Exception as e:
+            logger.error("Error getting user by name: %s", e)
+            return None
+    
+    def get_all_users(self):
+        """Get all users"""
+        try:
+            users = []
+            for user in self.collection.find():
+                user['_id'] = str(user['_id'])
+                # Keep face_encoding as stored (don't convert to numpy) for JSON serialization
+                users.append(user)
+            return users
+        except Exception as e:
+            logger.error("Error getting all users: %s", e)
+            return []
+    
+    def get_user_with_encoding(self, user_id):
+        """Get user by ID with face encoding converted back to numpy for processing"""
+        try:
+            user = self.collection.find_one({'_id': ObjectId(user_id)})
+            if user:
+                user['_id'] = str(user['_id'])
+                # Convert face encodings back to numpy for processing
+                self._deserialize_user_encodings(user)
+            return user
+        except Exception as e:
+            logger.error("Error getting user with encoding: %s", e)
+            return None
+    
+    def get_all_users_with_encoding(self, tenant=None):
+        """Get all users (or only a tenant's) with face encodings converted back to numpy for processing"""
+        try:
+            users = []
+            for user in self.collection.find({'tenant': tenant} if tenant else {}):
+                user['_id'] = str(user['_id'])
+                # Convert face encodings back to numpy for processing
+                self._deserialize_user_encodings(user)
+                users.append(user)
+            return users
+        except Exception as e:
+            logger.error("Error getting all users with encoding: %s", e)
+            return []
+    
+    def update_user(self, user_id, update_data):
+        """Update user data"""
+        try:
+            update_data['updated_at'] = datetime.utcnow()
+            result = self.collection.update_one(
+                {'_id': ObjectId(user_id)},
+                {'$set': update_data}
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error("Error updating user: %s", e)
+            return False
+    
+    def set_face_encoding(self, user_id, face_encoding, encoding_tag=None):
+        """Store a (lazily computed) face encoding on an existing user"""
+        update_data = {'face_encoding': self._serialize_encoding(face_encoding)}
+        update_data.update(self._encoding_tag_fields(encoding_tag))
+        return self.update_user(user_id, update_data)
+    
+    def complete_registration(self, user_id, face_encoding, encoding_tag):
+        """Store the encoding computed by the background registration worker and mark the user ready"""
+        update_data = {
+            'face_encoding': self._serialize_encoding(face_encoding),
+            'registration_status': 'ready'
+        }
+        update_data.update(self._encoding_tag_fields(encoding_tag))
+        return self.update_user(user_id, update_data)
+    
+    def fail_registration(self, user_id, error):
+        """Record why background validation/encoding of a registration failed"""
+        return self.update_user(user_id, {'registration_status': 'failed', 'registration_error': error})
+    
+    def find_pending_registrations(self):
+        """Users whose background registration has not finished (e.g. interrupted by a restart)"""
+        try:
+            users = []
+            for user in self.collection.find({'registration_status': 'pending'}, {'image_path': 1, 'tenant': 1}):
+                user['_id'] = str(user['_id'])
+                users.append(user)
+            return users
+        except Exception as e:
+            logger.error("Error finding pending registrations: %s", e)
+            return []
+    
+    def set_template_encoding(self, user_id, index, face_encoding, encoding_tag):
+        """Replace the encoding of one enrollment template (e.g. after switching methods)"""
+        return self.update_user(user_id, {
+            f'face_templates.{index}.encoding': self._serialize_encoding(face_encoding),
+            f'face_templates.{index}.method': encoding_tag['method'],
+            f'face_templates.{index}.version': encoding_tag['version']
+        })
+    
+    def find_users_needing_reencode(self, encoding_tag, exclude_ids=None):
+        """Iterate users whose primary encoding or any template was not produced by encoding_tag"""
+        stale = {'$or': [
+            {'method': {'$ne': encoding_tag['method']}},
+            {'version': {'$ne': encoding_tag['version']}}
+        ]}
+        query = {'$or': [
+            {'face_encoding_method': {'$ne': encoding_tag['method']}},
+            {'face_encoding_version': {'$ne': encoding_tag['version']}},
+            {'face_templates': {'$elemMatch': stale}}
+        ]}
+        try:
+            cursor = self.collection.find(query, {'image_path': 1, 'face_templates.image_path': 1})
+            for user in cursor:
+                user['_id'] = str(user['_id'])
+                if exclude_ids and user['_id'] in exclude_ids:
+                    continue
+                yield user
+        except Exception as e:
+            logger.error("Error finding users to re-encode: %s", e)
+    
+    def apply_encoding_updates(self, updates):
+        """
+        Write re-encoded users with one bulk_write.
+        Each update has user_id, encoding_tag, face_encoding and templates ({index: encoding}).
+        Returns True if the batch was written.
+        """
+        if not updates:
+            return True
+        try:
+            operations = []
+            for update in updates:
+                tag = update['encoding_tag']
+                fields = {'updated_at': datetime.utcnow()}
+                if update.get('face_encoding') is not None:
+                    fields['face_encoding'] = self._serialize_encoding(update['face_encoding'])
+                    fields.update(self._encoding_tag_fields(tag))
+                for index, encoding in update.get('templates', {}).items():
+                    fields[f'face_templates.{index}.encoding'] = self._serialize_encoding(encoding)
+                    fields[f'face_templates.{index}.method'] = tag['method']
+                    fields[f'face_templates.{index}.version'] = tag['version']
+                operations.append(UpdateOne({'_id': ObjectId(update['user_id'])}, {'$set': fields}))
+            self.collection.bulk_write(operations, ordered=False)
+            return True
+        except Exception as e:
+            logger.error("Error applying encoding updates: %s", e)
+            return False
+    
+    def claim_reencode(self, user_id, lease_seconds=60):
+        """
+        Take a short-lived lease on re-encoding a user so that several processes
+        noticing the same stale encoding do not all re-extract it at once.
+        """
+        try:
+            now = datetime.utcnow()
+            result = self.collection.update_one(
+                {
+                    '_id': ObjectId(user_id),
+                    '$or': [
+                        {'reencode_claimed_at': {'$exists': False}},
+                        {'reencode_claimed_at': {'$lt': now - timedelta(seconds=lease_seconds)}}
+                    ]
+                },
+                {'$set': {'reencode_claimed_at': now}}
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error("Error claiming user for re-encoding: %s", e)
+            return False
+    
+    def release_reencode(self, user_id):
+        """Drop the re-encode lease once the user's encodings are written"""
+        try:
+            self.collection.update_one({'_id': ObjectId(user_id)}, {'$unset': {'reencode_claimed_at': ''}})
+        except Exception as e:
+            logger.error("Error releasing re-encode lease: %s", e)
+    
+    def mark_encoding_failed(self, user_id, index, encoding_tag):
+        """
+        Record that the primary photo (index None) or a template photo yields no face
+        under encoding_tag, so it is not re-encoded again until the method or version changes
+        """
+        field = 'face_encoding_error' if index is None else f'face_templates.{index}.encoding_error'
+        return self.update_user(user_id, {
+            field: {'method': encoding_tag['method'], 'version': encoding_tag['version']}
+        })
+    
+    def add_face_template(self, user_id, face_encoding, image_path, max_templates,
+                          image_hash=None, image_hash_bands=None, encoding_tag=None):
+        """
+        Append an extra enrollment template to a user. The registration photo counts
+        as the first template, so at most max_templates - 1 extra templates are stored.
+        Returns False if the user is missing or already at the cap.
+        """
+        try:
+            if max_templates < 2:
+                return False
+            
+            template = self._build_template(face_encoding, image_path, encoding_tag, image_hash)
+            update = {
+                '$push': {'face_templates': template},
+                '$set': {'updated_at': datetime.utcnow()}
+            }
+            if image_hash:
+                update['$addToSet'] = {'image_hash_bands': {'$each': image_hash_bands or []}}
+            
+            # The cap is part of the filter so concurrent additions cannot exceed it
+            result = self.collection.update_one(
+                {
+                    '_id': ObjectId(user_id),
+                    f'face_templates.{max_templates - 2}': {'$exists': False}
+                },
+                update
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error("Error adding face template: %s", e)
+            return False
+    
+    def delete_user(self, user_id):
+        """Delete user by ID"""
+        try:
+            user = self.collection.find_one_and_delete({'_id': ObjectId(user_id)}, projection={'name': 1, 'tenant': 1})
+            if user is None:
+                return False
+            self._forget_name(user.get('name'), user.get('tenant'))
+            return True
+        except Exception as e:
+            logger.error("Error deleting user: %s", e)
+            return False
+    
+    def find_users_by_hash_bands(self, image_hash_bands, tenant=None):
+        """Get candidate users of tenant sharing at least one perceptual-hash band"""
+        try:
+            if not image_hash_bands:
+                return []
+            users = []
+            cursor = self.collection.find(
+                {'tenant': tenant, 'image_hash_bands': {'$in': image_hash_bands}},
+                {'name': 1, 'image_path': 1, 'image_hash': 1, 'face_templates.image_hash': 1, 'registration_status': 1}
+            )
+            for user in cursor:
+                user['_id'] = str(user['_id'])
+                users.append(user)
+            return users
+        except Exception as e:
+            logger.error("Error finding users by image hash: %s", e)
+            return []
+    
+    def user_exists(self, name, tenant=None):
+        """Check if user with given name exists in tenant"""
+        try:
+            return self.collection.find_one({'tenant': tenant, 'name': name}) is not None
+        except Exception as e:
+            logger.error("Error checking if user exists: %s", e)
+            return False
+
+class AsyncUser:
+    """
+    Awaitable versions of the User queries served by the ASGI entry point.
+    Documents and serialisation are shared with user.
+    """
+    
+    def __init__(self, user):
+        self.user = user
+    
+    @property
+    def collection(self):
+        return async_db_instance.get_collection('users')
+    
+    async def get_user_by_id(self, user_id):
+        """Get user by ID"""
+        try:
+            user = await self.collection.find_one({'_id': ObjectId(user_id)})
+            if user:
+                user['_id'] = str(user['_id'])
+            return user
+        except Exception as e:
+            logger.error("Error getting user by ID: %s", e)
+            return None
+    
+    async def get_all_users(self):
+        """Get all users"""
+        try:
+            users = []
+            async for user in self.collection.find():
+                user['_id'] = str(user['_id'])
+                users.append(user)
+            return users
+        except Exception as e:
+            logger.error("Error getting all users: %s", e)
+            return []
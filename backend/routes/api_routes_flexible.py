@@ -1,97 +1,492 @@
-from flask import Blueprint, request, jsonify, send_from_directory
-from models.user import User
+from flask import Blueprint, request, jsonify, send_from_directory, g
+from models.user import User, DuplicateUserError
 from services.file_service import FileService
+from services.image_hash_service import ImageHashService
+from services.gallery_service import GalleryService
+from services.face_service_loader import LazyFaceService
+from models.database import db_instance
+from services.import_service import ImportService
+from services.admission_service import AdmissionController, AdmissionRejected
+from services.batch_scheduler import MatchBatcher
+from services.quality_controller import QualityController
+from services.profile_service import ProfileService
+from services.deadline import Deadline
+from services import metrics
+from services.profiling_service import RequestProfiler
+from services.capture_service import RequestCapture
+from services.event_log_service import RecognitionEventLog
+from services.registration_worker import RegistrationWorker
+from services.thread_config import thread_settings
+import functools
+import numpy as np
 import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime
+from services.logging_service import get_logger, set_request_id, dropped_records
 
-# Try to import advanced face recognition, fall back to OpenCV-only
-try:
-    from services.face_service import FaceService
-    face_service = FaceService()
-    FACE_RECOGNITION_METHOD = "advanced"
-    print("Using advanced face recognition (face_recognition library)")
-except ImportError:
-    try:
-        from services.face_service_opencv import FaceServiceOpenCV
-        face_service = FaceServiceOpenCV()
-        FACE_RECOGNITION_METHOD = "opencv"
-        print("Using OpenCV-only face recognition")
-    except ImportError:
-        print("ERROR: No face recognition service available")
-        face_service = None
-        FACE_RECOGNITION_METHOD = "none"
+logger = get_logger(__name__)
 
 api = Blueprint('api', __name__)
 
+# The face service is built on first use (or by the warm-up thread) so importing
+# this module never pays for face_recognition/dlib
+face_service = LazyFaceService()
+
 # Initialize services
 user_model = User()
 file_service = FileService()
+hash_service = ImageHashService()
+gallery_service = GalleryService(user_model, face_service)
+import_service = ImportService(user_model, file_service, gallery_service)
+admission_controller = AdmissionController()
+match_batcher = MatchBatcher(gallery_service, face_service)
+quality_controller = QualityController(admission_controller)
+profile_service = ProfileService()
+request_profiler = RequestProfiler()
+request_capture = RequestCapture()
+recognition_events = RecognitionEventLog()
+registration_worker = RegistrationWorker(user_model, face_service, gallery_service)
+
+# Load signals sampled at scrape time
+metrics.registry.gauge('facedetection_admission_queue_depth', 'Requests waiting for admission',
+                       function=lambda: admission_controller.stats()['queue_depth'])
+metrics.registry.gauge('facedetection_admission_in_flight', 'Admission capacity units in use',
+                       function=lambda: admission_controller.stats()['in_flight'])
+metrics.registry.gauge('facedetection_quality_level', 'Active load-adaptive quality level (0 = full)',
+                       function=lambda: quality_controller.level)
+metrics.registry.gauge('facedetection_recognition_events_buffered', 'Recognition events waiting to be written',
+                       function=lambda: recognition_events.stats()['buffered'])
+metrics.registry.gauge('facedetection_recognition_events_dropped', 'Recognition events dropped by the overflow policy',
+                       function=lambda: recognition_events.stats()['dropped'])
+metrics.registry.gauge('facedetection_log_records_dropped', 'Log records dropped because the log queue was full',
+                       function=dropped_records)
+
+# Startup readiness, filled in by warm_up()
+readiness = {
+    'database': False,
+    'face_service': False,
+    'gallery': False
+}
+
+@api.before_app_request
+def start_request_timer():
+    g.metrics_started = time.perf_counter()
+    # Correlation id for every log line of this request; callers may pass their own
+    g.request_id = request.headers.get('X-Request-Id') or uuid.uuid4().hex
+    set_request_id(g.request_id)
+    metrics.begin_request_timings()
+    g.profile_capture = request_profiler.start()
+    g.capture_request = request_capture.should_capture(request.url_rule.rule if request.url_rule else None)
+
+@api.after_app_request
+def record_request_metrics(response):
+    """Record latency and status of every request and report its stage breakdown in Server-Timing"""
+    duration = time.perf_counter() - g.metrics_started
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.request_seconds.observe(duration, endpoint=endpoint, method=request.method)
+    metrics.requests_total.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+    if response.status_code >= 500:
+        metrics.errors_total.inc(endpoint=endpoint)
+    
+    timings = metrics.request_timings()
+    entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()]
+    entries.append(f"total;dur={duration * 1000:.2f}")
+    response.headers['Server-Timing'] = ', '.join(entries)
+    response.headers['X-Request-Id'] = g.request_id
+    logger.debug("Request completed", extra={
+        'endpoint': endpoint,
+        'method': request.method,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 2)
+    })
+    
+    if g.pop('capture_request', False):
+        request_capture.capture(request, response, endpoint, duration)
+    
+    capture = g.pop('profile_capture', None)
+    if capture is not None:
+        request_profiler.stop(capture, duration, {
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'remote_addr': request.remote_addr,
+            'content_length': request.content_length,
+            'timings_ms': {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()},
+            'captured_at': datetime.utcnow().isoformat()
+        })
+    return response
+
+@api.teardown_app_request
+def release_profile_capture(error=None):
+    """Stop a capture left running when the request failed before after_request"""
+    capture = g.pop('profile_capture', None)
+    if capture is not None:
+        request_profiler.stop(capture, time.perf_counter() - g.metrics_started, {
+            'endpoint': request.path,
+            'method': request.method,
+            'error': str(error)
+        })
+
+def admin_authorized():
+    """Admin endpoints require ADMIN_TOKEN to be configured and sent as X-Admin-Token"""
+    token = os.getenv('ADMIN_TOKEN')
+    return bool(token) and request.headers.get('X-Admin-Token') == token
+
+def current_method():
+    """Recognition method for informational responses, without forcing the model to load"""
+    return face_service.method if face_service.is_loaded else 'loading'
+
+def detector_instances():
+    """Per-thread cascade classifiers created so far, without forcing the model to load"""
+    if not face_service.is_loaded or not face_service.available:
+        return 0
+    return face_service.detectors.stats()['instances']
+
+def warm_up():
+    """Load the face model, connect to MongoDB (retrying until reachable), create indexes and build the gallery"""
+    try:
+        readiness['face_service'] = face_service.available
+        
+        retry_seconds = float(os.getenv('WARMUP_RETRY_SECONDS', '5'))
+        while not db_instance.ping():
+            time.sleep(retry_seconds)
+        user_model.ensure_indexes()
+        user_model.load_name_cache()
+        recognition_events.ensure_indexes()
+        readiness['database'] = True
+        
+        if readiness['face_service']:
+            registration_worker.resume_pending()
+            gallery_service.snapshot()
+            readiness['gallery'] = True
+    except Exception as e:
+        logger.error("Error during warm-up: %s", e)
+
+def start_warm_up():
+    """Run warm_up() in a background thread so the server can accept requests immediately"""
+    thread = threading.Thread(target=warm_up, name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+def admission_controlled(view):
+    """Run a CPU-heavy view under the admission controller, weighted by the uploaded photo's pixel count"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.request_started = time.monotonic()
+        try:
+            g.deadline = request_deadline(g.request_started)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        photo = request.files.get('photo')
+        weight = admission_controller.image_weight(photo) if photo else 1
+        try:
+            # A request never waits in the queue past its own deadline
+            admission_controller.acquire(weight, g.deadline.remaining())
+        except AdmissionRejected as e:
+            response = jsonify({'error': str(e)})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 503
+        
+        started = time.monotonic()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            admission_controller.release(weight, time.monotonic() - started)
+    return wrapper
+
+def request_deadline(started=None):
+    """
+    Deadline for the current request from the X-Request-Deadline-Ms header or a
+    'deadline_ms' field, else REQUEST_DEADLINE_MS; unbounded when none is set
+    """
+    value = (request.headers.get('X-Request-Deadline-Ms') or request.values.get('deadline_ms')
+             or os.getenv('REQUEST_DEADLINE_MS'))
+    if not value:
+        return Deadline(started=started)
+    try:
+        budget_ms = float(value)
+    except ValueError:
+        raise ValueError('Deadline must be a number of milliseconds')
+    if budget_ms <= 0:
+        raise ValueError('Deadline must be positive')
+    return Deadline(budget_ms / 1000.0, started)
+
+def request_tenant(req=None):
+    """Tenant of the current request from the X-Tenant-Id header or a 'tenant' form/query field"""
+    req = request if req is None else req
+    return req.headers.get('X-Tenant-Id') or req.values.get('tenant')
+
+def request_device():
+    """Device that sent the request: X-Device-Id header or 'device' field"""
+    return request.headers.get('X-Device-Id') or request.form.get('device')
+
+def request_profile():
+    """Resolve the request's pipeline profile; raises ValueError for an unknown profile name"""
+    requested = request.headers.get('X-Pipeline-Profile') or request.values.get('profile')
+    return profile_service.resolve(requested, request_tenant())
+
+def request_encodings():
+    """
+    Client-computed encodings of a /match request and their (method, version) tag: either
+    float32 vectors back to back in an application/octet-stream body with X-Encoding-Method
+    and X-Encoding-Version headers, or JSON {"encodings": [[...]], "method", "version"}.
+    Raises ValueError for a malformed body.
+    """
+    size = face_service.ENCODING_SIZE
+    if request.mimetype == 'application/octet-stream':
+        body = request.get_data(cache=False)
+        if not body or len(body) % (4 * size):
+            raise ValueError(f'Body must hold float32 encodings of {size} values each')
+        vectors = np.frombuffer(body, dtype='<f4').reshape(-1, size)
+        method = request.headers.get('X-Encoding-Method') or request.args.get('method')
+        version = request.headers.get('X-Encoding-Version') or request.args.get('version')
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('encodings'), list) or not data['encodings']:
+            raise ValueError('Expected a JSON body with a non-empty "encodings" list')
+        try:
+            vectors = np.asarray(data['encodings'], dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError('Encodings must be lists of numbers')
+        if vectors.ndim != 2 or vectors.shape[1] != size:
+            raise ValueError(f'Each encoding must have {size} values')
+        method = data.get('method')
+        version = data.get('version')
+    if method is None or version is None:
+        raise ValueError('Encoding method and version are required')
+    if not np.isfinite(vectors).all():
+        raise ValueError('Encodings must be finite numbers')
+    return vectors, method, str(version)
+
+def find_duplicate_enrollment(image_hash, tenant=None):
+    """Return the closest user of tenant whose enrolled photo is a near-duplicate, if any"""
+    return closest_enrollment(image_hash, user_model.find_users_by_hash_bands(hash_service.hash_bands(image_hash), tenant))
+
+def closest_enrollment(image_hash, candidates):
+    """The candidate whose registration photo or template is nearest to image_hash, within the duplicate distance"""
+    best_user = None
+    best_distance = hash_service.max_distance + 1
+    
+    for candidate in candidates:
+        # A registration whose background validation failed enrolled nothing
+        if candidate.get('registration_status') == 'failed':
+            continue
+        # Compare against the registration photo and every enrollment template
+        candidate_hashes = [candidate.get('image_hash')]
+        candidate_hashes += [template.get('image_hash') for template in candidate.get('face_templates', [])]
+        for candidate_hash in candidate_hashes:
+            if not candidate_hash:
+                continue
+            distance = hash_service.hamming_distance(image_hash, candidate_hash)
+            if distance < best_distance:
+                best_distance = distance
+                best_user = candidate
+    
+    return best_user
+
+def same_photo(image_hash, other_hash):
+    """Whether two perceptual hashes are within the duplicate distance"""
+    return bool(image_hash and other_hash) and hash_service.hamming_distance(image_hash, other_hash) <= hash_service.max_distance
+
+def already_registered(user):
+    """Response body for a retried registration of an existing user"""
+    body = {
+        'message': 'User already registered',
+        'user_id': user['_id'],
+        'name': user['name'],
+        'image_url': file_service.get_file_url(user.get('image_path', '')),
+        'duplicate': True
+    }
+    if user.get('registration_status'):
+        # A background registration may still be pending
+        body['registration_status'] = user['registration_status']
+    return body
+
+def discard_failed_registration(user, keep_file=None):
+    """
+    Delete a user whose background registration failed so the name can be registered
+    again; returns whether it did. The photo is kept if a new upload was saved over it.
+    """
+    if not user or user.get('registration_status') != 'failed':
+        return False
+    user_model.delete_user(user['_id'])
+    if user.get('image_path') and user['image_path'] != keep_file:
+        file_service.delete_file(user['image_path'])
+    logger.info("Replacing failed registration", extra={'user_id': user['_id'], 'user_name': user['name']})
+    return True
+
+def async_registration_requested(req):
+    """Register in the background: Prefer: respond-async, an async=true field, or REGISTRATION_MODE=async"""
+    if 'respond-async' in req.headers.get('Prefer', '').lower():
+        return True
+    value = req.form.get('async') or req.args.get('async')
+    if value is not None:
+        return value.lower() in ('1', 'true', 'yes')
+    return os.getenv('REGISTRATION_MODE', 'sync').lower() == 'async'
+
+def accepted_registration(user_id, name, file_path):
+    """202 body for a registration that is validated and encoded in the background"""
+    return {
+        'message': 'Registration accepted',
+        'user_id': user_id,
+        'name': name,
+        'image_url': file_service.get_file_url(file_path),
+        'status': 'pending',
+        'status_url': f'/api/user/{user_id}/status'
+    }
+
+# Stored user fields returned by the API; hashes, encodings, their tags and re-encode leases stay internal
+PUBLIC_USER_FIELDS = ('_id', 'name', 'image_path', 'tenant', 'registration_status', 'created_at', 'updated_at')
+
+def user_summary(user):
+    """The public fields of a stored user, with its template count and image URL"""
+    summary = {field: user[field] for field in PUBLIC_USER_FIELDS if field in user}
+    summary['template_count'] = 1 + len(user.get('face_templates', []))
+    if 'image_path' in user:
+        summary['image_url'] = file_service.get_file_url(user['image_path'])
+    return summary
+
+def build_recognition_result(best_match, user_count, gallery_size, match_skipped=False):
+    """Build the per-face recognition payload returned by /detect"""
+    if best_match:
+        return {
+            'recognized': True,
+            'user_name': best_match['user_name'],
+            'confidence': round(best_match['confidence'], 4),
+            'distance': round(best_match['distance'], 4),
+            'method': face_service.method
+        }
+    
+    if match_skipped:
+        message = 'Matching skipped to meet the request deadline'
+    elif user_count == 0:
+        message = 'No users registered yet'
+    elif gallery_size == 0:
+        message = 'No face encodings could be extracted from registered users'
+    else:
+        message = 'No matching user found'
+    
+    return {
+        'recognized': False,
+        'message': message,
+        'method': face_service.method
+    }
 
 @api.route('/register', methods=['POST'])
+@admission_controlled
 def register_user():
     """Register a new user with photo upload (no face detection required)"""
+    return register_from_request(request)
+
+def register_from_request(req):
+    """
+    Registration shared by the Flask view and the native ASGI route (which runs it on a
+    worker thread); returns (payload, status) or (payload, status, headers)
+    """
     try:
         # Check if required data is provided
-        if 'name' not in request.form:
-            return jsonify({'error': 'Name is required'}), 400
+        if 'name' not in req.form:
+            return {'error': 'Name is required'}, 400
         
-        if 'photo' not in request.files:
-            return jsonify({'error': 'Photo is required'}), 400
+        if 'photo' not in req.files:
+            return {'error': 'Photo is required'}, 400
         
-        name = request.form['name'].strip()
-        photo = request.files['photo']
+        name = req.form['name'].strip()
+        photo = req.files['photo']
         
         # Validate inputs
         if not name:
-            return jsonify({'error': 'Name cannot be empty'}), 400
+            return {'error': 'Name cannot be empty'}, 400
         
         if photo.filename == '':
-            return jsonify({'error': 'No photo selected'}), 400
-        
-        # Check if user already exists
-        if user_model.user_exists(name):
-            return jsonify({'error': 'User with this name already exists'}), 409
+            return {'error': 'No photo selected'}, 400
         
         # Validate file size
         if not file_service.validate_file_size(photo):
-            return jsonify({'error': 'File size too large (max 16MB)'}), 400
+            return {'error': 'File size too large (max 16MB)'}, 400
+        
+        # Reject names already known to be taken in the tenant before any image work
+        tenant = request_tenant(req)
+        existing = user_model.find_cached_name(name, tenant)
+        if discard_failed_registration(existing):
+            existing = None
+        if existing:
+            # Hash only to tell a retry of the same photo (idempotent 200) from a conflict
+            if existing.get('image_hash') and same_photo(hash_service.compute_hash_from_file(photo), existing['image_hash']):
+                return already_registered(existing), 200
+            return {'error': 'User with this name already exists'}, 409
+        
+        # Decode and hash the upload in memory (also rejects undecodable images before saving)
+        image_hash = hash_service.compute_hash_from_file(photo)
+        if image_hash is None:
+            return {'error': 'Invalid image format'}, 400
+        
+        # Short-circuit retries and photos already enrolled under another identity
+        duplicate = find_duplicate_enrollment(image_hash, tenant)
+        if duplicate:
+            if duplicate['name'] == name:
+                return already_registered(duplicate), 200
+            return {'error': 'This photo is already registered to another user'}, 409
         
         # Save the uploaded photo
         file_path = file_service.save_uploaded_file(photo, f"{name}_{photo.filename}")
         if not file_path:
-            return jsonify({'error': 'Invalid file format'}), 400
+            return {'error': 'Invalid file format'}, 400
         
-        # Basic image validation (just check if it's a valid image file)
-        try:
-            import cv2
-            image = cv2.imread(file_path)
-            if image is None:
-                file_service.delete_file(file_path)
-                return jsonify({'error': 'Invalid image format'}), 400
-        except Exception:
-            file_service.delete_file(file_path)
-            return jsonify({'error': 'Cannot read image file'}), 400
+        run_async = async_registration_requested(req)
         
-        # Create user in database (without face encoding)
-        user_id = user_model.create_user_simple(name, file_path)
+        # Create user in database (without face encoding); the unique name index rejects duplicates
+        for attempt in range(2):
+            try:
+                user_id = user_model.create_user_simple(
+                    name,
+                    file_path,
+                    image_hash=image_hash,
+                    image_hash_bands=hash_service.hash_bands(image_hash),
+                    registration_status='pending' if run_async else None,
+                    tenant=tenant
+                )
+                break
+            except DuplicateUserError:
+                # Once, replace a failed registration the name cache did not know about
+                if attempt or not discard_failed_registration(user_model.get_user_by_name(name, tenant), file_path):
+                    file_service.delete_file(file_path)
+                    return {'error': 'User with this name already exists'}, 409
         if not user_id:
             file_service.delete_file(file_path)
-            return jsonify({'error': 'Failed to create user'}), 500
+            return {'error': 'Failed to create user'}, 500
         
-        return jsonify({
+        gallery_service.invalidate(tenant)
+        
+        if run_async:
+            # Face validation and encoding happen in the background; poll status_url for the outcome
+            registration_worker.submit(user_id, file_path, tenant)
+            payload = accepted_registration(user_id, name, file_path)
+            return payload, 202, {'Location': payload['status_url']}
+        
+        return {
             'message': 'User registered successfully',
             'user_id': user_id,
             'name': name,
             'image_url': file_service.get_file_url(file_path)
-        }), 201
+        }, 201
         
     except Exception as e:
-        return jsonify({'error': f'Registration failed: {str(e)}'}), 500
+        return {'error': f'Registration failed: {str(e)}'}, 500
 
 @api.route('/detect', methods=['POST'])
+@admission_controlled
 def detect_face():
     """Detect and recognize faces in uploaded image"""
     try:
-        if face_service is None:
+        if not face_service.available:
             return jsonify({'error': 'Face recognition service not available'}), 500
         
         if 'photo' not in request.files:
@@ -102,6 +497,11 @@ def detect_face():
         if photo.filename == '':
             return jsonify({'error': 'No photo selected'}), 400
         
+        try:
+            profile_name, profile = request_profile()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Validate file size
         if not file_service.validate_file_size(photo):
             return jsonify({'error': 'File size too large (max 16MB)'}), 400
@@ -111,110 +511,269 @@ def detect_face():
         if not temp_file_path:
             return jsonify({'error': 'Invalid file format'}), 400
         
+        started = time.monotonic()
+        quality_level = quality_controller.level
+        options = quality_controller.options(profile_service.pipeline_options(profile))
+        tolerance = profile_service.tolerance(profile, face_service.method)
+        # Search only the tenant's users when the request names one
+        tenant = request_tenant()
+        gallery = gallery_service.partition(tenant)
         try:
-            # Detect faces using OpenCV
-            detected_faces = face_service.detect_faces_opencv(temp_file_path)
-            
-            # Extract face encoding for recognition
-            unknown_encoding = face_service.extract_face_encoding(temp_file_path)
+            # One detection pass: locate, encode and match every face, coalesced with concurrent
+            # requests into one gallery pass; counts and locations come from the same result
+            probe_faces, matches = match_batcher.encode_and_match(temp_file_path, tolerance, options, g.deadline, gallery)
+            match_skipped = 'match' in g.deadline.skipped
+            metrics.faces_detected_total.inc(len(probe_faces))
             
+            faces = []
             recognition_result = None
-            if unknown_encoding is not None:
-                # Get all registered users with their encodings converted properly
-                all_users = user_model.get_all_users_with_encoding()
+            if probe_faces:
+                user_count = gallery.user_count()
+                gallery_size = gallery.gallery_size()
+                
+                device = request_device()
+                for face, best_match in zip(probe_faces, matches):
+                    faces.append({
+                        'location': face['coordinates'],
+                        'recognition': build_recognition_result(best_match, user_count, gallery_size, match_skipped)
+                    })
+                    # Audit trail; only an in-memory append on this path
+                    recognition_events.record({
+                        'timestamp': datetime.utcnow(),
+                        'operation': 'detect',
+                        'tenant': tenant,
+                        'device': device,
+                        'request_id': g.request_id,
+                        'recognized': best_match is not None,
+                        'user_id': best_match['user_id'] if best_match else None,
+                        'user_name': best_match['user_name'] if best_match else None,
+                        'distance': round(float(best_match['distance']), 4) if best_match else None,
+                        'box': [int(value) for value in face['coordinates']],
+                        'method': face_service.method,
+                        'profile': profile_name,
+                        'match_skipped': match_skipped
+                    })
                 
-                if all_users:
-                    # Extract face encodings from user images on-the-fly
-                    known_encodings = []
-                    user_names = []
-                    
-                    for user in all_users:
-                        if 'image_path' in user:
-                            # Extract face encoding from user's saved image
-                            user_encoding = face_service.extract_face_encoding(user['image_path'])
-                            if user_encoding is not None:
-                                known_encodings.append(user_encoding)
-                                user_names.append(user['name'])
-                    
-                    if known_encodings:
-                        # Find best match using appropriate method
-                        if FACE_RECOGNITION_METHOD == "advanced":
-                            best_match = face_service.find_best_match(
-                                known_encodings, 
-                                unknown_encoding, 
-                                user_names
-                            )
-                        else:  # OpenCV method
-                            best_match = face_service.find_best_match(
-                                known_encodings, 
-                                unknown_encoding, 
-                                user_names
-                            )
-                        
-                        if best_match:
-                            recognition_result = {
-                                'recognized': True,
-                                'user_name': best_match['user_name'],
-                                'confidence': round(best_match['confidence'], 4),
-                                'distance': round(best_match['distance'], 4),
-                                'method': FACE_RECOGNITION_METHOD
-                            }
-                        else:
-                            recognition_result = {
-                                'recognized': False,
-                                'message': 'No matching user found',
-                                'method': FACE_RECOGNITION_METHOD
-                            }
+                for face in faces:
+                    if face['recognition']['recognized']:
+                        metrics.recognitions_total.inc(result='hit')
                     else:
-                        recognition_result = {
-                            'recognized': False,
-                            'message': 'No face encodings could be extracted from registered users',
-                            'method': FACE_RECOGNITION_METHOD
-                        }
+                        metrics.recognitions_total.inc(result='skipped' if match_skipped else 'miss')
+                
+                # Keep a single top-level result: the most confident recognised face, else the first
+                recognised = [face['recognition'] for face in faces if face['recognition']['recognized']]
+                if recognised:
+                    recognition_result = max(recognised, key=lambda result: result['confidence'])
                 else:
-                    recognition_result = {
-                        'recognized': False,
-                        'message': 'No users registered yet',
-                        'method': FACE_RECOGNITION_METHOD
-                    }
+                    recognition_result = faces[0]['recognition']
             else:
                 recognition_result = {
                     'recognized': False,
                     'message': 'No faces detected for recognition',
-                    'method': FACE_RECOGNITION_METHOD
+                    'method': face_service.method
                 }
             
             return jsonify({
-                'faces_detected': len(detected_faces),
-                'face_locations': detected_faces,
-                'recognition': recognition_result
+                'faces_detected': len(probe_faces),
+                'face_locations': [face['coordinates'] for face in probe_faces],
+                'recognition': recognition_result,
+                'faces': faces,
+                'profile': profile_name,
+                'quality_level': quality_level,
+                # Partial results: some stages were skipped or cut short to meet the deadline
+                'partial': g.deadline.partial,
+                'skipped_stages': g.deadline.skipped
             }), 200
             
         finally:
             # Clean up temporary file
             file_service.delete_file(temp_file_path)
+            quality_controller.record(time.monotonic() - started)
             
     except Exception as e:
         return jsonify({'error': f'Face detection failed: {str(e)}'}), 500
 
+@api.route('/user/<user_id>/verify', methods=['POST'])
+@admission_controlled
+def verify_user(user_id):
+    """1:1 verification: is the face in the uploaded photo this user? Compares only against their templates"""
+    try:
+        if not face_service.available:
+            return jsonify({'error': 'Face recognition service not available'}), 500
+        
+        if 'photo' not in request.files:
+            return jsonify({'error': 'Photo is required'}), 400
+        
+        photo = request.files['photo']
+        
+        if photo.filename == '':
+            return jsonify({'error': 'No photo selected'}), 400
+        
+        try:
+            profile_name, profile = request_profile()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if not file_service.validate_file_size(photo):
+            return jsonify({'error': 'File size too large (max 16MB)'}), 400
+        
+        # The claimed identity's templates only: cached, or one lookup by _id; users of other tenants are not found
+        tenant = request_tenant()
+        enrolled = gallery_service.partition(tenant).user_templates(user_id)
+        if enrolled is None:
+            return jsonify({'error': 'User not found'}), 404
+        user_name, templates = enrolled
+        if templates is None:
+            return jsonify({'error': 'User has no usable face encoding yet'}), 409
+        
+        temp_file_path = file_service.save_uploaded_file(photo)
+        if not temp_file_path:
+            return jsonify({'error': 'Invalid file format'}), 400
+        
+        started = time.monotonic()
+        quality_level = quality_controller.level
+        options = quality_controller.options(profile_service.pipeline_options(profile))
+        tolerance = profile_service.tolerance(profile, face_service.method)
+        try:
+            probe_faces = face_service.extract_face_encodings(temp_file_path, options, g.deadline)
+            
+            result = {
+                'verified': False,
+                'user_id': user_id,
+                'user_name': user_name,
+                'faces_detected': len(probe_faces),
+                'tolerance': tolerance,
+                'method': face_service.method,
+                'profile': profile_name,
+                'quality_level': quality_level,
+                'partial': g.deadline.partial,
+                'skipped_stages': g.deadline.skipped
+            }
+            probe_vectors = [face_service.encoding_vector(face['encoding']) for face in probe_faces]
+            valid = [i for i, vector in enumerate(probe_vectors) if vector is not None]
+            if not valid:
+                result['message'] = 'No faces detected for verification'
+                return jsonify(result), 200
+            
+            with metrics.stage_timer('match'):
+                distances = face_service.distance_matrix(np.vstack([probe_vectors[i] for i in valid]), templates)
+            # The face in the photo closest to any of the user's templates
+            best_distances = distances.min(axis=1)
+            best = int(np.argmin(best_distances))
+            distance = float(best_distances[best])
+            face = probe_faces[valid[best]]
+            
+            result.update({
+                'verified': distance <= tolerance,
+                'distance': round(distance, 4),
+                'confidence': round(1 - distance, 4),
+                'location': face['coordinates']
+            })
+            recognition_events.record({
+                'timestamp': datetime.utcnow(),
+                'operation': 'verify',
+                'tenant': tenant,
+                'device': request_device(),
+                'request_id': g.request_id,
+                'recognized': result['verified'],
+                'user_id': user_id,
+                'user_name': user_name,
+                'distance': result['distance'],
+                'box': [int(value) for value in face['coordinates']],
+                'method': face_service.method,
+                'profile': profile_name,
+                'match_skipped': False
+            })
+            return jsonify(result), 200
+            
+        finally:
+            file_service.delete_file(temp_file_path)
+            quality_controller.record(time.monotonic() - started)
+            
+    except Exception as e:
+        return jsonify({'error': f'Verification failed: {str(e)}'}), 500
+
+@api.route('/match', methods=['POST'])
+@admission_controlled
+def match_encodings():
+    """Match encodings computed on the client against the gallery: no upload, decoding, detection or encoding"""
+    try:
+        if not face_service.available:
+            return jsonify({'error': 'Face recognition service not available'}), 500
+        
+        try:
+            profile_name, profile = request_profile()
+            vectors, method, version = request_encodings()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        max_encodings = int(os.getenv('MATCH_MAX_ENCODINGS', '32'))
+        if len(vectors) > max_encodings:
+            return jsonify({'error': f'Too many encodings (max {max_encodings})'}), 400
+        
+        # Distances are only meaningful between encodings of the same model
+        tag = face_service.encoding_tag()
+        if method != tag['method'] or version != str(tag['version']):
+            return jsonify({
+                'error': 'Encodings were produced by a different recognition method or version',
+                'expected': tag
+            }), 409
+        
+        tolerance = profile_service.tolerance(profile, face_service.method)
+        tenant = request_tenant()
+        gallery = gallery_service.partition(tenant)
+        matches = gallery.match([face_service.encoding_from_vector(vector) for vector in vectors], tolerance)
+        user_count = gallery.user_count()
+        gallery_size = gallery.gallery_size()
+        
+        device = request_device()
+        results = []
+        for best_match in matches:
+            result = build_recognition_result(best_match, user_count, gallery_size)
+            if best_match:
+                result['user_id'] = best_match['user_id']
+                metrics.recognitions_total.inc(result='hit')
+            else:
+                metrics.recognitions_total.inc(result='miss')
+            results.append(result)
+            recognition_events.record({
+                'timestamp': datetime.utcnow(),
+                'operation': 'match',
+                'tenant': tenant,
+                'device': device,
+                'request_id': g.request_id,
+                'recognized': best_match is not None,
+                'user_id': best_match['user_id'] if best_match else None,
+                'user_name': best_match['user_name'] if best_match else None,
+                'distance': round(float(best_match['distance']), 4) if best_match else None,
+                'box': None,
+                'method': face_service.method,
+                'profile': profile_name,
+                'match_skipped': False
+            })
+        
+        return jsonify({
+            'matches': results,
+            'encodings': len(results),
+            'tolerance': tolerance,
+            'method': face_service.method,
+            'profile': profile_name
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Matching failed: {str(e)}'}), 500
+
 @api.route('/users', methods=['GET'])
 def get_all_users():
     """Get all registered users"""
     try:
-        users = user_model.get_all_users()
-        
-        # Remove face encodings from response (if they exist) and add image URLs
-        for user in users:
-            if 'face_encoding' in user:
-                del user['face_encoding']
-            # Add image URL
-            if 'image_path' in user:
-                user['image_url'] = file_service.get_file_url(user['image_path'])
+        # Remove face encodings from response and add image URLs
+        users = [user_summary(user) for user in user_model.get_all_users()]
         
         return jsonify({
             'users': users,
             'total_count': len(users),
-            'face_recognition_method': FACE_RECOGNITION_METHOD
+            'face_recognition_method': current_method()
         }), 200
         
     except Exception as e:
@@ -229,22 +788,36 @@ def get_user(user_id):
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Remove face encoding from response (if it exists)
-        if 'face_encoding' in user:
-            del user['face_encoding']
-        
-        # Add image URL
-        if 'image_path' in user:
-            user['image_url'] = file_service.get_file_url(user['image_path'])
-        
         return jsonify({
-            'user': user,
-            'face_recognition_method': FACE_RECOGNITION_METHOD
+            'user': user_summary(user),
+            'face_recognition_method': current_method()
         }), 200
         
     except Exception as e:
         return jsonify({'error': f'Failed to get user: {str(e)}'}), 500
 
+@api.route('/user/<user_id>/status', methods=['GET'])
+def get_registration_status(user_id):
+    """Outcome of a registration accepted with 202"""
+    try:
+        user = user_model.get_user_by_id(user_id)
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        # Users registered synchronously are ready as soon as they exist
+        status = {
+            'user_id': user_id,
+            'name': user['name'],
+            'status': user.get('registration_status', 'ready')
+        }
+        if 'registration_error' in user:
+            status['error'] = user['registration_error']
+        return jsonify(status), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to get registration status: {str(e)}'}), 500
+
 @api.route('/user/<user_id>', methods=['DELETE'])
 def delete_user(user_id):
     """Delete a user"""
@@ -254,12 +827,16 @@ def delete_user(user_id):
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Delete user's image file
+        # Delete user's image files
         if 'image_path' in user:
             file_service.delete_file(user['image_path'])
+        for template in user.get('face_templates', []):
+            if 'image_path' in template:
+                file_service.delete_file(template['image_path'])
         
         # Delete user from database
         success = user_model.delete_user(user_id)
+        gallery_service.invalidate(user.get('tenant'))
         
         if success:
             return jsonify({'message': 'User deleted successfully'}), 200
@@ -269,6 +846,175 @@ def delete_user(user_id):
     except Exception as e:
         return jsonify({'error': f'Failed to delete user: {str(e)}'}), 500
 
+@api.route('/user/<user_id>/templates', methods=['GET'])
+def get_user_templates(user_id):
+    """List a user's enrollment templates"""
+    try:
+        user = user_model.get_user_by_id(user_id)
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        templates = []
+        if 'image_path' in user:
+            templates.append({
+                'image_url': file_service.get_file_url(user['image_path']),
+                'added_at': user.get('created_at')
+            })
+        for template in user.get('face_templates', []):
+            templates.append({
+                'image_url': file_service.get_file_url(template.get('image_path', '')),
+                'added_at': template.get('added_at')
+            })
+        
+        return jsonify({
+            'user_id': user_id,
+            'templates': templates,
+            'template_count': len(templates),
+            'max_templates': gallery_service.max_templates
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to get templates: {str(e)}'}), 500
+
+@api.route('/user/<user_id>/templates', methods=['POST'])
+@admission_controlled
+def add_user_template(user_id):
+    """Add another enrollment photo (template) to an existing user"""
+    try:
+        if not face_service.available:
+            return jsonify({'error': 'Face recognition service not available'}), 500
+        
+        if 'photo' not in request.files:
+            return jsonify({'error': 'Photo is required'}), 400
+        
+        photo = request.files['photo']
+        
+        if photo.filename == '':
+            return jsonify({'error': 'No photo selected'}), 400
+        
+        user = user_model.get_user_by_id(user_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        # Check the cap before doing any image work
+        template_count = 1 + len(user.get('face_templates', []))
+        if template_count >= gallery_service.max_templates:
+            return jsonify({'error': f'Template limit reached (max {gallery_service.max_templates})'}), 409
+        
+        # Validate file size
+        if not file_service.validate_file_size(photo):
+            return jsonify({'error': 'File size too large (max 16MB)'}), 400
+        
+        image_hash = hash_service.compute_hash_from_file(photo)
+        if image_hash is None:
+            return jsonify({'error': 'Invalid image format'}), 400
+        
+        # A near-duplicate photo adds no information to the user's templates
+        duplicate = find_duplicate_enrollment(image_hash, user.get('tenant'))
+        if duplicate:
+            if duplicate['_id'] == user_id:
+                return jsonify({
+                    'message': 'Template already enrolled',
+                    'user_id': user_id,
+                    'template_count': template_count,
+                    'duplicate': True
+                }), 200
+            return jsonify({'error': 'This photo is already registered to another user'}), 409
+        
+        # Save the uploaded photo under a unique name so it never overwrites another template
+        file_path = file_service.save_uploaded_file(
+            photo,
+            f"{user['name']}_{uuid.uuid4().hex[:8]}_{photo.filename}"
+        )
+        if not file_path:
+            return jsonify({'error': 'Invalid file format'}), 400
+        
+        face_encoding = face_service.extract_face_encoding(file_path)
+        if face_encoding is None:
+            file_service.delete_file(file_path)
+            return jsonify({'error': 'Could not extract face encoding from image'}), 400
+        
+        added = user_model.add_face_template(
+            user_id,
+            face_encoding,
+            file_path,
+            gallery_service.max_templates,
+            image_hash=image_hash,
+            image_hash_bands=hash_service.hash_bands(image_hash),
+            encoding_tag=face_service.encoding_tag()
+        )
+        if not added:
+            file_service.delete_file(file_path)
+            return jsonify({'error': f'Template limit reached (max {gallery_service.max_templates})'}), 409
+        
+        gallery_service.invalidate(user.get('tenant'))
+        
+        return jsonify({
+            'message': 'Template added successfully',
+            'user_id': user_id,
+            'template_count': template_count + 1,
+            'image_url': file_service.get_file_url(file_path)
+        }), 201
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to add template: {str(e)}'}), 500
+
+@api.route('/import', methods=['POST'])
+def import_users():
+    """Bulk-enroll users from an uploaded zip of labelled photos (runs in the background)"""
+    if not admin_authorized():
+        return jsonify({'error': 'Admin token required'}), 403
+    
+    try:
+        if import_service.running_jobs() >= import_service.max_concurrent_jobs:
+            return jsonify({'error': f'Too many imports running (max {import_service.max_concurrent_jobs})'}), 429
+        
+        if not face_service.available:
+            return jsonify({'error': 'Face recognition service not available'}), 500
+        
+        if 'archive' not in request.files:
+            return jsonify({'error': 'Archive is required'}), 400
+        
+        archive = request.files['archive']
+        
+        if archive.filename == '' or not archive.filename.lower().endswith('.zip'):
+            return jsonify({'error': 'A .zip archive is required'}), 400
+        
+        # Stage the archive outside the upload folder; the job removes it when done
+        staging_dir = tempfile.mkdtemp(prefix='import_upload_')
+        archive_path = os.path.join(staging_dir, 'archive.zip')
+        archive.save(archive_path)
+        
+        if not zipfile.is_zipfile(archive_path):
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return jsonify({'error': 'Invalid zip archive'}), 400
+        
+        job_id = import_service.start_import(archive_path, cleanup=True, tenant=request_tenant())
+        if job_id is None:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return jsonify({'error': f'Too many imports running (max {import_service.max_concurrent_jobs})'}), 429
+        
+        return jsonify({
+            'message': 'Import started',
+            'job_id': job_id,
+            'status_url': f'/api/import/{job_id}'
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': f'Import failed: {str(e)}'}), 500
+
+@api.route('/import/<job_id>', methods=['GET'])
+def get_import_status(job_id):
+    """Get the progress of a bulk import"""
+    if not admin_authorized():
+        return jsonify({'error': 'Admin token required'}), 403
+    
+    job = import_service.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Import job not found'}), 404
+    return jsonify(job), 200
+
 @api.route('/uploads/<path:filename>')
 def uploaded_file(filename):
     """Serve uploaded files"""
@@ -278,21 +1024,72 @@ def uploaded_file(filename):
     except Exception as e:
         return jsonify({'error': 'File not found'}), 404
 
+@api.route('/admin/profiling', methods=['GET', 'POST'])
+def profiling_settings():
+    """Show or change request profiling (JSON body: enabled, sample_rate, slow_threshold_ms)"""
+    if not admin_authorized():
+        return jsonify({'error': 'Admin token required'}), 403
+    
+    if request.method == 'POST':
+        settings = request.get_json(silent=True) or {}
+        try:
+            request_profiler.configure(
+                enabled=settings.get('enabled'),
+                sample_rate=settings.get('sample_rate'),
+                slow_threshold_ms=settings.get('slow_threshold_ms')
+            )
+        except (TypeError, ValueError):
+            return jsonify({'error': 'enabled must be a boolean, sample_rate and slow_threshold_ms numbers'}), 400
+    
+    return jsonify(request_profiler.stats()), 200
+
+@api.route('/admin/capture', methods=['GET', 'POST'])
+def capture_settings():
+    """Show or change request capture for replay (JSON body: enabled, sample_rate)"""
+    if not admin_authorized():
+        return jsonify({'error': 'Admin token required'}), 403
+    
+    if request.method == 'POST':
+        settings = request.get_json(silent=True) or {}
+        try:
+            request_capture.configure(enabled=settings.get('enabled'), sample_rate=settings.get('sample_rate'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'enabled must be a boolean and sample_rate a number'}), 400
+    
+    return jsonify(request_capture.stats()), 200
+
 @api.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
         'message': 'Face Detection API is running',
-        'face_recognition_method': FACE_RECOGNITION_METHOD
+        'face_recognition_method': current_method(),
+        'admission': admission_controller.stats(),
+        'match_batching': match_batcher.stats(),
+        'quality': quality_controller.stats(),
+        'recognition_events': recognition_events.stats(),
+        'registration': registration_worker.stats(),
+        'gallery_partitions': gallery_service.partition_stats(),
+        'threads': dict(thread_settings(), detector_instances=detector_instances())
     }), 200
 
+@api.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness endpoint: 200 once the database, face model and gallery are warmed up"""
+    ready = all(readiness.values())
+    return jsonify({
+        'ready': ready,
+        'checks': readiness,
+        'face_recognition_method': current_method()
+    }), 200 if ready else 503
+
 @api.route('/info', methods=['GET'])
 def get_info():
     """Get API information"""
     return jsonify({
         'api_version': '1.0.0',
-        'face_recognition_method': FACE_RECOGNITION_METHOD,
+        'face_recognition_method': current_method(),
         'supported_formats': ['png', 'jpg', 'jpeg', 'gif'],
         'max_file_size': '16MB',
         'endpoints': {
@@ -300,7 +1097,14 @@ def get_info():
             'detect': '/api/detect (POST)',
             'users': '/api/users (GET)',
             'user': '/api/user/<user_id> (GET, DELETE)',
+            'registration_status': '/api/user/<user_id>/status (GET)',
+            'verify': '/api/user/<user_id>/verify (POST)',
+            'match': '/api/match (POST)',
+            'templates': '/api/user/<user_id>/templates (GET, POST)',
+            'import': '/api/import (POST), /api/import/<job_id> (GET)',
             'health': '/api/health (GET)',
+            'ready': '/api/ready (GET)',
+            'metrics': '/metrics (GET)',
             'info': '/api/info (GET)'
         }
     }), 200
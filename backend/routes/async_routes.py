@@ -0,0 +1,285 @@
+"""
+ASGI front end for the API, built by app.create_asgi_app().
+
+Request bodies are received on the event loop, so a slow upload holds a
+coroutine instead of a thread. The user lookups run natively with an async
+MongoDB driver. Registration is admission-controlled here and then runs the
+Flask view's logic on a CPU-sized executor once its body has arrived. Every other
+route, including the CPU-bound /detect, is served by the Flask app on a worker
+thread with its usual hooks and admission control.
+"""
+
+import asyncio
+import contextvars
+import functools
+import io
+import os
+import re
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.wrappers import Request
+from models.database import db_instance, async_db_instance
+from models.user import AsyncUser
+from routes.api_routes_flexible import (
+    user_model, request_capture, recognition_events, current_method, user_summary, register_from_request,
+    admission_controller
+)
+from services.admission_service import AdmissionRejected
+from services import metrics
+from services.logging_service import get_logger, set_request_id
+
+logger = get_logger(__name__)
+
+async_user_model = AsyncUser(user_model)
+
+class BodyTooLarge(ValueError):
+    """Request body over MAX_CONTENT_LENGTH"""
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope and its fully received body"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ[name] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            # The body has been received in full; its real length wins
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def call_wsgi(wsgi_app, environ):
+    """Run a WSGI app to completion; returns (status, headers, body)"""
+    response = {}
+    chunks = []
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = headers
+        return chunks.append
+
+    result = wsgi_app(environ, start_response)
+    try:
+        chunks.extend(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], b''.join(chunks)
+
+async def register_user(asgi_app, request):
+    """Async /api/register: the Flask view's registration, with the same admission control"""
+    photo = request.files.get('photo')
+    weight = await asgi_app.run_blocking(admission_controller.image_weight, photo) if photo else 1
+    try:
+        # Waits on a blocking-pool thread so registrations in cpu_executor never exceed the admitted weight
+        await asgi_app.run_blocking(admission_controller.acquire, weight)
+    except AdmissionRejected as e:
+        return {'error': str(e)}, 503, {'Retry-After': str(e.retry_after)}
+
+    started = time.monotonic()
+    try:
+        # The body has already arrived on the event loop; decoding, hashing and the writes run in cpu_executor
+        return await asgi_app.run_cpu(register_from_request, request)
+    finally:
+        admission_controller.release(weight, time.monotonic() - started)
+
+async def get_all_users(asgi_app, request):
+    """Async /api/users"""
+    try:
+        users = [user_summary(user) for user in await async_user_model.get_all_users()]
+        return {
+            'users': users,
+            'total_count': len(users),
+            'face_recognition_method': current_method()
+        }, 200
+    except Exception as e:
+        return {'error': f'Failed to get users: {str(e)}'}, 500
+
+async def get_user(asgi_app, request, user_id):
+    """Async /api/user/<user_id>"""
+    try:
+        user = await async_user_model.get_user_by_id(user_id)
+        if not user:
+            return {'error': 'User not found'}, 404
+        return {
+            'user': user_summary(user),
+            'face_recognition_method': current_method()
+        }, 200
+    except Exception as e:
+        return {'error': f'Failed to get user: {str(e)}'}, 500
+
+# (method, path pattern, endpoint label, handler) served on the event loop
+NATIVE_ROUTES = [
+    ('POST', re.compile(r'^/api/register$'), '/api/register', register_user),
+    ('GET', re.compile(r'^/api/users$'), '/api/users', get_all_users),
+    ('GET', re.compile(r'^/api/user/(?P<user_id>[^/]+)$'), '/api/user/<user_id>', get_user)
+]
+
+class AsyncApp:
+    """ASGI application: native async routes, everything else through the Flask app on worker threads"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.max_body = flask_app.config.get('MAX_CONTENT_LENGTH')
+        # Registrations (image decoding and hashing); sized to the cores this worker may use
+        self.cpu_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('ASGI_CPU_WORKERS', str(os.cpu_count() or 1))),
+            thread_name_prefix='asgi-cpu'
+        )
+        # File I/O and Flask-served requests
+        self.blocking_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('ASGI_BLOCKING_WORKERS', '32')),
+            thread_name_prefix='asgi-blocking'
+        )
+
+    async def _run(self, executor, function, *args):
+        # Carry the request id and timing context into the worker thread
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, functools.partial(context.run, function, *args)
+        )
+
+    async def run_cpu(self, function, *args):
+        return await self._run(self.cpu_executor, function, *args)
+
+    async def run_blocking(self, function, *args):
+        return await self._run(self.blocking_executor, function, *args)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await async_db_instance.close_connection()
+                await self.run_blocking(recognition_events.close)
+                db_instance.close_connection()
+                self.cpu_executor.shutdown(wait=False)
+                self.blocking_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, scope, receive):
+        """
+        The request body, or None if the client went away. Raises BodyTooLarge past
+        MAX_CONTENT_LENGTH and ValueError for a malformed Content-Length header.
+        """
+        for name, value in scope.get('headers', []):
+            if name != b'content-length':
+                continue
+            try:
+                declared = int(value)
+            except ValueError:
+                raise ValueError('Invalid Content-Length header')
+            if declared < 0:
+                raise ValueError('Invalid Content-Length header')
+            if self.max_body and declared > self.max_body:
+                raise BodyTooLarge('File too large (max 16MB)')
+
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if self.max_body and size > self.max_body:
+                raise BodyTooLarge('File too large (max 16MB)')
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    async def _send(self, send, status, headers, body):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _http(self, scope, receive, send):
+        try:
+            body = await self._read_body(scope, receive)
+        except ValueError as e:
+            status = 413 if isinstance(e, BodyTooLarge) else 400
+            await self._send(send, status, [('Content-Type', 'application/json')],
+                             self.flask_app.json.dumps({'error': str(e)}).encode())
+            return
+        if body is None:
+            return
+
+        environ = build_environ(scope, body)
+        for method, pattern, endpoint, handler in NATIVE_ROUTES:
+            match = pattern.match(scope['path'])
+            if match and scope['method'] == method:
+                status, headers, content = await self._native(handler, endpoint, environ, match.groupdict())
+                break
+        else:
+            status, headers, content = await self.run_blocking(call_wsgi, self.flask_app, environ)
+        await self._send(send, status, headers, content)
+
+    async def _native(self, handler, endpoint, environ, params):
+        """Run a native route with the same request id, metrics, Server-Timing and capture as Flask views"""
+        started = time.perf_counter()
+        request_id = environ.get('HTTP_X_REQUEST_ID') or uuid.uuid4().hex
+        set_request_id(request_id)
+        metrics.begin_request_timings()
+        capture_request = request_capture.should_capture(endpoint)
+
+        request = Request(environ)
+        if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+            # Large uploads are spooled to temporary files while parsing
+            await self.run_blocking(lambda: request.files)
+        # (payload, status) or (payload, status, headers), as Flask views return
+        result = await handler(self, request, **params)
+        payload, status = result[:2]
+
+        response = self.flask_app.json.response(payload)
+        response.status_code = status
+        response.headers.update(result[2] if len(result) > 2 else {})
+        duration = time.perf_counter() - started
+        metrics.request_seconds.observe(duration, endpoint=endpoint, method=request.method)
+        metrics.requests_total.inc(endpoint=endpoint, method=request.method, status=str(status))
+        if status >= 500:
+            metrics.errors_total.inc(endpoint=endpoint)
+
+        entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in metrics.request_timings().items()]
+        entries.append(f"total;dur={duration * 1000:.2f}")
+        response.headers['Server-Timing'] = ', '.join(entries)
+        response.headers['X-Request-Id'] = request_id
+        if 'HTTP_ORIGIN' in environ:
+            response.headers['Access-Control-Allow-Origin'] = '*'
+
+        if capture_request:
+            request_capture.capture(request, response, endpoint, duration)
+        return status, response.headers.to_wsgi_list(), response.get_data()
@@ -0,0 +1,128 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from PIL import Image
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; carries a Retry-After hint in seconds"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Bounded admission control for the CPU-heavy face pipeline.
+
+    Requests are weighted by their decoded pixel count and admitted FIFO while the
+    total weight in flight stays within capacity. At most max_queue requests wait;
+    beyond that, or after max_wait_seconds, requests are rejected so the caller can
+    answer 503 with Retry-After instead of letting latency grow without bound.
+    """
+
+    def __init__(self):
+        self.capacity = int(os.getenv('ADMISSION_CAPACITY', str(os.cpu_count() or 1)))
+        self.max_queue = int(os.getenv('ADMISSION_MAX_QUEUE', '16'))
+        self.max_wait_seconds = float(os.getenv('ADMISSION_MAX_WAIT_SECONDS', '5'))
+        self.pixels_per_unit = int(os.getenv('ADMISSION_PIXELS_PER_UNIT', '2000000'))
+
+        self._condition = threading.Condition()
+        self._waiters = deque()
+        self._in_flight = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._last_wait = 0.0
+        self._service_time = 0.5  # EWMA of time spent holding a slot, seeds Retry-After
+
+    def image_weight(self, file):
+        """Weight of an uploaded image: one unit per pixels_per_unit, read from the header only"""
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+            file.seek(0)
+            return self.weight_for_pixels(width * height)
+        except Exception:
+            file.seek(0)
+            return 1
+
+    def weight_for_pixels(self, pixels):
+        units = math.ceil(pixels / self.pixels_per_unit)
+        return max(1, min(self.capacity, units))
+
+    def retry_after(self):
+        """Rough seconds until a queued request would be served"""
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self._service_time * backlog / max(1, self.capacity)))
+
+    def acquire(self, weight=1, timeout=None):
+        """
+        Block until weight units are free; raises AdmissionRejected if the queue is full or the wait times out.
+        timeout can only shorten max_wait_seconds (e.g. to a request's remaining deadline).
+        """
+        weight = max(1, min(self.capacity, weight))
+        started = time.monotonic()
+
+        with self._condition:
+            if not self._waiters and self._in_flight + weight <= self.capacity:
+                self._admit(weight, 0.0)
+                return 0.0
+
+            if len(self._waiters) >= self.max_queue:
+                self._rejected += 1
+                raise AdmissionRejected('Server busy, queue is full', self.retry_after())
+
+            ticket = object()
+            self._waiters.append(ticket)
+            max_wait = self.max_wait_seconds if timeout is None else min(timeout, self.max_wait_seconds)
+            deadline = started + max_wait
+            try:
+                while self._waiters[0] is not ticket or self._in_flight + weight > self.capacity:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._rejected += 1
+                        raise AdmissionRejected('Server busy, timed out waiting for capacity', self.retry_after())
+                    self._condition.wait(remaining)
+            finally:
+                self._waiters.remove(ticket)
+                # The next waiter may now be at the head of the queue
+                self._condition.notify_all()
+
+            waited = time.monotonic() - started
+            self._admit(weight, waited)
+            return waited
+
+    def _admit(self, weight, waited):
+        self._in_flight += weight
+        self._admitted += 1
+        self._total_wait += waited
+        self._last_wait = waited
+
+    def release(self, weight=1, held_seconds=None):
+        """Return weight units and wake waiting requests"""
+        weight = max(1, min(self.capacity, weight))
+        with self._condition:
+            self._in_flight -= weight
+            if held_seconds is not None:
+                self._service_time = 0.8 * self._service_time + 0.2 * held_seconds
+            self._condition.notify_all()
+
+    def stats(self):
+        """Snapshot of queue depth, utilisation and wait times"""
+        with self._condition:
+            return {
+                'capacity': self.capacity,
+                'in_flight': self._in_flight,
+                'queue_depth': len(self._waiters),
+                'max_queue': self.max_queue,
+                'admitted': self._admitted,
+                'rejected': self._rejected,
+                'last_wait_seconds': round(self._last_wait, 4),
+                'avg_wait_seconds': round(self._total_wait / self._admitted, 4) if self._admitted else 0.0,
+                'avg_service_seconds': round(self._service_time, 4)
+            }
@@ -0,0 +1,160 @@
+import os
+import queue
+import threading
+import time
+from services.metrics import record_timing
+from dotenv import load_dotenv
+from services.logging_service import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+class _PendingRequest:
+    """One caller waiting on the batch worker"""
+
+    def __init__(self, image_path=None, probe_encodings=None, tolerance=None, options=None, gallery=None):
+        self.image_path = image_path
+        self.gallery = gallery
+        self.options = options
+        self.probe_encodings = probe_encodings
+        self.tolerance = tolerance
+        self.faces = None
+        self.matches = None
+        self.error = None
+        self.done = threading.Event()
+
+class MatchBatcher:
+    """
+    Coalesces concurrent /detect requests into micro-batches.
+
+    The worker thread takes the first waiting request, keeps collecting for up to
+    window_ms or until max_batch_size requests are queued, then matches every probe
+    of the batch against the gallery in one probes x gallery computation. When the
+    face service can batch encoding across images (dlib CNN), the worker also
+    encodes the whole batch in one call; otherwise callers encode in their own
+    threads so CPU encoding stays parallel.
+    """
+
+    def __init__(self, gallery_service, face_service):
+        self.gallery_service = gallery_service
+        self.face_service = face_service
+        self.enabled = os.getenv('MATCH_BATCHING', 'true').lower() == 'true'
+        self.window_seconds = float(os.getenv('MATCH_BATCH_WINDOW_MS', '2')) / 1000.0
+        self.max_batch_size = int(os.getenv('MATCH_BATCH_MAX_SIZE', '32'))
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._batches = 0
+        self._batched_requests = 0
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name='match-batcher', daemon=True)
+                    self._worker.start()
+
+    def encode_and_match(self, image_path, tolerance=None, options=None, deadline=None, gallery=None):
+        """
+        Encode every face in image_path and match them against gallery (by default
+        the whole gallery, else e.g. a tenant partition); returns (faces, matches).
+        Once deadline has expired, matching is skipped and every match is None.
+        """
+        gallery = gallery or self.gallery_service
+        bounded = deadline is not None and deadline.bounded
+        if not self.enabled or bounded or not self.face_service.supports_batch_encoding(options):
+            # Deadline-bound requests encode in their own thread rather than wait for a batch window
+            faces = self.face_service.extract_face_encodings(image_path, options, deadline)
+            if not faces:
+                return faces, []
+            if bounded and deadline.expired():
+                deadline.skip('match')
+                return faces, [None] * len(faces)
+            if not self.enabled:
+                return faces, gallery.match([face['encoding'] for face in faces], tolerance)
+            request = _PendingRequest(probe_encodings=[face['encoding'] for face in faces], tolerance=tolerance,
+                                      gallery=gallery)
+            request.faces = faces
+        else:
+            request = _PendingRequest(image_path=image_path, tolerance=tolerance, options=options, gallery=gallery)
+
+        self._ensure_worker()
+        queued = time.perf_counter()
+        self._queue.put(request)
+        request.done.wait()
+        # Matching runs on the worker thread; report the caller's wait in its Server-Timing breakdown
+        record_timing('match_wait', time.perf_counter() - queued)
+        if request.error is not None:
+            raise request.error
+        return request.faces, request.matches
+
+    def _collect(self):
+        """Block for the first request, then gather more until the window closes or the batch is full"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._process(batch)
+            except Exception as e:
+                logger.error("Error processing match batch: %s", e)
+                for request in batch:
+                    request.error = e
+            finally:
+                for request in batch:
+                    request.done.set()
+
+    def _process(self, batch):
+        """Encode (if batchable) and match one micro-batch"""
+        # Requests running at different quality levels are encoded in separate calls
+        to_encode = {}
+        for request in batch:
+            if request.image_path is not None:
+                key = tuple(sorted((request.options or {}).items()))
+                to_encode.setdefault(key, []).append(request)
+
+        for requests in to_encode.values():
+            encoded = self.face_service.extract_face_encodings_batch(
+                [request.image_path for request in requests],
+                requests[0].options
+            )
+            for request, faces in zip(requests, encoded):
+                request.faces = faces
+                request.probe_encodings = [face['encoding'] for face in faces]
+
+        # One gallery pass per gallery partition and distinct tolerance (normally a single group for the whole batch)
+        groups = {}
+        for request in batch:
+            groups.setdefault((request.gallery, request.tolerance), []).append(request)
+
+        for (gallery, tolerance), requests in groups.items():
+            probes = [encoding for request in requests for encoding in request.probe_encodings]
+            matches = gallery.match(probes, tolerance) if probes else []
+            offset = 0
+            for request in requests:
+                count = len(request.probe_encodings)
+                request.matches = matches[offset:offset + count]
+                offset += count
+
+        self._batches += 1
+        self._batched_requests += len(batch)
+
+    def stats(self):
+        """Batching effectiveness counters"""
+        return {
+            'enabled': self.enabled,
+            'batches': self._batches,
+            'requests': self._batched_requests,
+            'avg_batch_size': round(self._batched_requests / self._batches, 2) if self._batches else 0.0
+        }
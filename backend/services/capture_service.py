@@ -0,0 +1,171 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from services.logging_service import get_logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+def summarize_result(endpoint, body, include_names=False):
+    """
+    The parts of a /detect or /register response a replay compares against.
+    Recognised faces are listed by user name only with include_names; otherwise
+    just whether each face was recognised.
+    """
+    body = body or {}
+    if endpoint.endswith('/detect'):
+        recognized = []
+        for face in body.get('faces', []):
+            recognition = face['recognition']
+            if include_names:
+                recognized.append(recognition.get('user_name') if recognition.get('recognized') else None)
+            else:
+                recognized.append(bool(recognition.get('recognized')))
+        return {'faces_detected': body.get('faces_detected'), 'recognized': recognized}
+    return {'error': body.get('error')} if 'error' in body else {'user_id': body.get('user_id')}
+
+class RequestCapture:
+    """
+    Opt-in capture of sampled /detect and /register traffic for later replay.
+
+    Every captured request stores its metadata (endpoint, selected headers and
+    fields, status, latency and a summary of the result) in a daily JSONL
+    index. Image bytes are kept only when the caller consented with an
+    X-Capture-Consent: true header or a capture_consent=true field; user
+    names are stored only in that case too. Records are written by a
+    background thread from a bounded queue, and capture stops once the
+    archive reaches max_bytes.
+    """
+
+    CONSENT_VALUES = ('1', 'true', 'yes')
+    # Request options worth reproducing on replay
+    HEADERS = ('X-Pipeline-Profile', 'X-Request-Deadline-Ms', 'X-Tenant-Id')
+    FIELDS = ('profile', 'deadline_ms', 'tenant')
+
+    def __init__(self):
+        self.enabled = os.getenv('CAPTURE_ENABLED', 'false').lower() == 'true'
+        self.sample_rate = float(os.getenv('CAPTURE_SAMPLE_RATE', '0.01'))
+        self.endpoints = set(os.getenv('CAPTURE_ENDPOINTS', '/api/detect,/api/register').split(','))
+        self.output_dir = os.getenv('CAPTURE_DIR', 'captures')
+        self.max_bytes = int(os.getenv('CAPTURE_MAX_MB', '1024')) * 1024 * 1024
+
+        self._queue = queue.Queue(maxsize=int(os.getenv('CAPTURE_QUEUE_SIZE', '256')))
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._archive_bytes = None
+        self._captured = 0
+        self._dropped = 0
+
+    def configure(self, enabled=None, sample_rate=None):
+        """Update settings from the admin endpoint"""
+        if enabled is not None:
+            if not isinstance(enabled, bool):
+                raise TypeError('enabled must be true or false')
+            self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+
+    def should_capture(self, endpoint):
+        """Sampling decision, made before the request runs"""
+        return self.enabled and endpoint in self.endpoints and random.random() < self.sample_rate
+
+    def capture(self, request, response, endpoint, duration_seconds):
+        """Queue one request/response pair for writing; never blocks the request"""
+        consent = (request.headers.get('X-Capture-Consent', '').lower() in self.CONSENT_VALUES
+                   or request.form.get('capture_consent', '').lower() in self.CONSENT_VALUES)
+
+        image = None
+        photo = request.files.get('photo')
+        if consent and photo is not None:
+            try:
+                photo.stream.seek(0)
+                image = (os.path.splitext(photo.filename or '')[1].lower() or '.jpg', photo.stream.read())
+            except Exception as e:
+                logger.warning("Could not read photo for capture: %s", e)
+
+        record = {
+            'capture_id': uuid.uuid4().hex,
+            'captured_at': datetime.utcnow().isoformat(),
+            'timestamp': time.time(),
+            'endpoint': endpoint,
+            'method': request.method,
+            'headers': {name: request.headers[name] for name in self.HEADERS if name in request.headers},
+            'fields': {name: request.form[name] for name in self.FIELDS if name in request.form},
+            'consent': consent,
+            'content_length': request.content_length,
+            'status': response.status_code,
+            'latency_ms': round(duration_seconds * 1000, 2),
+            'result': summarize_result(endpoint, response.get_json(silent=True), include_names=consent)
+        }
+        if consent and 'name' in request.form:
+            record['fields']['name'] = request.form['name']
+
+        try:
+            self._queue.put_nowait((record, image))
+        except queue.Full:
+            self._dropped += 1
+            return
+        self._ensure_writer()
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name='request-capture', daemon=True)
+                    self._writer.start()
+
+    def _current_archive_bytes(self):
+        total = 0
+        for root, _, files in os.walk(self.output_dir):
+            total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        return total
+
+    def _write_loop(self):
+        while True:
+            record, image = self._queue.get()
+            try:
+                self._write(record, image)
+            except Exception as e:
+                logger.error("Error writing request capture: %s", e)
+
+    def _write(self, record, image):
+        images_dir = os.path.join(self.output_dir, 'images')
+        os.makedirs(images_dir, exist_ok=True)
+        if self._archive_bytes is None:
+            self._archive_bytes = self._current_archive_bytes()
+        if self._archive_bytes >= self.max_bytes:
+            self._dropped += 1
+            return
+
+        if image is not None:
+            extension, content = image
+            image_file = record['capture_id'] + extension
+            with open(os.path.join(images_dir, image_file), 'wb') as f:
+                f.write(content)
+            record['image_file'] = os.path.join('images', image_file)
+            self._archive_bytes += len(content)
+
+        line = json.dumps(record) + '\n'
+        index_path = os.path.join(self.output_dir, f"{datetime.utcnow().strftime('%Y-%m-%d')}.jsonl")
+        with open(index_path, 'a', encoding='utf-8') as f:
+            f.write(line)
+        self._archive_bytes += len(line)
+        self._captured += 1
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'endpoints': sorted(self.endpoints),
+            'output_dir': self.output_dir,
+            'captured': self._captured,
+            'dropped': self._dropped,
+            'archive_bytes': self._archive_bytes
+        }
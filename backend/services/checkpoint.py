@@ -0,0 +1,26 @@
+import json
+import os
+
+class JsonlCheckpoint:
+    """Append-only JSON-lines record of processed items, so an interrupted job resumes"""
+
+    def __init__(self, path, key='name'):
+        self.path = path
+        self.key = key
+        self.processed = set()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self.processed.add(json.loads(line)[key])
+                    except (ValueError, KeyError):
+                        continue
+
+    def record(self, entries):
+        """Durably append a batch of entries, each carrying the checkpoint key"""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+                self.processed.add(entry[self.key])
+            f.flush()
+            os.fsync(f.fileno())
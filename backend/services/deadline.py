@@ -0,0 +1,37 @@
+import time
+
+class Deadline:
+    """
+    Latency budget for one request, passed through detect, encode and match.
+
+    Stages check expired() before optional work and call skip() when they cut
+    something short, so the response can be flagged as partial. A Deadline
+    without a budget never expires.
+    """
+
+    def __init__(self, budget_seconds=None, started=None):
+        self.budget_seconds = budget_seconds
+        self.started = started if started is not None else time.monotonic()
+        self.skipped = []
+
+    @property
+    def bounded(self):
+        return self.budget_seconds is not None
+
+    def remaining(self):
+        """Seconds left in the budget (None when unbounded, never negative)"""
+        if self.budget_seconds is None:
+            return None
+        return max(0.0, self.started + self.budget_seconds - time.monotonic())
+
+    def expired(self):
+        return self.budget_seconds is not None and self.remaining() <= 0
+
+    def skip(self, stage):
+        """Record that a stage was skipped or cut short to meet the deadline"""
+        if stage not in self.skipped:
+            self.skipped.append(stage)
+
+    @property
+    def partial(self):
+        return bool(self.skipped)
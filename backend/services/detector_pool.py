@@ -0,0 +1,36 @@
+import os
+import threading
+import cv2
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
+
+class DetectorPool:
+    """
+    One cv2.CascadeClassifier per thread. detectMultiScale keeps scratch state in
+    the classifier, so a single instance shared by a threaded server is not safe
+    to call concurrently; each request thread lazily loads its own copy instead.
+    """
+
+    def __init__(self, cascade_file='haarcascade_frontalface_default.xml'):
+        self.cascade_path = os.path.join(cv2.data.haarcascades, cascade_file)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._created = 0
+        # Load one up front so a missing cascade file is reported at startup
+        self.get()
+
+    def get(self):
+        """The calling thread's classifier"""
+        cascade = getattr(self._local, 'cascade', None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(self.cascade_path)
+            if cascade.empty():
+                logger.error("Could not load cascade %s", self.cascade_path)
+            self._local.cascade = cascade
+            with self._lock:
+                self._created += 1
+        return cascade
+
+    def stats(self):
+        return {'instances': self._created}
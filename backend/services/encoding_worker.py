@@ -0,0 +1,24 @@
+"""
+Per-process state for ProcessPoolExecutor workers that encode photos
+(bulk import and re-encoding migration). Use init_worker as the pool initializer.
+"""
+
+_face_service = None
+_hash_service = None
+
+def init_worker():
+    """Build the face and hash services once per worker process"""
+    global _face_service, _hash_service
+    from services.thread_config import configure_native_threads
+    # The pool already runs one process per core; nested native threads would oversubscribe
+    configure_native_threads(1)
+    from services.face_service_loader import create_face_service
+    from services.image_hash_service import ImageHashService
+    _face_service, _ = create_face_service()
+    _hash_service = ImageHashService()
+
+def get_face_service():
+    return _face_service
+
+def get_hash_service():
+    return _hash_service
@@ -0,0 +1,215 @@
+import atexit
+import collections
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+from models.database import db_instance
+from services.logging_service import get_logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+class RecognitionEventLog:
+    """
+    Write-behind audit log of recognitions in the recognition_events collection.
+
+    record() only appends to an in-memory buffer; a background thread writes the
+    buffer with insert_many once batch_size events are waiting or every
+    flush_seconds. The buffer holds at most max_buffer events: when MongoDB falls
+    behind, the overflow policy drops the oldest or the newest events. Batches
+    that fail to insert are spilled to JSONL files in spill_dir (when set, up to
+    spill_max_bytes) and re-inserted once MongoDB accepts writes again, otherwise
+    they are put back in the buffer while there is room. close() flushes what is
+    left and runs at interpreter exit.
+    """
+
+    OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest')
+
+    def __init__(self):
+        self.enabled = os.getenv('RECOGNITION_EVENTS_ENABLED', 'true').lower() == 'true'
+        self.batch_size = int(os.getenv('RECOGNITION_EVENTS_BATCH_SIZE', '500'))
+        self.flush_seconds = float(os.getenv('RECOGNITION_EVENTS_FLUSH_SECONDS', '2'))
+        self.max_buffer = int(os.getenv('RECOGNITION_EVENTS_MAX_BUFFER', '10000'))
+        self.overflow = os.getenv('RECOGNITION_EVENTS_OVERFLOW', 'drop_oldest')
+        if self.overflow not in self.OVERFLOW_POLICIES:
+            logger.warning("Unknown RECOGNITION_EVENTS_OVERFLOW %s, using drop_oldest", self.overflow)
+            self.overflow = 'drop_oldest'
+        self.spill_dir = os.getenv('RECOGNITION_EVENTS_SPILL_DIR')
+        self.spill_max_bytes = int(os.getenv('RECOGNITION_EVENTS_SPILL_MAX_MB', '100')) * 1024 * 1024
+
+        self._buffer = collections.deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._writer = None
+        self._written = 0
+        self._dropped = 0
+        self._spilled = 0
+        self._replayed = 0
+        self._failed_batches = 0
+
+    @property
+    def collection(self):
+        return db_instance.get_collection('recognition_events')
+
+    def ensure_indexes(self):
+        """Indexes for time-range and per-user/per-device audit queries (called once at warm-up)"""
+        try:
+            if self.collection is None:
+                return
+            self.collection.create_index('timestamp')
+            self.collection.create_index([('user_id', 1), ('timestamp', -1)])
+            self.collection.create_index([('device', 1), ('timestamp', -1)])
+        except Exception as e:
+            logger.error("Error creating recognition event indexes: %s", e)
+
+    def record(self, event):
+        """Queue one event; never blocks on MongoDB"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self._dropped += 1
+                if self.overflow == 'drop_newest':
+                    return
+                self._buffer.popleft()
+            self._buffer.append(event)
+            pending = len(self._buffer)
+        if self._writer is None:
+            self._start()
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def _start(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name='recognition-events', daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+
+    def _take_batch(self):
+        with self._lock:
+            count = min(self.batch_size, len(self._buffer))
+            return [self._buffer.popleft() for _ in range(count)]
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered now, batch by batch; returns False if a batch failed"""
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                break
+            if not self._insert(batch):
+                self._handle_failed(batch)
+                return False
+        self._replay_spill()
+        return True
+
+    def _insert(self, batch):
+        try:
+            # Unordered so one bad document does not hold back the rest of the batch
+            self.collection.insert_many(batch, ordered=False)
+            self._written += len(batch)
+            return True
+        except BulkWriteError as e:
+            # Per-document errors are not retried; duplicate ids are events written by an earlier attempt
+            errors = e.details.get('writeErrors', [])
+            self._written += e.details.get('nInserted', 0)
+            self._dropped += sum(1 for error in errors if error.get('code') != 11000)
+            return True
+        except Exception as e:
+            self._failed_batches += 1
+            logger.warning("Could not write %d recognition events: %s", len(batch), e)
+            return False
+
+    def _handle_failed(self, batch):
+        if self.spill_dir and self._spill(batch):
+            return
+        with self._lock:
+            room = self.max_buffer - len(self._buffer)
+            # Oldest events first, ahead of anything recorded meanwhile
+            keep = batch[:max(0, room)]
+            self._buffer.extendleft(reversed(keep))
+            self._dropped += len(batch) - len(keep)
+
+    def _spill_bytes(self):
+        return sum(os.path.getsize(path) for path in glob.glob(os.path.join(self.spill_dir, '*.jsonl')))
+
+    def _spill(self, batch):
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            if self._spill_bytes() >= self.spill_max_bytes:
+                return False
+            lines = [json.dumps(event, default=self._encode_value) for event in batch]
+            path = os.path.join(self.spill_dir, f"events_{time.time_ns()}.jsonl")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+            self._spilled += len(batch)
+            return True
+        except Exception as e:
+            logger.error("Error spilling recognition events: %s", e)
+            return False
+
+    def _replay_spill(self):
+        """Insert spilled batches once MongoDB is writable again; stops at the first failure"""
+        if not self.spill_dir:
+            return
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, '*.jsonl'))):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    batch = [self._decode_event(json.loads(line)) for line in f if line.strip()]
+            except Exception as e:
+                logger.error("Unreadable recognition event spill file %s: %s", path, e)
+                continue
+            if batch and not self._insert(batch):
+                return
+            os.remove(path)
+            self._replayed += len(batch)
+
+    def _encode_value(self, value):
+        if isinstance(value, datetime):
+            return {'$date': value.isoformat()}
+        if isinstance(value, ObjectId):
+            # Keeps the _id insert_many assigned, so a replay cannot duplicate a partly written batch
+            return {'$oid': str(value)}
+        raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+    def _decode_event(self, event):
+        for key, value in event.items():
+            if isinstance(value, dict) and '$date' in value:
+                event[key] = datetime.fromisoformat(value['$date'])
+            elif isinstance(value, dict) and '$oid' in value:
+                event[key] = ObjectId(value['$oid'])
+        return event
+
+    def close(self, timeout=10):
+        """Stop the writer and flush what is still buffered"""
+        self._stop.set()
+        self._wake.set()
+        if self._writer is not None:
+            self._writer.join(timeout)
+        self.flush()
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'buffered': len(self._buffer),
+            'written': self._written,
+            'dropped': self._dropped,
+            'spilled': self._spilled,
+            'replayed_from_spill': self._replayed,
+            'failed_batches': self._failed_batches,
+            'overflow': self.overflow
+        }
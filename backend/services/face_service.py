@@ -1,46 +1,79 @@
 import cv2
+import time
 import face_recognition
 import numpy as np
+from services.image_utils import downscale_image, upscale_box
+from services.detector_pool import DetectorPool
+from services.metrics import stage_timer, detect_pass_seconds
 from PIL import Image
 import os
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
 
 class FaceService:
+    DEFAULT_TOLERANCE = 0.6
+    ENCODING_SIZE = 128
+    # Stored with every encoding; bump ENCODING_VERSION when the encoding pipeline changes
+    METHOD = 'advanced'
+    ENCODING_VERSION = 1
+    # Cascade passes tried in order until one finds a face
+    DETECTION_PARAMS = [
+        {'scaleFactor': 1.1, 'minNeighbors': 5, 'minSize': (30, 30)},
+        {'scaleFactor': 1.05, 'minNeighbors': 4, 'minSize': (20, 20)},
+        {'scaleFactor': 1.2, 'minNeighbors': 6, 'minSize': (40, 40)},
+        {'scaleFactor': 1.3, 'minNeighbors': 3, 'minSize': (15, 15)}
+    ]
+    
     def __init__(self):
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        # Per-thread classifiers: safe under threaded WSGI/ASGI servers
+        self.detectors = DetectorPool()
+        # "hog" (CPU) or "cnn" (dlib CNN, batchable across images on GPU)
+        self.detection_model = os.getenv('FACE_DETECTION_MODEL', 'hog')
+        self.num_jitters = int(os.getenv('FACE_ENCODING_JITTERS', '1'))
     
-    def detect_faces_opencv(self, image_path):
+    @property
+    def face_cascade(self):
+        """The calling thread's cascade classifier"""
+        return self.detectors.get()
+    
+    def detect_faces_opencv(self, image_path, options=None, deadline=None):
         """Detect faces using OpenCV with improved parameters"""
+        options = options or {}
         try:
             # Read the image
-            image = cv2.imread(image_path)
+            with stage_timer('decode'):
+                image = cv2.imread(image_path)
             if image is None:
                 return []
             
             # Convert to grayscale
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gray, scale = downscale_image(gray, options.get('max_dimension'))
             
-            # Apply histogram equalization to improve detection
-            gray = cv2.equalizeHist(gray)
-            
-            # Try multiple detection parameters for better results
-            detection_params = [
-                {'scaleFactor': 1.1, 'minNeighbors': 5, 'minSize': (30, 30)},
-                {'scaleFactor': 1.05, 'minNeighbors': 4, 'minSize': (20, 20)},
-                {'scaleFactor': 1.2, 'minNeighbors': 6, 'minSize': (40, 40)},
-                {'scaleFactor': 1.3, 'minNeighbors': 3, 'minSize': (15, 15)}
-            ]
-            
-            faces = []
-            for params in detection_params:
-                detected = self.face_cascade.detectMultiScale(gray, **params)
-                if len(detected) > 0:
-                    faces = detected
-                    break
+            with stage_timer('detect'):
+                # Apply histogram equalization to improve detection
+                gray = cv2.equalizeHist(gray)
+                
+                # Fallback passes run in order until one finds a face; quality levels may cap them
+                # and an expired deadline stops the chain after the first pass
+                passes = options.get('cascade_passes') or len(self.DETECTION_PARAMS)
+                faces = []
+                for index, params in enumerate(self.DETECTION_PARAMS[:passes]):
+                    if index > 0 and deadline is not None and deadline.expired():
+                        deadline.skip('detect_fallback')
+                        break
+                    pass_started = time.perf_counter()
+                    detected = self.face_cascade.detectMultiScale(gray, **params)
+                    detect_pass_seconds.observe(time.perf_counter() - pass_started, **{'pass': str(index)})
+                    if len(detected) > 0:
+                        faces = detected
+                        break
             
-            return faces.tolist() if len(faces) > 0 else []
+            return [upscale_box(face, scale) for face in faces]
             
         except Exception as e:
-            print(f"Error detecting faces with OpenCV: {e}")
+            logger.error("Error detecting faces with OpenCV: %s", e)
             return []
     
     def extract_face_encoding(self, image_path):
@@ -64,9 +97,138 @@ class FaceService:
                 return None
                 
         except Exception as e:
-            print(f"Error extracting face encoding: {e}")
+            logger.error("Error extracting face encoding: %s", e)
             return None
     
+    def extract_face_encodings(self, image_path, options=None, deadline=None):
+        """
+        Extract encodings for every face in the image with one batched call.
+        options may set detection_model, upsample, landmark_model, num_jitters and
+        max_dimension (downscale before detection); see Config.PIPELINE_PROFILES.
+        """
+        options = options or {}
+        try:
+            with stage_timer('decode'):
+                image = face_recognition.load_image_file(image_path)
+            image, scale = downscale_image(image, options.get('max_dimension'))
+            with stage_timer('locate'):
+                face_locations = face_recognition.face_locations(
+                    image,
+                    number_of_times_to_upsample=options.get('upsample', 1),
+                    model=options.get('detection_model', self.detection_model)
+                )
+            with stage_timer('encode'):
+                return self._encode_locations(image, face_locations, options, scale, deadline)
+            
+        except Exception as e:
+            logger.error("Error extracting face encodings: %s", e)
+            return []
+    
+    def _encode_locations(self, image, face_locations, options=None, scale=1.0, deadline=None):
+        """Encode all given face locations of one image"""
+        options = options or {}
+        if not face_locations:
+            return []
+        
+        num_jitters = options.get('num_jitters', self.num_jitters)
+        landmark_model = options.get('landmark_model', 'small')
+        if deadline is not None and deadline.bounded:
+            # Encode face by face so the remaining faces can be dropped once the budget runs out
+            face_encodings = []
+            for index, location in enumerate(face_locations):
+                if index > 0 and deadline.expired():
+                    deadline.skip('encode')
+                    face_locations = face_locations[:index]
+                    break
+                face_encodings += face_recognition.face_encodings(
+                    image, [location], num_jitters=num_jitters, model=landmark_model
+                )
+        else:
+            # face_encodings encodes all locations in a single pass over the image
+            face_encodings = face_recognition.face_encodings(
+                image,
+                face_locations,
+                num_jitters=num_jitters,
+                model=landmark_model
+            )
+        
+        faces = []
+        for (top, right, bottom, left), encoding in zip(face_locations, face_encodings):
+            faces.append({
+                'coordinates': upscale_box([left, top, right - left, bottom - top], scale),
+                'encoding': encoding
+            })
+        return faces
+    
+    def supports_batch_encoding(self, options=None):
+        """Whether detection across several images can run as one batched call (CNN model only)"""
+        options = options or {}
+        return options.get('detection_model', self.detection_model) == 'cnn'
+    
+    def extract_face_encodings_batch(self, image_paths, options=None):
+        """Extract encodings for every face in several images; returns one list of faces per image"""
+        options = options or {}
+        try:
+            images = []
+            scales = []
+            for path in image_paths:
+                image, scale = downscale_image(face_recognition.load_image_file(path), options.get('max_dimension'))
+                images.append(image)
+                scales.append(scale)
+            
+            # batch_face_locations needs equally sized images; group them by shape
+            groups = {}
+            for index, image in enumerate(images):
+                groups.setdefault(image.shape, []).append(index)
+            
+            model = options.get('detection_model', self.detection_model)
+            upsample = options.get('upsample', 1)
+            results = [[] for _ in images]
+            for indices in groups.values():
+                batch = [images[i] for i in indices]
+                if self.supports_batch_encoding(options) and len(batch) > 1:
+                    locations = face_recognition.batch_face_locations(
+                        batch,
+                        number_of_times_to_upsample=upsample,
+                        batch_size=len(batch)
+                    )
+                else:
+                    locations = [
+                        face_recognition.face_locations(image, number_of_times_to_upsample=upsample, model=model)
+                        for image in batch
+                    ]
+                for index, image, face_locations in zip(indices, batch, locations):
+                    results[index] = self._encode_locations(image, face_locations, options, scales[index])
+            return results
+            
+        except Exception as e:
+            logger.error("Error extracting face encodings in batch: %s", e)
+            return [self.extract_face_encodings(path, options) for path in image_paths]
+    
+    def encoding_tag(self):
+        """Identify encodings produced by this service"""
+        return {'method': self.METHOD, 'version': self.ENCODING_VERSION}
+    
+    def encoding_vector(self, encoding):
+        """Return the encoding as a flat vector for matrix matching, or None if incompatible"""
+        if encoding is None or isinstance(encoding, dict):
+            return None
+        vector = np.asarray(encoding, dtype=np.float64).ravel()
+        return vector if vector.shape[0] == self.ENCODING_SIZE else None
+    
+    def encoding_from_vector(self, vector):
+        """Inverse of encoding_vector for client-supplied vectors; None if the size is wrong"""
+        vector = np.asarray(vector, dtype=np.float64).ravel()
+        return vector if vector.shape[0] == self.ENCODING_SIZE else None
+    
+    def distance_matrix(self, probe_matrix, gallery_matrix):
+        """Euclidean distances between every probe and every gallery encoding (probes x gallery)"""
+        # ||p - g||^2 = ||p||^2 + ||g||^2 - 2 p.g, so the whole matrix is one matrix multiply
+        probe_sq = np.einsum('ij,ij->i', probe_matrix, probe_matrix)[:, None]
+        gallery_sq = np.einsum('ij,ij->i', gallery_matrix, gallery_matrix)[None, :]
+        squared = probe_sq + gallery_sq - 2.0 * (probe_matrix @ gallery_matrix.T)
+        return np.sqrt(np.maximum(squared, 0.0))
+    
     def compare_faces(self, known_encodings, unknown_encoding, tolerance=0.6):
         """Compare face encodings to find matches"""
         try:
@@ -100,7 +262,7 @@ class FaceService:
             }
             
         except Exception as e:
-            print(f"Error comparing faces: {e}")
+            logger.error("Error comparing faces: %s", e)
             return {'matches': [], 'distances': []}
     
     def find_best_match(self, known_encodings, unknown_encoding, user_names, tolerance=0.6):
@@ -132,7 +294,7 @@ class FaceService:
             return None
             
         except Exception as e:
-            print(f"Error finding best match: {e}")
+            logger.error("Error finding best match: %s", e)
             return None
     
     def validate_image(self, image_path):
@@ -190,5 +352,5 @@ class FaceService:
                 return enhanced
                 
         except Exception as e:
-            print(f"Error preprocessing image: {e}")
+            logger.error("Error preprocessing image: %s", e)
             return None
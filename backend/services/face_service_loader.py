@@ -0,0 +1,75 @@
+import os
+import threading
+from dotenv import load_dotenv
+from services.logging_service import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+def create_face_service():
+    """
+    Create the best available face service, or the one named by FACE_RECOGNITION_METHOD.
+    Returns (face_service, method) where method is "advanced", "opencv" or "none".
+    """
+    preferred = os.getenv('FACE_RECOGNITION_METHOD', 'auto').lower()
+
+    # Try to import advanced face recognition, fall back to OpenCV-only
+    if preferred in ('auto', 'advanced'):
+        try:
+            from services.face_service import FaceService
+            logger.info("Using advanced face recognition (face_recognition library)")
+            return FaceService(), "advanced"
+        except ImportError:
+            pass
+
+    try:
+        from services.face_service_opencv import FaceServiceOpenCV
+        logger.info("Using OpenCV-only face recognition")
+        return FaceServiceOpenCV(), "opencv"
+    except ImportError:
+        logger.error("No face recognition service available")
+        return None, "none"
+
+class LazyFaceService:
+    """
+    Stand-in for the face service that defers importing face_recognition/dlib and
+    building the service until first use (or until a warm-up thread calls load()).
+    Attribute access is forwarded to the real service once it is loaded.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._service = None
+        self._method = None
+
+    def load(self):
+        """Build the face service once; safe to call from several threads"""
+        if not self._loaded.is_set():
+            with self._lock:
+                if not self._loaded.is_set():
+                    self._service, self._method = create_face_service()
+                    self._loaded.set()
+        return self._service
+
+    @property
+    def is_loaded(self):
+        return self._loaded.is_set()
+
+    @property
+    def available(self):
+        """Whether a face service could be created (loads it if needed)"""
+        return self.load() is not None
+
+    @property
+    def method(self):
+        """Recognition method in use: "advanced", "opencv" or "none" (loads it if needed)"""
+        self.load()
+        return self._method
+
+    def __getattr__(self, name):
+        service = self.load()
+        if service is None:
+            raise AttributeError(f"No face recognition service available (accessing '{name}')")
+        return getattr(service, name)
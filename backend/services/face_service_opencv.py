@@ -1,8 +1,15 @@
 import cv2
+import time
 import numpy as np
+from services.image_utils import downscale_image, upscale_box
+from services.detector_pool import DetectorPool
+from services.metrics import stage_timer, detect_pass_seconds
 from PIL import Image
 import os
 import pickle
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
 
 class FaceServiceOpenCV:
     """
@@ -10,8 +17,23 @@ class FaceServiceOpenCV:
     This version doesn't require the face_recognition library or Visual C++ build tools.
     """
     
+    DEFAULT_TOLERANCE = 0.5
+    # Stored with every encoding; bump ENCODING_VERSION when the encoding pipeline changes
+    METHOD = 'opencv'
+    ENCODING_VERSION = 1
+    # Grey-level histogram bins of an encoding
+    ENCODING_SIZE = 256
+    # Cascade passes tried in order until one finds a face
+    DETECTION_PARAMS = [
+        {'scaleFactor': 1.1, 'minNeighbors': 5, 'minSize': (30, 30)},
+        {'scaleFactor': 1.05, 'minNeighbors': 4, 'minSize': (20, 20)},
+        {'scaleFactor': 1.2, 'minNeighbors': 6, 'minSize': (40, 40)},
+        {'scaleFactor': 1.3, 'minNeighbors': 3, 'minSize': (15, 15)}
+    ]
+    
     def __init__(self):
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        # Per-thread classifiers: safe under threaded WSGI/ASGI servers
+        self.detectors = DetectorPool()
         # Remove the face recognizer that requires opencv-contrib-python
         # self.face_recognizer = cv2.face.LBPHFaceRecognizer_create()
         self.encodings_file = 'face_encodings.pkl'
@@ -19,39 +41,76 @@ class FaceServiceOpenCV:
         self.next_label = 0
         self.load_face_data()
     
-    def detect_faces_opencv(self, image_path):
+    @property
+    def face_cascade(self):
+        """The calling thread's cascade classifier"""
+        return self.detectors.get()
+    
+    def _detect(self, gray, options, deadline=None):
+        """
+        Run the cascade fallback chain on a grayscale image; returns the detected boxes.
+        The whole chain is timed as the 'detect' stage, each pass in detect_pass_seconds.
+        """
+        with stage_timer('detect'):
+            # Apply histogram equalization to improve detection
+            equalized = cv2.equalizeHist(gray)
+            
+            # Fallback passes run in order until one finds a face; quality levels may cap them
+            # and an expired deadline stops the chain after the first pass
+            passes = options.get('cascade_passes') or len(self.DETECTION_PARAMS)
+            for index, params in enumerate(self.DETECTION_PARAMS[:passes]):
+                if index > 0 and deadline is not None and deadline.expired():
+                    deadline.skip('detect_fallback')
+                    break
+                pass_started = time.perf_counter()
+                detected = self.face_cascade.detectMultiScale(equalized, **params)
+                detect_pass_seconds.observe(time.perf_counter() - pass_started, **{'pass': str(index)})
+                if len(detected) > 0:
+                    return detected
+            return []
+    
+    def detect_faces_opencv(self, image_path, options=None, deadline=None):
         """Detect faces using OpenCV with multiple detection methods"""
+        options = options or {}
         try:
-            image = cv2.imread(image_path)
+            with stage_timer('decode'):
+                image = cv2.imread(image_path)
             if image is None:
                 return []
             
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gray, scale = downscale_image(gray, options.get('max_dimension'))
+            faces = self._detect(gray, options, deadline)
             
-            # Apply histogram equalization to improve detection
-            gray = cv2.equalizeHist(gray)
-            
-            # Try multiple scale factors and parameters for better detection
-            detection_params = [
-                {'scaleFactor': 1.1, 'minNeighbors': 5, 'minSize': (30, 30)},
-                {'scaleFactor': 1.05, 'minNeighbors': 4, 'minSize': (20, 20)},
-                {'scaleFactor': 1.2, 'minNeighbors': 6, 'minSize': (40, 40)},
-                {'scaleFactor': 1.3, 'minNeighbors': 3, 'minSize': (15, 15)}
-            ]
-            
-            faces = []
-            for params in detection_params:
-                detected = self.face_cascade.detectMultiScale(gray, **params)
-                if len(detected) > 0:
-                    faces = detected
-                    break
-            
-            return faces.tolist() if len(faces) > 0 else []
+            return [upscale_box(face, scale) for face in faces]
             
         except Exception as e:
-            print(f"Error detecting faces with OpenCV: {e}")
+            logger.error("Error detecting faces with OpenCV: %s", e)
             return []
     
+    def _encode_face(self, gray, face):
+        """Build the histogram encoding for one detected face"""
+        (x, y, w, h) = face
+        
+        # Extract face region
+        face_roi = gray[y:y+h, x:x+w]
+        
+        # Resize to standard size
+        face_roi = cv2.resize(face_roi, (100, 100))
+        
+        # Calculate histogram as feature vector
+        hist = cv2.calcHist([face_roi], [0], None, [self.ENCODING_SIZE], [0, 256])
+        hist = hist.flatten()
+        
+        # Normalize
+        hist = hist / (np.sum(hist) + 1e-7)
+        
+        return {
+            'face_region': face_roi,
+            'histogram': hist,
+            'coordinates': (x, y, w, h)
+        }
+    
     def extract_face_encoding(self, image_path):
         """Extract face features using OpenCV (returns face region and histogram)"""
         try:
@@ -60,36 +119,87 @@ class FaceServiceOpenCV:
                 return None
             
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, 1.1, 5)
+            # The same equalised fallback chain as /detect, so enrolled photos are found like probes
+            faces = self._detect(gray, {})
             
             if len(faces) == 0:
                 return None
             
             # Use the largest face
-            (x, y, w, h) = max(faces, key=lambda face: face[2] * face[3])
-            
-            # Extract face region
-            face_roi = gray[y:y+h, x:x+w]
-            
-            # Resize to standard size
-            face_roi = cv2.resize(face_roi, (100, 100))
-            
-            # Calculate histogram as feature vector
-            hist = cv2.calcHist([face_roi], [0], None, [256], [0, 256])
-            hist = hist.flatten()
+            largest = max(faces, key=lambda face: face[2] * face[3])
+            return self._encode_face(gray, [int(v) for v in largest])
             
-            # Normalize
-            hist = hist / (np.sum(hist) + 1e-7)
+        except Exception as e:
+            logger.error("Error extracting face encoding: %s", e)
+            return None
+    
+    def extract_face_encodings(self, image_path, options=None, deadline=None):
+        """
+        Extract encodings for every face in the image from a single decode and the same
+        cascade fallback chain as detect_faces_opencv. options may set max_dimension to
+        downscale before detection and cascade_passes to cap the chain.
+        """
+        options = options or {}
+        try:
+            with stage_timer('decode'):
+                image = cv2.imread(image_path)
+            if image is None:
+                return []
             
-            return {
-                'face_region': face_roi,
-                'histogram': hist,
-                'coordinates': (x, y, w, h)
-            }
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gray, scale = downscale_image(gray, options.get('max_dimension'))
+            faces = self._detect(gray, options, deadline)
+            
+            encodings = []
+            with stage_timer('encode'):
+                for index, face in enumerate(faces):
+                    if index > 0 and deadline is not None and deadline.expired():
+                        deadline.skip('encode')
+                        break
+                    encoding = self._encode_face(gray, [int(v) for v in face])
+                    encoding['coordinates'] = tuple(upscale_box(encoding['coordinates'], scale))
+                    encodings.append({
+                        'coordinates': list(encoding['coordinates']),
+                        'encoding': encoding
+                    })
+            return encodings
             
         except Exception as e:
-            print(f"Error extracting face encoding: {e}")
+            logger.error("Error extracting face encodings: %s", e)
+            return []
+    
+    def supports_batch_encoding(self, options=None):
+        """Haar cascades have no cross-image batch mode"""
+        return False
+    
+    def extract_face_encodings_batch(self, image_paths, options=None):
+        """Extract encodings for every face in several images; returns one list of faces per image"""
+        return [self.extract_face_encodings(path, options) for path in image_paths]
+    
+    def encoding_tag(self):
+        """Identify encodings produced by this service"""
+        return {'method': self.METHOD, 'version': self.ENCODING_VERSION}
+    
+    def encoding_vector(self, encoding):
+        """Return the histogram as a flat vector for matrix matching, or None if incompatible"""
+        if not isinstance(encoding, dict) or 'histogram' not in encoding:
             return None
+        return np.asarray(encoding['histogram'], dtype=np.float64).ravel()
+    
+    def encoding_from_vector(self, vector):
+        """Inverse of encoding_vector for client-supplied histograms; None if the size is wrong"""
+        vector = np.asarray(vector, dtype=np.float64).ravel()
+        return {'histogram': vector} if vector.shape[0] == self.ENCODING_SIZE else None
+    
+    def distance_matrix(self, probe_matrix, gallery_matrix):
+        """Correlation distances (1 - HISTCMP_CORREL) between every probe and gallery histogram"""
+        # Pearson correlation is the dot product of mean-centred, unit-norm vectors
+        def _standardize(matrix):
+            centred = matrix - matrix.mean(axis=1, keepdims=True)
+            norms = np.linalg.norm(centred, axis=1, keepdims=True)
+            return centred / np.where(norms == 0, 1.0, norms)
+        
+        return 1.0 - _standardize(probe_matrix) @ _standardize(gallery_matrix).T
     
     def compare_faces_opencv(self, known_encodings, unknown_encoding, tolerance=0.5):
         """Compare face encodings using histogram correlation"""
@@ -126,7 +236,7 @@ class FaceServiceOpenCV:
             }
             
         except Exception as e:
-            print(f"Error comparing faces: {e}")
+            logger.error("Error comparing faces: %s", e)
             return {'matches': [], 'distances': []}
     
     def find_best_match(self, known_encodings, unknown_encoding, user_names, tolerance=0.5):
@@ -158,12 +268,12 @@ class FaceServiceOpenCV:
             return None
             
         except Exception as e:
-            print(f"Error finding best match: {e}")
+            logger.error("Error finding best match: %s", e)
             return None
     
     def train_face_recognizer(self, faces, labels):
         """Train the LBPH face recognizer - disabled (requires opencv-contrib-python)"""
-        print("Face recognizer training is disabled - requires opencv-contrib-python")
+        logger.warning("Face recognizer training is disabled - requires opencv-contrib-python")
         return False
     
     def save_face_data(self):
@@ -176,7 +286,7 @@ class FaceServiceOpenCV:
             with open(self.encodings_file, 'wb') as f:
                 pickle.dump(data, f)
         except Exception as e:
-            print(f"Error saving face data: {e}")
+            logger.error("Error saving face data: %s", e)
     
     def load_face_data(self):
         """Load face encodings and labels from file"""
@@ -187,7 +297,7 @@ class FaceServiceOpenCV:
                     self.user_labels = data.get('user_labels', {})
                     self.next_label = data.get('next_label', 0)
         except Exception as e:
-            print(f"Error loading face data: {e}")
+            logger.error("Error loading face data: %s", e)
     
     def validate_image(self, image_path):
         """Validate if the image is valid and contains a face"""
@@ -241,5 +351,5 @@ class FaceServiceOpenCV:
                 return enhanced
                 
         except Exception as e:
-            print(f"Error preprocessing image: {e}")
+            logger.error("Error preprocessing image: %s", e)
             return None
@@ -1,10 +1,14 @@
 import os
 import uuid
 from werkzeug.utils import secure_filename
+from services.metrics import stage_timer
 from dotenv import load_dotenv
+from services.logging_service import get_logger
 
 load_dotenv()
 
+logger = get_logger(__name__)
+
 class FileService:
     def __init__(self):
         self.upload_folder = os.getenv('UPLOAD_FOLDER', 'uploads')
@@ -33,13 +37,14 @@ class FileService:
                     filename = f"{uuid.uuid4().hex}.{file_extension}"
                 
                 file_path = os.path.join(self.upload_folder, filename)
-                file.save(file_path)
+                with stage_timer('upload_read'):
+                    file.save(file_path)
                 return file_path
             else:
                 return None
                 
         except Exception as e:
-            print(f"Error saving uploaded file: {e}")
+            logger.error("Error saving uploaded file: %s", e)
             return None
     
     def delete_file(self, file_path):
@@ -50,7 +55,7 @@ class FileService:
                 return True
             return False
         except Exception as e:
-            print(f"Error deleting file: {e}")
+            logger.error("Error deleting file: %s", e)
             return False
     
     def get_file_url(self, file_path):
@@ -59,7 +64,7 @@ class FileService:
             # Return relative path for serving via Flask
             return file_path.replace('\\', '/')
         except Exception as e:
-            print(f"Error getting file URL: {e}")
+            logger.error("Error getting file URL: %s", e)
             return None
     
     def validate_file_size(self, file, max_size_mb=16):
@@ -74,7 +79,7 @@ class FileService:
             return file_size <= max_size_bytes
             
         except Exception as e:
-            print(f"Error validating file size: {e}")
+            logger.error("Error validating file size: %s", e)
             return False
     
     def create_user_folder(self, user_name):
@@ -85,7 +90,7 @@ class FileService:
                 os.makedirs(user_folder)
             return user_folder
         except Exception as e:
-            print(f"Error creating user folder: {e}")
+            logger.error("Error creating user folder: %s", e)
             return None
     
     def get_file_info(self, file_path):
@@ -102,5 +107,5 @@ class FileService:
             else:
                 return {'exists': False}
         except Exception as e:
-            print(f"Error getting file info: {e}")
+            logger.error("Error getting file info: %s", e)
             return {'exists': False}
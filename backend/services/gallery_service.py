@@ -0,0 +1,377 @@
+import collections
+import os
+import threading
+import time
+import numpy as np
+from services.metrics import stage_timer, gallery_users, gallery_templates
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class GalleryService:
+    """
+    In-memory gallery of registered users' face encodings.
+
+    Each user owns up to max_templates enrollment templates (the registration
+    photo plus any added through /user/<id>/templates). Templates are packed
+    into a users x templates x dims tensor so a probe image with any number of
+    faces is matched with one distance computation and one reduction per user,
+    either the minimum over a user's templates or the distance to their centroid.
+    Users registered without an encoding, or whose encodings were produced by a
+    different recognition method/version, are re-encoded once from their photos
+    and the result is persisted. This lazy path is bounded per rebuild and runs
+    outside the gallery lock, so matching continues against the gallery built
+    without those users until it is swapped in; the migrate_encodings.py job
+    converts the whole gallery in bulk.
+
+    The gallery built without a tenant holds every user. partition(tenant) gives a
+    separate gallery of that tenant's users only, loaded on first use; at most
+    max_partitions are kept and the least recently used one is dropped, so search
+    cost and memory follow the partition's size rather than the user count.
+    """
+
+    AGGREGATIONS = ('min', 'centroid')
+
+    def __init__(self, user_model, face_service, tenant=None):
+        self.user_model = user_model
+        self.face_service = face_service
+        self.tenant = tenant
+        self.max_templates = int(os.getenv('MAX_TEMPLATES_PER_USER', '5'))
+        # Rebuild periodically so users written by other processes (e.g. the bulk importer) show up
+        self.max_age_seconds = float(os.getenv('GALLERY_MAX_AGE_SECONDS', '60'))
+        # Bound lazy re-encoding (after switching recognition method) per rebuild to avoid a thundering herd
+        self.reencode_limit = int(os.getenv('GALLERY_REENCODE_LIMIT', '25'))
+        self.reencode_retry_seconds = float(os.getenv('GALLERY_REENCODE_RETRY_SECONDS', '5'))
+        self.aggregation = os.getenv('GALLERY_AGGREGATION', 'min')
+        if self.aggregation not in self.AGGREGATIONS:
+            self.aggregation = 'min'
+        # Users' templates kept for 1:1 verification between gallery rebuilds
+        self.verify_cache_size = int(os.getenv('VERIFY_CACHE_SIZE', '1000'))
+        self.max_partitions = int(os.getenv('GALLERY_MAX_PARTITIONS', '64'))
+
+        self._lock = threading.Lock()
+        self._dirty = True
+        self._build_id = 0
+        self._expires_at = 0.0
+        self._reencode_budget = 0
+        self._reencode_pending = False
+        self._templates = None  # (users, max_templates, dims)
+        self._mask = None       # (users, max_templates) True where a template exists
+        self._centroids = None  # (users, dims)
+        self._user_ids = []
+        self._user_names = []
+        self._user_count = 0
+        self._by_user = {}      # user_id -> (name, templates x dims) views into the gallery tensor
+        self._verify_cache = collections.OrderedDict()
+        self._verify_lock = threading.Lock()
+        self._partitions = collections.OrderedDict()  # tenant -> GalleryService, least recently used first
+        self._partitions_lock = threading.Lock()
+        self._evicted_partitions = 0
+
+    def invalidate(self, tenant=None):
+        """
+        Mark the given tenant's partition stale so it is rebuilt on next use. Without a
+        tenant, this gallery and every loaded partition are marked stale. A tenant's
+        changes reach this gallery, which holds every user, at its periodic rebuild.
+        """
+        with self._verify_lock:
+            self._verify_cache.clear()
+        if tenant:
+            with self._partitions_lock:
+                partition = self._partitions.get(tenant)
+            if partition is not None:
+                partition.invalidate()
+            return
+
+        self._dirty = True
+        with self._partitions_lock:
+            partitions = list(self._partitions.values())
+        for partition in partitions:
+            partition.invalidate()
+
+    def partition(self, tenant):
+        """The gallery of one tenant's users (this gallery when tenant is empty), loaded lazily"""
+        if not tenant:
+            return self
+        with self._partitions_lock:
+            partition = self._partitions.get(tenant)
+            if partition is not None:
+                self._partitions.move_to_end(tenant)
+                return partition
+            partition = GalleryService(self.user_model, self.face_service, tenant)
+            self._partitions[tenant] = partition
+            # Requests still holding an evicted partition finish with it; it is freed afterwards
+            while len(self._partitions) > self.max_partitions:
+                self._partitions.popitem(last=False)
+                self._evicted_partitions += 1
+            return partition
+
+    def partition_stats(self):
+        """Loaded tenant partitions and their gallery sizes, without building any"""
+        with self._partitions_lock:
+            partitions = list(self._partitions.items())
+        return {
+            'max_partitions': self.max_partitions,
+            'loaded': len(partitions),
+            'evicted': self._evicted_partitions,
+            'users': {tenant: len(partition._user_ids) for tenant, partition in partitions}
+        }
+
+    def _is_current(self, method, version, vector):
+        """Whether a stored encoding can be matched with the active face service"""
+        if vector is None:
+            return False
+        if method is None:
+            # Untagged encodings predate tagging; accept them if they have the right shape
+            return True
+        tag = self.face_service.encoding_tag()
+        return method == tag['method'] and version == tag['version']
+
+    def _reserve_reencode(self, user_id):
+        """
+        Allow a lazy re-encode only within this rebuild's budget and if no other
+        process already holds the user's re-encode lease. Anything deferred keeps
+        the gallery due for an early rebuild, which picks up the other process's write.
+        """
+        if self._reencode_budget <= 0 or not self.user_model.claim_reencode(user_id):
+            self._reencode_pending = True
+            return False
+        self._reencode_budget -= 1
+        return True
+
+    def _slots(self, user):
+        """
+        (template index or None for the primary, encoding, method, version, image_path), capped
+        per user. Photos that yielded no face under the active method/version are left out.
+        """
+        slots = [(None, user.get('face_encoding'), user.get('face_encoding_method'),
+                  user.get('face_encoding_version'), user.get('image_path'), user.get('face_encoding_error'))]
+        for index, template in enumerate(user.get('face_templates', [])):
+            slots.append((index, template.get('encoding'), template.get('method'),
+                          template.get('version'), template.get('image_path'), template.get('encoding_error')))
+        tag = self.face_service.encoding_tag()
+        return [slot[:5] for slot in slots[:self.max_templates] if slot[5] != tag]
+
+    def _template_vectors(self, user):
+        """
+        A user's current template vectors (primary first), bounded by the per-user cap, and
+        the (index, image_path) of missing or stale (other method/version) templates to re-encode
+        """
+        vectors = []
+        stale = []
+        for index, encoding, method, version, image_path in self._slots(user):
+            vector = self.face_service.encoding_vector(encoding)
+            if self._is_current(method, version, vector):
+                vectors.append(vector)
+            elif image_path:
+                stale.append((index, image_path))
+        return vectors, stale
+
+    def _reencode(self, user, stale, vectors):
+        """
+        Encode stale templates from their photos, persist them and add them to vectors.
+        A photo without a face is marked as such for this method/version so it is not retried.
+        """
+        tag = self.face_service.encoding_tag()
+        for index, image_path in stale:
+            encoding = self.face_service.extract_face_encoding(image_path)
+            if encoding is None:
+                self.user_model.mark_encoding_failed(user['_id'], index, tag)
+                continue
+            if index is None:
+                self.user_model.set_face_encoding(user['_id'], encoding, tag)
+                vectors.insert(0, self.face_service.encoding_vector(encoding))
+            else:
+                self.user_model.set_template_encoding(user['_id'], index, encoding, tag)
+                vectors.append(self.face_service.encoding_vector(encoding))
+        self.user_model.release_reencode(user['_id'])
+
+    def _rebuild(self):
+        """
+        Load all users and pack their current templates into the gallery tensor.
+        Returns (build_id, entries, user_count, claimed): the users claimed for
+        re-encoding, as (user, stale, vectors), for _finish_reencode.
+        """
+        self._dirty = False
+        self._build_id += 1
+        self._reencode_budget = self.reencode_limit
+        self._reencode_pending = False
+        users = self.user_model.get_all_users_with_encoding(self.tenant)
+        entries = []
+        claimed = []
+
+        for user in users:
+            # Encoded by the background registration worker, not lazily here
+            if user.get('registration_status') in ('pending', 'failed'):
+                continue
+            vectors, stale = self._template_vectors(user)
+            entries.append((user['_id'], user['name'], vectors))
+            if stale and self._reserve_reencode(user['_id']):
+                claimed.append((user, stale, vectors))
+
+        self._install(entries, len(users))
+        return self._build_id, entries, len(users), claimed
+
+    def _install(self, entries, user_count):
+        """Pack (user_id, name, vectors) entries into the gallery tensor and make it current"""
+        entries = [entry for entry in entries if entry[2]]
+        user_ids = [user_id for user_id, _, _ in entries]
+        user_names = [name for _, name, _ in entries]
+        per_user = [vectors for _, _, vectors in entries]
+
+        if per_user:
+            dims = per_user[0][0].shape[0]
+            width = max(len(vectors) for vectors in per_user)
+            templates = np.zeros((len(per_user), width, dims))
+            mask = np.zeros((len(per_user), width), dtype=bool)
+            for i, vectors in enumerate(per_user):
+                templates[i, :len(vectors)] = vectors
+                mask[i, :len(vectors)] = True
+            counts = mask.sum(axis=1, keepdims=True)
+            self._templates = templates
+            self._mask = mask
+            self._centroids = templates.sum(axis=1) / counts
+        else:
+            self._templates = None
+            self._mask = None
+            self._centroids = None
+
+        self._user_ids = user_ids
+        self._user_names = user_names
+        self._user_count = user_count
+        self._by_user = {
+            user_id: (user_names[i], self._templates[i][self._mask[i]])
+            for i, user_id in enumerate(user_ids)
+        }
+        # Users left stale by the re-encode budget are picked up by a sooner rebuild
+        max_age = self.reencode_retry_seconds if self._reencode_pending else self.max_age_seconds
+        self._expires_at = time.monotonic() + max_age
+        if self.tenant is None:
+            gallery_users.set(len(user_ids))
+            gallery_templates.set(int(self._mask.sum()) if self._mask is not None else 0)
+
+    def _finish_reencode(self, build_id, entries, user_count, claimed):
+        """Encode the users claimed by a rebuild, outside the lock, then swap in the completed gallery"""
+        for user, stale, vectors in claimed:
+            self._reencode(user, stale, vectors)
+        with self._lock:
+            # A newer rebuild has already loaded the persisted encodings
+            if self._build_id == build_id:
+                self._install(entries, user_count)
+            return self._current()
+
+    def _current(self):
+        return (self._templates, self._mask, self._centroids,
+                self._user_ids, self._user_names, self._user_count)
+
+    def snapshot(self):
+        """Return (templates, mask, centroids, user_ids, user_names, user_count), rebuilding if stale"""
+        build = None
+        with self._lock:
+            if self._dirty or time.monotonic() > self._expires_at:
+                with stage_timer('gallery_load'):
+                    build = self._rebuild()
+            current = self._current()
+        if build and build[3]:
+            # Photo decoding and encoding must not hold up matches against the gallery just built
+            return self._finish_reencode(*build)
+        return current
+
+    def user_templates(self, user_id):
+        """
+        (user_name, templates x dims) of one user for 1:1 verification. Served from the
+        built gallery or an LRU cache, else loaded with one lookup by _id; never rebuilds
+        the gallery, so the cost does not grow with the number of users. Returns None
+        for an unknown user (or one outside this tenant's partition) and (name, None)
+        when the user has no usable encoding.
+        """
+        if not self._dirty:
+            entry = self._by_user.get(user_id)
+            if entry is not None:
+                return entry
+
+        with self._verify_lock:
+            if user_id in self._verify_cache:
+                self._verify_cache.move_to_end(user_id)
+                return self._verify_cache[user_id]
+
+        user = self.user_model.get_user_with_encoding(user_id)
+        if user is None or (self.tenant and user.get('tenant') != self.tenant):
+            return None
+        vectors = []
+        if user.get('registration_status') not in ('pending', 'failed'):
+            vectors, stale = self._template_vectors(user)
+            # One user's photos at most; the lease keeps concurrent verifications from all encoding them
+            if stale and self.user_model.claim_reencode(user['_id']):
+                self._reencode(user, stale, vectors)
+        entry = (user['name'], np.vstack(vectors) if vectors else None)
+
+        with self._verify_lock:
+            self._verify_cache[user_id] = entry
+            while len(self._verify_cache) > self.verify_cache_size:
+                self._verify_cache.popitem(last=False)
+        return entry
+
+    def gallery_size(self):
+        """Number of users with at least one usable template"""
+        return len(self.snapshot()[3])
+
+    def user_count(self):
+        """Number of registered users, with or without usable templates"""
+        return self.snapshot()[5]
+
+    def user_distances(self, probe_matrix, aggregation=None, snapshot=None):
+        """Distances from every probe to every user (probes x users), aggregated over templates"""
+        templates, mask, centroids, _, _, _ = snapshot or self.snapshot()
+        if templates is None:
+            return None
+
+        if (aggregation or self.aggregation) == 'centroid':
+            return self.face_service.distance_matrix(probe_matrix, centroids)
+
+        users, width, dims = templates.shape
+        distances = self.face_service.distance_matrix(probe_matrix, templates.reshape(users * width, dims))
+        distances = distances.reshape(len(probe_matrix), users, width)
+        # Padding slots never win the min reduction
+        return np.where(mask[None, :, :], distances, np.inf).min(axis=2)
+
+    def match(self, probe_encodings, tolerance=None, aggregation=None):
+        """
+        Match every probe encoding against the gallery in one vectorised pass.
+        Returns a list with one match dict (or None) per probe.
+        """
+        if tolerance is None:
+            tolerance = self.face_service.DEFAULT_TOLERANCE
+
+        results = [None] * len(probe_encodings)
+        probe_vectors = [self.face_service.encoding_vector(encoding) for encoding in probe_encodings]
+        valid = [i for i, vector in enumerate(probe_vectors) if vector is not None]
+        if not valid:
+            return results
+
+        snapshot = self.snapshot()
+        user_ids, user_names = snapshot[3], snapshot[4]
+        with stage_timer('match'):
+            distances = self.user_distances(
+                np.vstack([probe_vectors[i] for i in valid]),
+                aggregation,
+                snapshot
+            )
+        if distances is None:
+            return results
+
+        best_indices = np.argmin(distances, axis=1)
+        best_distances = distances[np.arange(len(valid)), best_indices]
+
+        for row, probe_index in enumerate(valid):
+            distance = float(best_distances[row])
+            if distance <= tolerance:
+                gallery_index = int(best_indices[row])
+                results[probe_index] = {
+                    'user_id': user_ids[gallery_index],
+                    'user_name': user_names[gallery_index],
+                    'confidence': 1 - distance,
+                    'distance': distance
+                }
+
+        return results
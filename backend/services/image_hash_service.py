@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+import os
+from dotenv import load_dotenv
+from services.logging_service import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+class ImageHashService:
+    """
+    Perceptual hashing (dHash) of uploaded images, used to spot re-uploads and
+    near-duplicate enrollments before any file or face encoding work is done.
+    """
+
+    HASH_SIZE = 8  # 8x8 gradient grid -> 64-bit hash
+    BAND_BITS = 8  # 8 bands of 8 bits; any hash within 7 bits shares a band
+
+    def __init__(self):
+        self.max_distance = int(os.getenv('DUPLICATE_HASH_MAX_DISTANCE', '5'))
+
+    def compute_dhash(self, image):
+        """Compute the 64-bit difference hash of a BGR or grayscale image as a hex string"""
+        try:
+            if image is None:
+                return None
+
+            if len(image.shape) == 3:
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+            # Shrink to (HASH_SIZE + 1) x HASH_SIZE and compare horizontal neighbours
+            resized = cv2.resize(image, (self.HASH_SIZE + 1, self.HASH_SIZE), interpolation=cv2.INTER_AREA)
+            diff = resized[:, 1:] > resized[:, :-1]
+
+            value = int(np.packbits(diff.flatten()).view('>u8')[0])
+            return f"{value:016x}"
+
+        except Exception as e:
+            logger.error("Error computing image hash: %s", e)
+            return None
+
+    def compute_hash_from_file(self, file):
+        """Decode an uploaded file in memory and hash it; the file pointer is rewound"""
+        try:
+            data = file.read()
+            file.seek(0)
+
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+            return self.compute_dhash(image)
+
+        except Exception as e:
+            logger.error("Error hashing uploaded file: %s", e)
+            return None
+
+    def hash_bands(self, image_hash):
+        """Split a hash into position-tagged bands for indexed candidate lookup"""
+        chars_per_band = self.BAND_BITS // 4
+        return [
+            f"{i}:{image_hash[start:start + chars_per_band]}"
+            for i, start in enumerate(range(0, len(image_hash), chars_per_band))
+        ]
+
+    def hamming_distance(self, hash_a, hash_b):
+        """Number of differing bits between two hex hashes"""
+        return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
@@ -0,0 +1,24 @@
+import cv2
+
+def downscale_image(image, max_dimension=None):
+    """
+    Shrink an image so its longest side is at most max_dimension.
+    Returns (image, scale) where scale maps original coordinates to the returned image.
+    """
+    if not max_dimension:
+        return image, 1.0
+
+    height, width = image.shape[:2]
+    longest = max(height, width)
+    if longest <= max_dimension:
+        return image, 1.0
+
+    scale = max_dimension / longest
+    resized = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    return resized, scale
+
+def upscale_box(box, scale):
+    """Map an (x, y, w, h) box from a downscaled image back to original coordinates"""
+    if scale == 1.0:
+        return [int(v) for v in box]
+    return [int(round(v / scale)) for v in box]
@@ -0,0 +1,319 @@
+import csv
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from werkzeug.utils import secure_filename
+from services.checkpoint import JsonlCheckpoint
+from services.encoding_worker import init_worker, get_face_service, get_hash_service
+from services.image_hash_service import ImageHashService
+from dotenv import load_dotenv
+from services.logging_service import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+def _encode_person(task):
+    """Copy and encode one person's photos; runs inside a pool worker"""
+    import cv2
+
+    name, paths, upload_folder, max_templates = task
+    face_service = get_face_service()
+    hash_service = get_hash_service()
+    encoded = []
+
+    for source_path in paths:
+        if len(encoded) >= max_templates:
+            break
+        try:
+            image = cv2.imread(source_path)
+            if image is None:
+                continue
+
+            image_hash = hash_service.compute_dhash(image)
+            file_path = os.path.join(
+                upload_folder,
+                secure_filename(f"{name}_{os.path.basename(source_path)}")
+            )
+            shutil.copyfile(source_path, file_path)
+
+            encoding = face_service.extract_face_encoding(file_path)
+            if encoding is None:
+                os.remove(file_path)
+                continue
+
+            encoded.append({
+                'encoding': encoding,
+                'encoding_tag': face_service.encoding_tag(),
+                'image_path': file_path,
+                'image_hash': image_hash
+            })
+        except Exception as e:
+            logger.error("Error encoding %s: %s", source_path, e)
+
+    if not encoded:
+        return {'name': name, 'error': 'No face encoding could be extracted'}
+
+    primary = encoded[0]
+    return {
+        'name': name,
+        'user': {
+            'name': name,
+            'image_path': primary['image_path'],
+            'face_encoding': primary['encoding'],
+            'encoding_tag': primary['encoding_tag'],
+            'image_hash': primary['image_hash'],
+            'image_hash_bands': hash_service.hash_bands(primary['image_hash']) if primary['image_hash'] else [],
+            'face_templates': encoded[1:]
+        }
+    }
+
+class ImportService:
+    """
+    Bulk enrollment from a directory, CSV manifest or zip archive of labelled photos.
+
+    Photos are encoded in a process pool, users are written with batched
+    insert_many calls, and every written batch is checkpointed. As with /register,
+    a person whose photo is a near-duplicate of a photo enrolled under another name
+    (or of another person's photo in the same import) is rejected.
+    """
+
+    def __init__(self, user_model, file_service, gallery_service=None):
+        self.user_model = user_model
+        self.file_service = file_service
+        self.gallery_service = gallery_service
+        self.batch_size = int(os.getenv('IMPORT_BATCH_SIZE', '500'))
+        self.max_templates = int(os.getenv('MAX_TEMPLATES_PER_USER', '5'))
+        # Background imports run a process pool each; bound how many the API process starts
+        self.max_concurrent_jobs = int(os.getenv('IMPORT_MAX_CONCURRENT_JOBS', '1'))
+        self.hash_service = ImageHashService()
+        self.jobs = {}
+        self._jobs_lock = threading.Lock()
+
+    def _is_image(self, filename):
+        return self.file_service.allowed_file(filename)
+
+    def _collect_directory(self, directory):
+        """Collect {name: [paths]} from <dir>/<name>/*.jpg or <dir>/<name>.jpg"""
+        manifest = os.path.join(directory, 'manifest.csv')
+        if os.path.exists(manifest):
+            return self._collect_manifest(manifest)
+
+        entries = {}
+        for entry in sorted(os.listdir(directory)):
+            path = os.path.join(directory, entry)
+            if os.path.isdir(path):
+                photos = [
+                    os.path.join(path, filename)
+                    for filename in sorted(os.listdir(path))
+                    if self._is_image(filename)
+                ]
+                if photos:
+                    entries.setdefault(entry, []).extend(photos)
+            elif self._is_image(entry):
+                entries.setdefault(os.path.splitext(entry)[0], []).append(path)
+        return entries
+
+    def _collect_manifest(self, manifest_path):
+        """Collect {name: [paths]} from a CSV with 'name' and 'path' columns"""
+        base = os.path.dirname(os.path.abspath(manifest_path))
+        entries = {}
+        with open(manifest_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                name = (row.get('name') or '').strip()
+                path = (row.get('path') or '').strip()
+                if name and path:
+                    entries.setdefault(name, []).append(os.path.join(base, path))
+        return entries
+
+    def collect_entries(self, source):
+        """
+        Resolve a source into {name: [photo paths]}.
+        Returns (entries, staging_dir) where staging_dir must be removed after a zip import.
+        """
+        if zipfile.is_zipfile(source):
+            staging_dir = tempfile.mkdtemp(prefix='import_')
+            with zipfile.ZipFile(source) as archive:
+                archive.extractall(staging_dir)
+            # Archives often wrap everything in a single top-level folder
+            children = os.listdir(staging_dir)
+            root = staging_dir
+            if len(children) == 1 and os.path.isdir(os.path.join(staging_dir, children[0])):
+                root = os.path.join(staging_dir, children[0])
+            return self._collect_directory(root), staging_dir
+
+        if os.path.isdir(source):
+            return self._collect_directory(source), None
+
+        if source.lower().endswith('.csv'):
+            return self._collect_manifest(source), None
+
+        raise ValueError(f"Unsupported import source: {source}")
+
+    def run_import(self, source, checkpoint_path=None, workers=None, progress=None, tenant=None):
+        """Import every labelled person in source (into tenant, if given); returns a summary dict"""
+        entries, staging_dir = self.collect_entries(source)
+        checkpoint = JsonlCheckpoint(checkpoint_path or f"{source.rstrip('/')}.checkpoint.jsonl")
+        summary = {'total': len(entries), 'imported': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+        if progress is not None:
+            progress.update(summary)
+
+        try:
+            # Skip anything already handled by a previous run or already registered
+            pending = [name for name in entries if name not in checkpoint.processed]
+            existing = self.user_model.get_existing_names(pending, tenant)
+            summary['skipped'] = len(entries) - len(pending) + len(existing)
+            pending = [name for name in pending if name not in existing]
+
+            tasks = [
+                (name, entries[name], self.file_service.upload_folder, self.max_templates)
+                for name in pending
+            ]
+
+            batch = []
+            failures = []
+            # Spawned, not forked: /api/import runs this from a threaded server, and forking
+            # a process that holds locks or a MongoClient can deadlock the workers
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                for result in pool.map(_encode_person, tasks, chunksize=8):
+                    if 'error' in result:
+                        failures.append({'name': result['name'], 'status': 'failed', 'error': result['error']})
+                    else:
+                        if tenant:
+                            result['user']['tenant'] = tenant
+                        batch.append(result['user'])
+
+                    if len(batch) + len(failures) >= self.batch_size:
+                        self._flush(batch, failures, checkpoint, summary, tenant)
+                        batch, failures = [], []
+                        if progress is not None:
+                            progress.update(summary)
+
+            self._flush(batch, failures, checkpoint, summary, tenant)
+            if progress is not None:
+                progress.update(summary)
+            return summary
+
+        finally:
+            if staging_dir:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _user_hashes(self, user):
+        """Perceptual hashes of a user's registration photo and templates"""
+        hashes = [user.get('image_hash')]
+        hashes += [template.get('image_hash') for template in user.get('face_templates', [])]
+        return [image_hash for image_hash in hashes if image_hash]
+
+    def _index_bands(self, users, by_band):
+        """Add users to by_band under every hash band of their photos"""
+        for user in users:
+            for image_hash in self._user_hashes(user):
+                for band in self.hash_service.hash_bands(image_hash):
+                    by_band.setdefault(band, []).append(user)
+
+    def _is_duplicate(self, user, by_band):
+        """
+        Whether any of user's photos is a near-duplicate of another name's photo among the
+        candidates in by_band: enrolled users sharing a band, and users accepted from this batch
+        """
+        for image_hash in self._user_hashes(user):
+            candidates = [candidate for band in self.hash_service.hash_bands(image_hash)
+                          for candidate in by_band.get(band, [])]
+            for candidate in candidates:
+                if candidate['name'] == user['name']:
+                    continue
+                for candidate_hash in self._user_hashes(candidate):
+                    if self.hash_service.hamming_distance(image_hash, candidate_hash) <= self.hash_service.max_distance:
+                        return True
+        return False
+
+    def _flush(self, batch, failures, checkpoint, summary, tenant=None):
+        """Drop duplicate photos, write one batch with insert_many and checkpoint its outcome"""
+        failures = list(failures)
+        accepted = []
+        # One lookup for the enrolled candidates of the whole batch instead of one per photo and band
+        bands = sorted({band for user in batch for image_hash in self._user_hashes(user)
+                        for band in self.hash_service.hash_bands(image_hash)})
+        by_band = {}
+        self._index_bands(self.user_model.find_users_by_hash_bands(bands, tenant), by_band)
+        for user in batch:
+            if self._is_duplicate(user, by_band):
+                failures.append({
+                    'name': user['name'],
+                    'status': 'failed',
+                    'error': 'This photo is already registered to another user'
+                })
+                self._discard_files(user)
+                continue
+            accepted.append(user)
+            self._index_bands([user], by_band)
+        batch = accepted
+
+        inserted = set(self.user_model.insert_users(batch)) if batch else set()
+        records = list(failures)
+        for user in batch:
+            if user['name'] in inserted:
+                records.append({'name': user['name'], 'status': 'imported'})
+            else:
+                records.append({'name': user['name'], 'status': 'failed', 'error': 'Database insert failed'})
+                self._discard_files(user)
+
+        if records:
+            checkpoint.record(records)
+
+        failed = [record for record in records if record['status'] == 'failed']
+        summary['imported'] += len(inserted)
+        summary['failed'] += len(failed)
+        summary['errors'] = (summary['errors'] + failed)[:50]
+
+        if inserted and self.gallery_service is not None:
+            self.gallery_service.invalidate(tenant)
+
+    def _discard_files(self, user):
+        """Remove the copied photos of a user that could not be inserted"""
+        self.file_service.delete_file(user['image_path'])
+        for template in user.get('face_templates', []):
+            self.file_service.delete_file(template['image_path'])
+
+    def running_jobs(self):
+        """Number of background imports still running"""
+        return sum(1 for job in list(self.jobs.values()) if job['status'] == 'running')
+
+    def start_import(self, source, cleanup=False, tenant=None):
+        """
+        Run an import in a background thread and return its job id, or None when
+        max_concurrent_jobs imports are already running
+        """
+        job_id = uuid.uuid4().hex
+        job = {'job_id': job_id, 'status': 'running', 'started_at': datetime.utcnow().isoformat()}
+        with self._jobs_lock:
+            if self.running_jobs() >= self.max_concurrent_jobs:
+                return None
+            self.jobs[job_id] = job
+
+        def _run():
+            try:
+                self.run_import(source, progress=job, tenant=tenant)
+                job['status'] = 'completed'
+            except Exception as e:
+                logger.error("Error running import %s: %s", job_id, e)
+                job['status'] = 'failed'
+                job['error'] = str(e)
+            finally:
+                job['finished_at'] = datetime.utcnow().isoformat()
+                if cleanup:
+                    shutil.rmtree(os.path.dirname(source), ignore_errors=True)
+
+        threading.Thread(target=_run, name=f"import-{job_id}", daemon=True).start()
+        return job_id
+
+    def get_job(self, job_id):
+        """Get the progress of a background import"""
+        return self.jobs.get(job_id)
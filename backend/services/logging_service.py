@@ -0,0 +1,143 @@
+"""
+Structured, non-blocking logging for the API and its services.
+
+Modules log through get_logger(__name__). configure_logging() routes every
+record through a bounded in-memory queue to a background listener thread, so
+request threads never block on stdout; when the queue is full records are
+dropped and counted rather than waited on. DEBUG records from hot paths are
+sampled, and every record carries the current request's correlation id.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ROOT_LOGGER = 'facedetection'
+
+# Correlation id of the request being served in this context
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+# LogRecord attributes that are not user-supplied structured fields
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+_listener = None
+_configure_lock = threading.Lock()
+
+def get_logger(name):
+    """Logger under the application root, e.g. get_logger(__name__)"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+def set_request_id(request_id):
+    _request_id.set(request_id)
+
+def get_request_id():
+    return _request_id.get()
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the correlation id of the current request"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+class DebugSamplingFilter(logging.Filter):
+    """Keep only a sample_rate fraction of DEBUG records"""
+
+    def __init__(self, sample_rate):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.sample_rate
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with timestamp, level, logger, message, request id and extra fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking or raising when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def configure_logging():
+    """Install the queue-backed handler on the application logger; safe to call more than once"""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        level = getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+        sample_rate = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '0.01'))
+        queue_size = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        if os.getenv('LOG_FORMAT', 'json').lower() == 'json':
+            stream_handler.setFormatter(JsonFormatter())
+        else:
+            stream_handler.setFormatter(logging.Formatter(
+                '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'
+            ))
+
+        queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        # Filters run in the calling thread, before the record is queued
+        queue_handler.addFilter(DebugSamplingFilter(sample_rate))
+        queue_handler.addFilter(RequestIdFilter())
+
+        logger = logging.getLogger(ROOT_LOGGER)
+        logger.setLevel(level)
+        logger.handlers = [queue_handler]
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+def dropped_records():
+    """Records dropped because the log queue was full"""
+    for handler in logging.getLogger(ROOT_LOGGER).handlers:
+        if isinstance(handler, DroppingQueueHandler):
+            return handler.dropped
+    return 0
@@ -0,0 +1,218 @@
+"""
+Process-wide Prometheus-style metrics, rendered in the text exposition format by /metrics.
+
+Metrics are plain in-process counters guarded by one lock each, so recording a
+sample costs a dict lookup and a bisect. Import the module-level metrics below
+and record into them; use stage_timer() to time a pipeline stage.
+"""
+
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Request and pipeline stages are milliseconds to seconds; Mongo calls are usually sub-millisecond
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Per-request stage durations for the Server-Timing header; None outside a request
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+def begin_request_timings():
+    """Start collecting stage durations for the request running in this context"""
+    _request_timings.set({})
+
+def request_timings():
+    """Stage durations (seconds) recorded so far for the current request"""
+    return _request_timings.get() or {}
+
+def record_timing(name, seconds):
+    """Add a duration to the current request's breakdown (no-op outside a request)"""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + escaped + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, label_names=(), function=None):
+        super().__init__(name, documentation, label_names)
+        # Gauges backed by a function are sampled at scrape time
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        if self.function is not None:
+            try:
+                values = {(): self.function()}
+            except Exception:
+                values = {}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        with self._lock:
+            values = {key: (list(state[0]), state[1], state[2]) for key, state in self._values.items()}
+
+        lines = self.header()
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, key, ('le', _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Named collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, label_names=()):
+        return self.register(Counter(name, documentation, label_names))
+
+    def gauge(self, name, documentation, label_names=(), function=None):
+        return self.register(Gauge(name, documentation, label_names, function))
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+def _resident_memory_bytes():
+    """Current RSS from /proc on Linux, else the peak RSS reported by getrusage"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Not available on Windows; the gauge is then left out of the scrape
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is kilobytes on Linux and bytes on macOS
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+registry = MetricsRegistry()
+
+request_seconds = registry.histogram(
+    'facedetection_request_duration_seconds', 'HTTP request latency by endpoint', ('endpoint', 'method'))
+requests_total = registry.counter(
+    'facedetection_requests_total', 'HTTP requests by endpoint and status code', ('endpoint', 'method', 'status'))
+errors_total = registry.counter(
+    'facedetection_errors_total', 'Failed requests (5xx) by endpoint', ('endpoint',))
+stage_seconds = registry.histogram(
+    'facedetection_stage_duration_seconds', 'Time spent per pipeline stage', ('stage',))
+detect_pass_seconds = registry.histogram(
+    'facedetection_detect_pass_duration_seconds', 'Time spent per Haar cascade detection pass', ('pass',))
+mongo_seconds = registry.histogram(
+    'facedetection_mongo_duration_seconds', 'MongoDB command latency', ('command', 'outcome'))
+faces_detected_total = registry.counter(
+    'facedetection_faces_detected_total', 'Faces detected by /detect')
+recognitions_total = registry.counter(
+    'facedetection_recognitions_total', 'Recognition outcomes per detected face', ('result',))
+gallery_users = registry.gauge(
+    'facedetection_gallery_users', 'Users with at least one usable template in the in-memory gallery')
+gallery_templates = registry.gauge(
+    'facedetection_gallery_templates', 'Enrollment templates held in the in-memory gallery')
+memory_bytes = registry.gauge(
+    'facedetection_resident_memory_bytes', 'Resident memory of this process', function=_resident_memory_bytes)
+
+@contextmanager
+def stage_timer(stage):
+    """Time a block into the per-stage latency histogram"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=stage)
+        record_timing(stage, elapsed)
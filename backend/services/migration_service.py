@@ -0,0 +1,138 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from services.checkpoint import JsonlCheckpoint
+from services.encoding_worker import init_worker, get_face_service
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def _reencode_user(task):
+    """Re-encode one user's registration photo and templates; runs inside a pool worker"""
+    user_id, image_path, template_paths = task
+    face_service = get_face_service()
+
+    face_encoding = None
+    if image_path and os.path.exists(image_path):
+        face_encoding = face_service.extract_face_encoding(image_path)
+
+    templates = {}
+    for index, template_path in template_paths:
+        if template_path and os.path.exists(template_path):
+            encoding = face_service.extract_face_encoding(template_path)
+            if encoding is not None:
+                templates[index] = encoding
+
+    if face_encoding is None and not templates:
+        return {'user_id': user_id, 'error': 'No face encoding could be extracted'}
+
+    return {
+        'user_id': user_id,
+        'encoding_tag': face_service.encoding_tag(),
+        'face_encoding': face_encoding,
+        'templates': templates
+    }
+
+class WriteThrottle:
+    """Sleep as needed to keep database writes under a fixed rate"""
+
+    def __init__(self, writes_per_second):
+        self.writes_per_second = writes_per_second
+        self._started = time.monotonic()
+        self._writes = 0
+
+    def wait(self, writes):
+        if self.writes_per_second <= 0:
+            return
+        self._writes += writes
+        earliest = self._started + self._writes / self.writes_per_second
+        delay = earliest - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+class MigrationService:
+    """
+    Re-encode every user whose stored encodings were produced by a different
+    recognition method or encoding version than the active face service.
+
+    Photos are re-encoded in a process pool, updates are written with throttled
+    bulk writes, and migrated users are checkpointed so the job can resume. The
+    checkpoint is per method/version, so the next switch or version bump starts
+    afresh, and users that failed are left out of it so a re-run retries them.
+    """
+
+    def __init__(self, user_model, face_service, gallery_service=None):
+        self.user_model = user_model
+        self.face_service = face_service
+        self.gallery_service = gallery_service
+        self.batch_size = int(os.getenv('MIGRATION_BATCH_SIZE', '200'))
+        self.writes_per_second = float(os.getenv('MIGRATION_WRITES_PER_SECOND', '200'))
+
+    def run(self, checkpoint_path=None, workers=None, progress=None):
+        """Run the migration; returns a summary dict"""
+        tag = self.face_service.encoding_tag()
+        checkpoint_path = checkpoint_path or f"encoding_migration.{tag['method']}-v{tag['version']}.checkpoint.jsonl"
+        checkpoint = JsonlCheckpoint(checkpoint_path, key='user_id')
+        throttle = WriteThrottle(self.writes_per_second)
+        summary = {'method': tag['method'], 'version': tag['version'], 'migrated': 0, 'failed': 0, 'errors': []}
+
+        tasks = [
+            (
+                user['_id'],
+                user.get('image_path'),
+                [(index, template.get('image_path')) for index, template in enumerate(user.get('face_templates', []))]
+            )
+            for user in self.user_model.find_users_needing_reencode(tag, exclude_ids=checkpoint.processed)
+        ]
+        summary['total'] = len(tasks)
+        if progress is not None:
+            progress.update(summary)
+
+        batch = []
+        failures = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            for result in pool.map(_reencode_user, tasks, chunksize=8):
+                if 'error' in result:
+                    failures.append({'user_id': result['user_id'], 'status': 'failed', 'error': result['error']})
+                else:
+                    batch.append(result)
+
+                if len(batch) + len(failures) >= self.batch_size:
+                    self._flush(batch, failures, checkpoint, throttle, summary)
+                    batch, failures = [], []
+                    if progress is not None:
+                        progress.update(summary)
+
+        self._flush(batch, failures, checkpoint, throttle, summary)
+        if progress is not None:
+            progress.update(summary)
+        return summary
+
+    def _flush(self, batch, failures, checkpoint, throttle, summary):
+        """Write one throttled batch of re-encoded users and checkpoint it"""
+        written = False
+        if batch:
+            throttle.wait(len(batch))
+            written = self.user_model.apply_encoding_updates(batch)
+
+        # Failed and unwritten users stay out of the checkpoint so a re-run retries them
+        records = []
+        if written:
+            records = [
+                {'user_id': update['user_id'], 'status': 'migrated', **update['encoding_tag']}
+                for update in batch
+            ]
+        else:
+            failures = failures + [
+                {'user_id': update['user_id'], 'status': 'failed', 'error': 'Database write failed'}
+                for update in batch
+            ]
+        if records:
+            checkpoint.record(records)
+
+        summary['migrated'] += len(batch) if written else 0
+        summary['failed'] += len(failures)
+        summary['errors'] = (summary['errors'] + failures)[:50]
+
+        if written and self.gallery_service is not None:
+            self.gallery_service.invalidate()
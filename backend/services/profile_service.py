@@ -0,0 +1,42 @@
+import copy
+from config import Config
+from services.logging_service import get_logger
+
+logger = get_logger(__name__)
+
+class ProfileService:
+    """
+    Resolves the speed/accuracy profile for a request.
+
+    An explicit per-request profile wins, then the tenant's configured default,
+    then the global default. Profiles are defined in Config.PIPELINE_PROFILES.
+    """
+
+    def __init__(self, profiles=None, default_profile=None, tenant_profiles=None):
+        self.profiles = profiles or Config.PIPELINE_PROFILES
+        self.default_profile = default_profile or Config.DEFAULT_PIPELINE_PROFILE
+        self.tenant_profiles = tenant_profiles if tenant_profiles is not None else Config.TENANT_PIPELINE_PROFILES
+        if self.default_profile not in self.profiles:
+            logger.warning("Unknown default pipeline profile '%s', using 'balanced'", self.default_profile)
+            self.default_profile = 'balanced'
+
+    def names(self):
+        return list(self.profiles)
+
+    def resolve(self, requested=None, tenant=None):
+        """Return (name, profile); raises ValueError for an unknown requested profile"""
+        name = requested or self.tenant_profiles.get(tenant) or self.default_profile
+        if name not in self.profiles:
+            raise ValueError(f"Unknown profile '{name}', expected one of: {', '.join(self.profiles)}")
+        return name, copy.deepcopy(self.profiles[name])
+
+    def pipeline_options(self, profile):
+        """Detection and encoding options of a profile (everything but tolerance)"""
+        return {key: value for key, value in profile.items() if key != 'tolerance'}
+
+    def tolerance(self, profile, method):
+        """Match tolerance of a profile for a recognition method, or None for the service default"""
+        tolerance = profile.get('tolerance')
+        if isinstance(tolerance, dict):
+            return tolerance.get(method)
+        return tolerance
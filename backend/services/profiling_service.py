@@ -0,0 +1,111 @@
+import cProfile
+import json
+import os
+import random
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+from services.logging_service import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+class RequestProfiler:
+    """
+    On-demand cProfile capture of live requests.
+
+    While enabled, a sample_rate fraction of requests is profiled. With a
+    slow_threshold_ms set, every request is profiled and kept only if it was
+    slower than the threshold, which costs more, so it is meant to be switched
+    on briefly from the admin endpoint. Only one request is profiled at a time
+    because Python allows a single active profiler. Each capture is written as
+    a .prof file (open with pstats or snakeviz) next to a .json file with the
+    request metadata; only the newest max_files captures are kept.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+        self.sample_rate = float(os.getenv('PROFILING_SAMPLE_RATE', '0.01'))
+        self.slow_threshold_ms = float(os.getenv('PROFILING_SLOW_MS', '0')) or None
+        self.output_dir = os.getenv('PROFILING_DIR', 'profiles')
+        self.max_files = int(os.getenv('PROFILING_MAX_FILES', '50'))
+
+        self._active = threading.Lock()
+        self._captured = 0
+
+    def configure(self, enabled=None, sample_rate=None, slow_threshold_ms=None):
+        """Update settings from the admin endpoint; slow_threshold_ms of 0 disables threshold capture"""
+        if enabled is not None:
+            if not isinstance(enabled, bool):
+                raise TypeError('enabled must be true or false')
+            self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+        if slow_threshold_ms is not None:
+            self.slow_threshold_ms = float(slow_threshold_ms) or None
+
+    def start(self):
+        """Begin profiling the current request if it is selected; returns (profile, sampled) or None"""
+        if not self.enabled:
+            return None
+
+        sampled = random.random() < self.sample_rate
+        if not sampled and self.slow_threshold_ms is None:
+            return None
+        if not self._active.acquire(blocking=False):
+            return None
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) is already active
+            self._active.release()
+            return None
+        return profile, sampled
+
+    def stop(self, capture, duration_seconds, metadata):
+        """Stop a capture and keep it if it was sampled or slower than the threshold"""
+        profile, sampled = capture
+        try:
+            profile.disable()
+            slow = self.slow_threshold_ms is not None and duration_seconds * 1000 >= self.slow_threshold_ms
+            if sampled or slow:
+                self._dump(profile, duration_seconds, dict(metadata, sampled=sampled, slow=slow))
+        except Exception as e:
+            logger.error("Error saving request profile: %s", e)
+        finally:
+            self._active.release()
+
+    def _dump(self, profile, duration_seconds, metadata):
+        os.makedirs(self.output_dir, exist_ok=True)
+        endpoint = metadata.get('endpoint', 'request').strip('/').replace('/', '_').replace('<', '').replace('>', '')
+        base = os.path.join(
+            self.output_dir,
+            f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}_{endpoint or 'root'}_{int(duration_seconds * 1000)}ms"
+        )
+        profile.dump_stats(base + '.prof')
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(dict(metadata, duration_ms=round(duration_seconds * 1000, 2)), f, indent=2)
+        self._captured += 1
+        self._rotate()
+
+    def _rotate(self):
+        """Delete the oldest captures beyond max_files"""
+        captures = sorted(name[:-5] for name in os.listdir(self.output_dir) if name.endswith('.prof'))
+        for name in captures[:-self.max_files] if self.max_files > 0 else captures:
+            for extension in ('.prof', '.json'):
+                path = os.path.join(self.output_dir, name + extension)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'slow_threshold_ms': self.slow_threshold_ms,
+            'output_dir': self.output_dir,
+            'max_files': self.max_files,
+            'captured': self._captured
+        }
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
+from dotenv import load_dotenv
+from services.logging_service import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+class QualityController:
+    """
+    Load-adaptive quality levels for /detect.
+
+    Level 0 runs the full pipeline. Each higher level trades accuracy for
+    latency: fewer Haar cascade fallback passes, detection on a downscaled
+    image, HOG instead of CNN and no encoding jitter. The controller steps one
+    level down when the admission queue backs up or the recent p95 latency
+    exceeds the target, and one level back up once both have recovered. A
+    cooldown between steps keeps it from oscillating.
+    """
+
+    LEVELS = [
+        {'name': 'full'},
+        {'name': 'reduced', 'cascade_passes': 2},
+        {'name': 'fast', 'cascade_passes': 1, 'max_dimension': 800, 'detection_model': 'hog', 'num_jitters': 1},
+        {'name': 'minimal', 'cascade_passes': 1, 'max_dimension': 480, 'detection_model': 'hog', 'num_jitters': 1}
+    ]
+
+    def __init__(self, admission_controller=None):
+        self.admission_controller = admission_controller
+        self.enabled = os.getenv('QUALITY_ADAPTIVE', 'true').lower() == 'true'
+        self.target_p95_seconds = float(os.getenv('QUALITY_TARGET_P95_MS', '1000')) / 1000.0
+        self.high_queue_depth = int(os.getenv('QUALITY_HIGH_QUEUE_DEPTH', '4'))
+        # Step back up only once p95 is comfortably under target, not just below it
+        self.recover_ratio = float(os.getenv('QUALITY_RECOVER_RATIO', '0.6'))
+        self.cooldown_seconds = float(os.getenv('QUALITY_COOLDOWN_SECONDS', '10'))
+        self.min_samples = int(os.getenv('QUALITY_MIN_SAMPLES', '20'))
+        self.max_level = min(int(os.getenv('QUALITY_MAX_LEVEL', str(len(self.LEVELS) - 1))), len(self.LEVELS) - 1)
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=int(os.getenv('QUALITY_WINDOW_SIZE', '200')))
+        self._level = 0
+        self._changed_at = 0.0
+        self._step_downs = 0
+        self._step_ups = 0
+
+    @property
+    def level(self):
+        return self._level
+
+    def options(self, base=None):
+        """
+        Pipeline options for the active level applied on top of base (e.g. a
+        profile's options). A level only ever makes base cheaper, never richer.
+        """
+        options = dict(base or {})
+        if not self.enabled:
+            return options
+
+        level = self.LEVELS[self._level]
+        for key in ('cascade_passes', 'max_dimension', 'num_jitters'):
+            if key in level:
+                options[key] = min(level[key], options.get(key) or level[key])
+        if 'detection_model' in level:
+            options['detection_model'] = level['detection_model']
+        return options
+
+    def _p95(self):
+        if not self._latencies:
+            return 0.0
+        return float(np.percentile(self._latencies, 95))
+
+    def _queue_depth(self):
+        if self.admission_controller is None:
+            return 0
+        return self.admission_controller.stats()['queue_depth']
+
+    def record(self, latency_seconds):
+        """Record one request's latency and re-evaluate the active level"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._latencies.append(latency_seconds)
+            now = time.monotonic()
+            if now - self._changed_at < self.cooldown_seconds:
+                return
+
+            queue_depth = self._queue_depth()
+            p95 = self._p95()
+            enough = len(self._latencies) >= self.min_samples
+            overloaded = queue_depth >= self.high_queue_depth or (enough and p95 > self.target_p95_seconds)
+            recovered = queue_depth == 0 and enough and p95 < self.target_p95_seconds * self.recover_ratio
+
+            if overloaded and self._level < self.max_level:
+                self._set_level(self._level + 1, now)
+                self._step_downs += 1
+            elif recovered and self._level > 0:
+                self._set_level(self._level - 1, now)
+                self._step_ups += 1
+
+    def _set_level(self, level, now):
+        logger.info("Quality level changed", extra={
+            'from_level': self.LEVELS[self._level]['name'],
+            'to_level': self.LEVELS[level]['name']
+        })
+        self._level = level
+        self._changed_at = now
+        # Judge the new level on its own latencies
+        self._latencies.clear()
+
+    def stats(self):
+        """Active level and the signals driving it"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'level': self._level,
+                'level_name': self.LEVELS[self._level]['name'],
+                'p95_seconds': round(self._p95(), 4),
+                'target_p95_seconds': self.target_p95_seconds,
+                'step_downs': self._step_downs,
+                'step_ups': self._step_ups
+            }
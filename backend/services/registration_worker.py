@@ -0,0 +1,89 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from services.logging_service import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+class RegistrationWorker:
+    """
+    Background validation and encoding for registrations accepted with 202.
+
+    The request stores the photo and a user with registration_status "pending";
+    a worker thread then checks the photo contains a face, computes its encoding
+    and marks the user "ready" (and refreshes the gallery), or "failed" with the
+    reason in registration_error. Threads are enough here: OpenCV and dlib
+    release the GIL and every thread has its own cascade classifier.
+    """
+
+    def __init__(self, user_model, face_service, gallery_service):
+        self.user_model = user_model
+        self.face_service = face_service
+        self.gallery_service = gallery_service
+        self.workers = int(os.getenv('REGISTRATION_WORKERS', '2'))
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='registration')
+        return self._executor
+
+    def submit(self, user_id, image_path, tenant=None):
+        """Queue a pending user for validation and encoding"""
+        with self._lock:
+            self._pending += 1
+        self._pool().submit(self._process, user_id, image_path, tenant)
+
+    def resume_pending(self):
+        """Requeue registrations left pending by a restart (called once at warm-up)"""
+        users = self.user_model.find_pending_registrations()
+        for user in users:
+            self.submit(user['_id'], user.get('image_path'), user.get('tenant'))
+        if users:
+            logger.info("Resumed %d pending registrations", len(users))
+
+    def _fail(self, user_id, error):
+        self.user_model.fail_registration(user_id, error)
+        with self._lock:
+            self._failed += 1
+        logger.info("Registration failed", extra={'user_id': user_id, 'error': error})
+
+    def _process(self, user_id, image_path, tenant=None):
+        try:
+            if not self.face_service.available:
+                self._fail(user_id, 'Face recognition service not available')
+                return
+            if not image_path or not self.face_service.detect_faces_opencv(image_path):
+                self._fail(user_id, 'No face detected in photo')
+                return
+            encoding = self.face_service.extract_face_encoding(image_path)
+            if encoding is None:
+                self._fail(user_id, 'Could not compute a face encoding')
+                return
+            if self.user_model.complete_registration(user_id, encoding, self.face_service.encoding_tag()):
+                self.gallery_service.invalidate(tenant)
+                with self._lock:
+                    self._completed += 1
+        except Exception as e:
+            logger.error("Error processing registration %s: %s", user_id, e)
+            self._fail(user_id, f'Processing failed: {str(e)}')
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'pending': self._pending,
+            'completed': self._completed,
+            'failed': self._failed
+        }
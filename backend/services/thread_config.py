@@ -0,0 +1,66 @@
+"""
+Coordinates the native thread pools of OpenCV and the BLAS/OpenMP libraries behind
+numpy with the server's own concurrency. Each request thread already keeps one core
+busy, so by default every worker gets cores / (WORKER_PROCESSES * WORKER_THREADS)
+native threads, and scaling threads x processes up to the core count does not
+oversubscribe the machine.
+
+Call configure_native_threads() before numpy is first imported: the BLAS
+environment variables are only read when the library loads. threadpoolctl, when
+installed, also applies the limit to libraries that are already loaded.
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BLAS_ENV_VARS = (
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'NUMEXPR_NUM_THREADS'
+)
+
+_settings = {}
+
+def native_threads_per_worker():
+    """NATIVE_THREADS, else the cores left per request thread across all worker processes"""
+    explicit = os.getenv('NATIVE_THREADS')
+    if explicit:
+        return max(1, int(explicit))
+    processes = max(1, int(os.getenv('WORKER_PROCESSES', '1')))
+    threads = max(1, int(os.getenv('WORKER_THREADS', '1')))
+    return max(1, (os.cpu_count() or 1) // (processes * threads))
+
+def configure_native_threads(threads=None):
+    """Cap OpenCV and BLAS threads for this process; returns the applied settings"""
+    threads = threads or native_threads_per_worker()
+    for name in BLAS_ENV_VARS:
+        # An explicit setting in the environment wins
+        os.environ.setdefault(name, str(threads))
+
+    import cv2
+    cv2.setNumThreads(threads)
+
+    blas_limited = False
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=threads)
+        blas_limited = True
+    except ImportError:
+        pass
+
+    _settings.update({
+        'native_threads': threads,
+        'opencv_threads': cv2.getNumThreads(),
+        'blas_threads': int(os.environ['OPENBLAS_NUM_THREADS']),
+        'blas_limited_at_runtime': blas_limited,
+        'cpu_count': os.cpu_count()
+    })
+    return dict(_settings)
+
+def thread_settings():
+    """Settings applied by configure_native_threads() in this process"""
+    return dict(_settings)
@@ -0,0 +1,124 @@
+"""
+Shared fixtures. MongoDB is replaced by mongomock and face detection by a small
+stub service, so the suite runs without a database server or face models:
+
+    pip install pytest mongomock
+    python -m pytest        # from backend/
+"""
+
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault('UPLOAD_FOLDER', tempfile.mkdtemp(prefix='tests_uploads_'))
+os.environ.setdefault('CAPTURE_ENABLED', 'false')
+# Tests drive warm-up steps themselves; a background warm-up would race the per-test cleanup
+os.environ.setdefault('WARMUP_ON_START', 'false')
+os.environ.setdefault('RECOGNITION_EVENTS_ENABLED', 'false')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import cv2
+import mongomock
+import numpy as np
+import pytest
+
+import models.database
+models.database.MongoClient = mongomock.MongoClient
+
+from models.database import db_instance
+
+class StubFaceService:
+    """
+    Face service double: encodings are plain vectors of ENCODING_SIZE floats,
+    compared by Euclidean distance. extract_face_encoding returns whatever was
+    registered for a path in `encodings` (None otherwise) and counts its calls.
+    """
+
+    METHOD = 'stub'
+    ENCODING_VERSION = 1
+    ENCODING_SIZE = 4
+    DEFAULT_TOLERANCE = 0.5
+
+    def __init__(self):
+        self.available = True
+        self.method = self.METHOD
+        self.encodings = {}
+        self.faces = {}
+        self.extract_calls = []
+
+    def encoding_tag(self):
+        return {'method': self.METHOD, 'version': self.ENCODING_VERSION}
+
+    def encoding_vector(self, encoding):
+        if encoding is None or isinstance(encoding, dict):
+            return None
+        vector = np.asarray(encoding, dtype=np.float64).ravel()
+        return vector if vector.shape[0] == self.ENCODING_SIZE else None
+
+    def encoding_from_vector(self, vector):
+        return self.encoding_vector(vector)
+
+    def distance_matrix(self, probe_matrix, gallery_matrix):
+        return np.linalg.norm(probe_matrix[:, None, :] - gallery_matrix[None, :, :], axis=2)
+
+    def extract_face_encoding(self, image_path):
+        self.extract_calls.append(image_path)
+        return self.encodings.get(image_path)
+
+    def extract_face_encodings(self, image_path, options=None, deadline=None):
+        return self.faces.get(image_path, [])
+
+    def detect_faces_opencv(self, image_path, options=None, deadline=None):
+        return [face['coordinates'] for face in self.faces.get(image_path, [])]
+
+    def supports_batch_encoding(self, options=None):
+        return False
+
+def vector(*values):
+    return np.asarray(values, dtype=np.float64)
+
+def synthetic_photo(seed, size=(160, 120)):
+    """PNG bytes of a random block layout; different seeds are far apart under dHash"""
+    rng = np.random.default_rng(seed)
+    layout = rng.integers(0, 256, (8, 9)).astype(np.uint8)
+    image = cv2.resize(layout, size, interpolation=cv2.INTER_NEAREST)
+    ok, buffer = cv2.imencode('.png', cv2.cvtColor(image, cv2.COLOR_GRAY2BGR))
+    return buffer.tobytes()
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    """Every test starts with empty collections"""
+    database = db_instance.get_database()
+    for name in database.list_collection_names():
+        database.drop_collection(name)
+    yield
+
+@pytest.fixture
+def face_service():
+    return StubFaceService()
+
+@pytest.fixture
+def user_model():
+    from models.user import User
+    user = User()
+    user.ensure_indexes()
+    return user
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    flask_app = create_app()
+    flask_app.testing = True
+    return flask_app
+
+@pytest.fixture
+def client(app):
+    import routes.api_routes_flexible as routes
+    routes.user_model.ensure_indexes()
+    routes.user_model._names = None
+    routes.gallery_service.invalidate()
+    return app.test_client()
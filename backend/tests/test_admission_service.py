@@ -0,0 +1,115 @@
+import threading
+import time
+import pytest
+from services.admission_service import AdmissionController, AdmissionRejected
+
+@pytest.fixture
+def controller(monkeypatch):
+    monkeypatch.setenv('ADMISSION_CAPACITY', '4')
+    monkeypatch.setenv('ADMISSION_MAX_QUEUE', '2')
+    monkeypatch.setenv('ADMISSION_MAX_WAIT_SECONDS', '2')
+    monkeypatch.setenv('ADMISSION_PIXELS_PER_UNIT', '1000000')
+    return AdmissionController()
+
+def wait_for_queue(controller, depth, timeout=2):
+    stop_at = time.monotonic() + timeout
+    while controller.stats()['queue_depth'] != depth:
+        assert time.monotonic() < stop_at, 'waiters never queued'
+        time.sleep(0.005)
+
+def test_admits_immediately_within_capacity(controller):
+    assert controller.acquire(2) == 0.0
+    assert controller.acquire(2) == 0.0
+    assert controller.stats()['in_flight'] == 4
+
+def test_weight_is_capped_at_capacity(controller):
+    # A huge image still fits once the server is idle instead of waiting forever
+    assert controller.weight_for_pixels(50_000_000) == 4
+    assert controller.weight_for_pixels(1) == 1
+    controller.acquire(100)
+    assert controller.stats()['in_flight'] == 4
+    controller.release(100)
+    assert controller.stats()['in_flight'] == 0
+
+def test_waits_until_weight_is_released(controller):
+    controller.acquire(3)
+    admitted = threading.Event()
+
+    def waiter():
+        controller.acquire(2)
+        admitted.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    wait_for_queue(controller, 1)
+    assert not admitted.is_set()
+
+    controller.release(3)
+    thread.join(2)
+    assert admitted.is_set()
+    assert controller.stats()['in_flight'] == 2
+
+def test_admits_waiters_in_arrival_order(controller):
+    controller.acquire(4)
+    order = []
+
+    def waiter(label, weight):
+        controller.acquire(weight)
+        order.append(label)
+
+    # The heavy request queued first is not overtaken by the light one behind it
+    heavy = threading.Thread(target=waiter, args=('heavy', 3))
+    heavy.start()
+    wait_for_queue(controller, 1)
+    light = threading.Thread(target=waiter, args=('light', 1))
+    light.start()
+    wait_for_queue(controller, 2)
+
+    controller.release(2)
+    time.sleep(0.05)
+    assert order == []
+
+    controller.release(2)
+    heavy.join(2)
+    light.join(2)
+    assert order == ['heavy', 'light']
+
+def test_rejects_with_retry_after_when_queue_is_full(controller):
+    controller.acquire(4)
+    timed_out = []
+
+    def waiter():
+        try:
+            controller.acquire(1, timeout=0.3)
+        except AdmissionRejected:
+            timed_out.append(True)
+
+    threads = [threading.Thread(target=waiter) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    wait_for_queue(controller, 2)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire(1)
+    assert rejected.value.retry_after >= 1
+    assert 'queue is full' in str(rejected.value)
+
+    for thread in threads:
+        thread.join(2)
+    assert timed_out == [True, True]
+    assert controller.stats()['rejected'] == 3
+
+def test_rejects_after_timeout(controller):
+    controller.acquire(4)
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire(1, timeout=0.1)
+    assert time.monotonic() - started < 1
+    assert rejected.value.retry_after >= 1
+    # The timed-out waiter left the queue
+    assert controller.stats()['queue_depth'] == 0
+
+def test_retry_after_grows_with_service_time(controller):
+    controller.acquire(1)
+    controller.release(1, held_seconds=20)
+    assert controller.retry_after() > 1
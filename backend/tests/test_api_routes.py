@@ -0,0 +1,267 @@
+import io
+import time
+import numpy as np
+import pytest
+from conftest import synthetic_photo
+import routes.api_routes_flexible as routes
+
+def register(client, name, photo, **fields):
+    data = {'name': name, 'photo': (io.BytesIO(photo), 'photo.png'), **fields}
+    return client.post('/api/register', data=data, content_type='multipart/form-data')
+
+def enroll_vector(name, seed, tenant=None):
+    """Store a user whose encoding is a random vector of the active face service"""
+    vector = np.random.default_rng(seed).random(routes.face_service.ENCODING_SIZE)
+    user_id = routes.user_model.create_user(name, f'{name}.jpg', routes.face_service.encoding_from_vector(vector),
+                                            encoding_tag=routes.face_service.encoding_tag())
+    if tenant:
+        routes.user_model.update_user(user_id, {'tenant': tenant})
+    routes.gallery_service.invalidate()
+    return user_id, vector
+
+def test_register_rejects_the_same_photo_under_another_name(client):
+    photo = synthetic_photo(1)
+
+    assert register(client, 'alice', photo).status_code == 201
+    response = register(client, 'bob', photo)
+
+    assert response.status_code == 409
+    assert response.get_json()['error'] == 'This photo is already registered to another user'
+    assert register(client, 'bob', synthetic_photo(2)).status_code == 201
+
+def test_register_retry_is_idempotent(client):
+    photo = synthetic_photo(3)
+    first = register(client, 'carol', photo).get_json()
+
+    retry = register(client, 'carol', photo)
+    assert retry.status_code == 200
+    assert retry.get_json()['user_id'] == first['user_id']
+    assert retry.get_json()['duplicate'] is True
+
+    conflict = register(client, 'carol', synthetic_photo(4))
+    assert conflict.status_code == 409
+    assert conflict.get_json()['error'] == 'User with this name already exists'
+    assert routes.user_model.collection.count_documents({'name': 'carol'}) == 1
+
+def test_register_rejects_undecodable_images(client):
+    response = register(client, 'dave', b'not an image')
+    assert response.status_code == 400
+
+def test_register_stores_the_tenant(client):
+    response = client.post('/api/register', data={'name': 'erin', 'photo': (io.BytesIO(synthetic_photo(5)), 'a.png')},
+                           headers={'X-Tenant-Id': 'acme'}, content_type='multipart/form-data')
+    assert response.status_code == 201
+    assert routes.user_model.get_user_by_name('erin', 'acme')['tenant'] == 'acme'
+
+def test_register_checks_names_and_photos_within_the_tenant(client):
+    photo = synthetic_photo(10)
+
+    assert register(client, 'gwen', photo, tenant='acme').status_code == 201
+    assert register(client, 'gwen', photo, tenant='globex').status_code == 201
+    assert register(client, 'hugo', photo, tenant='acme').status_code == 409
+
+def wait_for_registration(client, status_url):
+    stop_at = time.monotonic() + 10
+    while True:
+        status = client.get(status_url).get_json()
+        if status['status'] != 'pending' or time.monotonic() > stop_at:
+            return status
+        time.sleep(0.05)
+
+def test_async_registration_is_accepted_and_finishes_in_the_background(client):
+    response = register(client, 'faye', synthetic_photo(6), **{'async': 'true'})
+
+    assert response.status_code == 202
+    payload = response.get_json()
+    assert response.headers['Location'] == payload['status_url']
+
+    # The synthetic photo has no face, so background validation fails it
+    assert wait_for_registration(client, payload['status_url'])['status'] == 'failed'
+
+@pytest.mark.parametrize('name_cache', [False, True])
+def test_failed_registration_can_be_resubmitted(client, name_cache):
+    if name_cache:
+        routes.user_model._names = set()
+    photo = synthetic_photo(11)
+    failed = register(client, 'iris', photo, **{'async': 'true'}).get_json()
+    assert wait_for_registration(client, failed['status_url'])['status'] == 'failed'
+
+    retry = register(client, 'iris', photo)
+
+    assert retry.status_code == 201
+    assert client.get(failed['status_url']).status_code == 404
+    assert routes.user_model.collection.count_documents({'name': 'iris'}) == 1
+    assert register(client, 'iris', synthetic_photo(12)).status_code == 409
+
+def test_retry_of_a_pending_registration_reports_its_status(client, monkeypatch):
+    monkeypatch.setattr(routes.registration_worker, 'submit', lambda *args: None)
+    photo = synthetic_photo(13)
+    register(client, 'jack', photo, **{'async': 'true'})
+
+    retry = register(client, 'jack', photo)
+
+    assert retry.status_code == 200
+    assert retry.get_json()['registration_status'] == 'pending'
+
+def test_users_expose_only_public_fields(client):
+    register(client, 'gary', synthetic_photo(7))
+    user_id = routes.user_model.get_user_by_name('gary')['_id']
+    routes.user_model.claim_reencode(user_id)
+
+    user = client.get('/api/users').get_json()['users'][0]
+
+    assert set(user) <= set(routes.PUBLIC_USER_FIELDS) | {'template_count', 'image_url'}
+    assert user['name'] == 'gary'
+    assert user['template_count'] == 1
+    single = client.get(f'/api/user/{user_id}').get_json()['user']
+    assert 'image_hash' not in single and 'reencode_claimed_at' not in single
+
+def test_responses_carry_server_timing_and_request_id(client):
+    response = client.get('/api/users', headers={'X-Request-Id': 'abc123'})
+
+    assert response.headers['X-Request-Id'] == 'abc123'
+    assert 'total;dur=' in response.headers['Server-Timing']
+
+def test_routes_outside_the_api_carry_server_timing(client):
+    for path in ('/', '/metrics'):
+        response = client.get(path)
+
+        assert 'total;dur=' in response.headers['Server-Timing']
+        assert response.headers['X-Request-Id']
+
+def test_profiling_switch_takes_only_a_boolean(client, monkeypatch):
+    import routes.api_routes_flexible as routes
+    monkeypatch.setenv('ADMIN_TOKEN', 'secret')
+    monkeypatch.setattr(routes.request_profiler, 'enabled', False)
+
+    response = client.post('/api/admin/profiling', json={'enabled': 'false'}, headers={'X-Admin-Token': 'secret'})
+
+    assert response.status_code == 400
+    assert routes.request_profiler.enabled is False
+
+def test_metrics_endpoint_counts_requests(client):
+    client.get('/api/users')
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'facedetection_requests_total{' in body
+    assert 'endpoint="/api/users"' in body
+
+def test_match_accepts_json_encodings(client):
+    user_id, vector = enroll_vector('hana', 1)
+    tag = routes.face_service.encoding_tag()
+    stranger = np.random.default_rng(99).random(routes.face_service.ENCODING_SIZE)
+
+    response = client.post('/api/match', json={
+        'encodings': [vector.tolist(), stranger.tolist()], 'method': tag['method'], 'version': tag['version']
+    })
+
+    assert response.status_code == 200
+    matches = response.get_json()['matches']
+    assert matches[0]['recognized'] and matches[0]['user_id'] == user_id
+    assert matches[0]['distance'] == pytest.approx(0.0, abs=1e-4)
+    assert not matches[1]['recognized']
+
+def test_match_accepts_float32_bodies(client):
+    user_id, vector = enroll_vector('ivan', 2)
+    tag = routes.face_service.encoding_tag()
+
+    response = client.post('/api/match', data=vector.astype('<f4').tobytes(), headers={
+        'Content-Type': 'application/octet-stream',
+        'X-Encoding-Method': tag['method'],
+        'X-Encoding-Version': str(tag['version'])
+    })
+
+    assert response.status_code == 200
+    assert response.get_json()['matches'][0]['user_id'] == user_id
+
+def test_match_searches_only_the_tenant_partition(client):
+    _, vector = enroll_vector('jude', 3, tenant='acme')
+    tag = routes.face_service.encoding_tag()
+    body = {'encodings': [vector.tolist()], 'method': tag['method'], 'version': tag['version']}
+
+    assert client.post('/api/match', json=body, headers={'X-Tenant-Id': 'acme'}).get_json()['matches'][0]['recognized']
+    assert not client.post('/api/match', json=body, headers={'X-Tenant-Id': 'globex'}).get_json()['matches'][0]['recognized']
+
+@pytest.mark.parametrize('make_body, status', [
+    (lambda size, tag: {'encodings': [[0.1] * (size - 1)], **tag}, 400),
+    (lambda size, tag: {'encodings': [], **tag}, 400),
+    (lambda size, tag: {'encodings': [['a'] * size], **tag}, 400),
+    (lambda size, tag: {'encodings': [[0.1] * size]}, 400),
+    (lambda size, tag: {'encodings': [[0.1] * size], 'method': 'other', 'version': tag['version']}, 409),
+    (lambda size, tag: {'encodings': [[0.1] * size], 'method': tag['method'], 'version': 99}, 409)
+])
+def test_match_rejects_malformed_or_foreign_encodings(client, make_body, status):
+    body = make_body(routes.face_service.ENCODING_SIZE, routes.face_service.encoding_tag())
+    assert client.post('/api/match', json=body).status_code == status
+
+def test_match_rejects_non_finite_and_truncated_binary_bodies(client):
+    tag = routes.face_service.encoding_tag()
+    headers = {'Content-Type': 'application/octet-stream', 'X-Encoding-Method': tag['method'],
+               'X-Encoding-Version': str(tag['version'])}
+    size = routes.face_service.ENCODING_SIZE
+
+    non_finite = np.full(size, np.nan, dtype='<f4').tobytes()
+    assert client.post('/api/match', data=non_finite, headers=headers).status_code == 400
+    truncated = np.zeros(size, dtype='<f4').tobytes()[:-4]
+    assert client.post('/api/match', data=truncated, headers=headers).status_code == 400
+
+def test_match_limits_the_number_of_encodings(client, monkeypatch):
+    monkeypatch.setenv('MATCH_MAX_ENCODINGS', '2')
+    tag = routes.face_service.encoding_tag()
+    encodings = np.zeros((3, routes.face_service.ENCODING_SIZE)).tolist()
+
+    response = client.post('/api/match', json={'encodings': encodings, **tag})
+    assert response.status_code == 400
+
+def test_verify_does_not_find_users_of_another_tenant(client):
+    user_id, _ = enroll_vector('kira', 4, tenant='acme')
+    data = {'photo': (io.BytesIO(synthetic_photo(8)), 'probe.png')}
+
+    response = client.post(f'/api/user/{user_id}/verify', data=data, headers={'X-Tenant-Id': 'globex'},
+                           content_type='multipart/form-data')
+    assert response.status_code == 404
+
+def test_import_requires_the_admin_token(client, monkeypatch):
+    monkeypatch.delenv('ADMIN_TOKEN', raising=False)
+    assert client.post('/api/import').status_code == 403
+
+    monkeypatch.setenv('ADMIN_TOKEN', 'secret')
+    assert client.post('/api/import', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    assert client.get('/api/import/unknown', headers={'X-Admin-Token': 'secret'}).status_code == 404
+
+def test_import_refuses_jobs_beyond_the_limit(client, monkeypatch):
+    monkeypatch.setenv('ADMIN_TOKEN', 'secret')
+    monkeypatch.setattr(routes.import_service, 'jobs', {'running': {'status': 'running'}})
+
+    response = client.post('/api/import', headers={'X-Admin-Token': 'secret'})
+    assert response.status_code == 429
+
+def test_detect_runs_detection_once_and_recognises_every_face(client, monkeypatch):
+    user_id, vector = enroll_vector('lena', 5)
+    stranger = np.random.default_rng(98).random(routes.face_service.ENCODING_SIZE)
+    calls = []
+
+    def extract_face_encodings(image_path, options=None, deadline=None):
+        calls.append(image_path)
+        return [
+            {'coordinates': [10, 10, 50, 50], 'encoding': routes.face_service.encoding_from_vector(vector)},
+            {'coordinates': [80, 10, 50, 50], 'encoding': routes.face_service.encoding_from_vector(stranger)}
+        ]
+
+    def detect_faces_opencv(*args, **kwargs):
+        raise AssertionError('/detect must not run a second detection pass')
+
+    service = routes.face_service.load()
+    monkeypatch.setattr(service, 'extract_face_encodings', extract_face_encodings)
+    monkeypatch.setattr(service, 'detect_faces_opencv', detect_faces_opencv)
+
+    response = client.post('/api/detect', data={'photo': (io.BytesIO(synthetic_photo(9)), 'probe.png')},
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert len(calls) == 1
+    assert payload['faces_detected'] == 2
+    assert payload['face_locations'] == [[10, 10, 50, 50], [80, 10, 50, 50]]
+    assert [face['recognition']['recognized'] for face in payload['faces']] == [True, False]
+    assert payload['recognition']['user_name'] == 'lena'
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import uuid
+import pytest
+from conftest import synthetic_photo
+from services.admission_service import AdmissionRejected
+
+@pytest.fixture
+def asgi_app(app):
+    from routes.async_routes import AsyncApp
+    return AsyncApp(app)
+
+def multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+             for name, value in fields.items()]
+    for name, (filename, content) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: image/png\r\n\r\n'.encode() + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+def call(asgi_app, method, path, body=b'', content_type=None, content_length=None):
+    """Drive one HTTP request through the ASGI app; returns (status, headers, json body)"""
+    content_length = str(len(body)) if content_length is None else content_length
+    headers = [(b'host', b'testserver'), (b'content-length', content_length.encode())]
+    if content_type:
+        headers.append((b'content-type', content_type.encode()))
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'headers': headers,
+             'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1)}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    response = {}
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = {name.decode(): value.decode() for name, value in message['headers']}
+        else:
+            response['body'] = message['body']
+
+    asyncio.run(asgi_app(scope, receive, send))
+    return response['status'], response['headers'], json.loads(response['body'])
+
+def test_native_register_is_admission_controlled(monkeypatch, asgi_app):
+    import routes.async_routes as async_routes
+
+    def reject(weight, timeout=None):
+        raise AdmissionRejected('Server busy, queue is full', 7)
+    monkeypatch.setattr(async_routes.admission_controller, 'acquire', reject)
+    body, content_type = multipart({'name': 'alice'}, {'photo': ('a.png', synthetic_photo(1))})
+
+    status, headers, payload = call(asgi_app, 'POST', '/api/register', body, content_type)
+
+    assert status == 503
+    assert headers['retry-after'] == '7'
+    assert payload == {'error': 'Server busy, queue is full'}
+
+def test_native_register_releases_its_slot(monkeypatch, asgi_app):
+    import routes.async_routes as async_routes
+    held = []
+    monkeypatch.setattr(async_routes.admission_controller, 'acquire', lambda weight, timeout=None: held.append(weight))
+    monkeypatch.setattr(async_routes.admission_controller, 'release',
+                        lambda weight, held_seconds=None: held.remove(weight))
+    body, content_type = multipart({}, {'photo': ('a.png', synthetic_photo(2))})
+
+    status, _, payload = call(asgi_app, 'POST', '/api/register', body, content_type)
+
+    assert status == 400
+    assert payload == {'error': 'Name is required'}
+    assert held == []
+
+def test_native_register_answers_like_the_flask_view(monkeypatch, asgi_app):
+    import routes.async_routes as async_routes
+    monkeypatch.setattr(async_routes.admission_controller, 'acquire', lambda weight, timeout=None: 0.0)
+    monkeypatch.setattr(async_routes.admission_controller, 'release', lambda weight, held_seconds=None: None)
+    body, content_type = multipart({'name': 'bea'}, {'photo': ('b.png', synthetic_photo(3))})
+
+    status, _, created = call(asgi_app, 'POST', '/api/register', body, content_type)
+    assert status == 201
+    status, _, retry = call(asgi_app, 'POST', '/api/register', body, content_type)
+    assert status == 200
+    assert retry['user_id'] == created['user_id'] and retry['duplicate'] is True
+
+@pytest.mark.parametrize('content_length', ['abc', '-1'])
+def test_malformed_content_length_is_a_bad_request(asgi_app, content_length):
+    status, _, payload = call(asgi_app, 'POST', '/api/register', b'', content_length=content_length)
+
+    assert status == 400
+    assert payload == {'error': 'Invalid Content-Length header'}
+
+def test_oversized_body_is_rejected_up_front(asgi_app):
+    status, _, payload = call(asgi_app, 'POST', '/api/register', b'', content_length=str(10 ** 9))
+
+    assert status == 413
+
+def test_other_routes_are_served_by_flask(asgi_app):
+    status, headers, payload = call(asgi_app, 'GET', '/api/health')
+
+    assert status == 200
+    assert 'server-timing' in headers
@@ -0,0 +1,106 @@
+import threading
+import numpy as np
+from conftest import vector
+from services.batch_scheduler import MatchBatcher, _PendingRequest
+from services.deadline import Deadline
+
+class RecordingGallery:
+    """Gallery double that labels every probe with its first value and records each match call"""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = []
+
+    def match(self, probe_encodings, tolerance=None):
+        self.calls.append((len(probe_encodings), tolerance))
+        return [{'gallery': self.name, 'probe': float(encoding[0]), 'tolerance': tolerance}
+                for encoding in probe_encodings]
+
+def probes(*firsts):
+    return [vector(first, 0, 0, 0) for first in firsts]
+
+def test_process_slices_matches_back_to_each_request(face_service):
+    gallery = RecordingGallery('all')
+    batcher = MatchBatcher(gallery, face_service)
+    batch = [
+        _PendingRequest(probe_encodings=probes(1, 2), tolerance=0.5, gallery=gallery),
+        _PendingRequest(probe_encodings=[], tolerance=0.5, gallery=gallery),
+        _PendingRequest(probe_encodings=probes(3), tolerance=0.5, gallery=gallery)
+    ]
+
+    batcher._process(batch)
+
+    # One gallery pass for the whole batch
+    assert gallery.calls == [(3, 0.5)]
+    assert [match['probe'] for match in batch[0].matches] == [1, 2]
+    assert batch[1].matches == []
+    assert [match['probe'] for match in batch[2].matches] == [3]
+
+def test_process_groups_by_gallery_and_tolerance(face_service):
+    tenant_a, tenant_b = RecordingGallery('a'), RecordingGallery('b')
+    batcher = MatchBatcher(tenant_a, face_service)
+    batch = [
+        _PendingRequest(probe_encodings=probes(1), tolerance=0.5, gallery=tenant_a),
+        _PendingRequest(probe_encodings=probes(2), tolerance=0.5, gallery=tenant_b),
+        _PendingRequest(probe_encodings=probes(3), tolerance=0.3, gallery=tenant_a),
+        _PendingRequest(probe_encodings=probes(4), tolerance=0.5, gallery=tenant_a)
+    ]
+
+    batcher._process(batch)
+
+    assert sorted(tenant_a.calls) == [(1, 0.3), (2, 0.5)]
+    assert tenant_b.calls == [(1, 0.5)]
+    assert [(m['gallery'], m['probe'], m['tolerance']) for request in batch for m in request.matches] == [
+        ('a', 1, 0.5), ('b', 2, 0.5), ('a', 3, 0.3), ('a', 4, 0.5)
+    ]
+
+def test_concurrent_callers_get_their_own_matches(monkeypatch, face_service):
+    monkeypatch.setenv('MATCH_BATCH_WINDOW_MS', '20')
+    gallery = RecordingGallery('all')
+    batcher = MatchBatcher(gallery, face_service)
+    for i in range(8):
+        face_service.faces[f'image_{i}.jpg'] = [
+            {'coordinates': [0, 0, 10, 10], 'encoding': vector(i * 10 + face, 0, 0, 0)}
+            for face in range(i % 3 + 1)
+        ]
+
+    results = {}
+
+    def caller(i):
+        results[i] = batcher.encode_and_match(f'image_{i}.jpg', 0.5)
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    for i in range(8):
+        faces, matches = results[i]
+        assert [match['probe'] for match in matches] == [i * 10 + face for face in range(i % 3 + 1)]
+        assert len(matches) == len(faces)
+    assert batcher.stats()['requests'] == 8
+
+def test_expired_deadline_skips_matching(face_service):
+    gallery = RecordingGallery('all')
+    batcher = MatchBatcher(gallery, face_service)
+    face_service.faces['probe.jpg'] = [{'coordinates': [0, 0, 10, 10], 'encoding': vector(1, 0, 0, 0)}]
+    deadline = Deadline(0.001, started=0)
+
+    faces, matches = batcher.encode_and_match('probe.jpg', 0.5, deadline=deadline)
+
+    assert len(faces) == 1
+    assert matches == [None]
+    assert gallery.calls == []
+    assert deadline.skipped == ['match']
+
+def test_unbatched_mode_matches_in_caller_thread(monkeypatch, face_service):
+    monkeypatch.setenv('MATCH_BATCHING', 'false')
+    gallery = RecordingGallery('all')
+    batcher = MatchBatcher(gallery, face_service)
+    face_service.faces['probe.jpg'] = [{'coordinates': [0, 0, 10, 10], 'encoding': np.zeros(4)}]
+
+    faces, matches = batcher.encode_and_match('probe.jpg', 0.5)
+
+    assert len(matches) == 1
+    assert batcher._worker is None
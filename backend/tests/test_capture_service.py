@@ -0,0 +1,35 @@
+import pytest
+from services.capture_service import RequestCapture, summarize_result
+
+def test_detect_results_name_users_only_with_consent():
+    body = {'faces_detected': 2, 'faces': [
+        {'recognition': {'recognized': True, 'user_name': 'alice'}},
+        {'recognition': {'recognized': False, 'message': 'No matching user found'}}
+    ]}
+
+    assert summarize_result('/api/detect', body, include_names=True) == {'faces_detected': 2, 'recognized': ['alice', None]}
+    # Without consent no user names are recorded
+    assert summarize_result('/api/detect', body) == {'faces_detected': 2, 'recognized': [True, False]}
+
+def test_register_results_are_summarized_by_outcome():
+    assert summarize_result('/api/register', {'user_id': 'abc', 'name': 'alice'}) == {'user_id': 'abc'}
+    assert summarize_result('/api/register', {'error': 'Photo is required'}) == {'error': 'Photo is required'}
+    assert summarize_result('/api/register', None) == {'user_id': None}
+
+def test_capture_is_opt_in_and_per_endpoint(monkeypatch):
+    monkeypatch.setenv('CAPTURE_ENABLED', 'false')
+    capture = RequestCapture()
+    assert not capture.should_capture('/api/detect')
+
+    capture.configure(enabled=True, sample_rate=5)
+    assert capture.sample_rate == 1.0
+    assert capture.should_capture('/api/detect')
+    assert not capture.should_capture('/api/users')
+
+def test_enabled_must_be_a_boolean(monkeypatch):
+    monkeypatch.setenv('CAPTURE_ENABLED', 'false')
+    capture = RequestCapture()
+
+    with pytest.raises(TypeError):
+        capture.configure(enabled='false')
+    assert not capture.enabled
@@ -0,0 +1,51 @@
+import numpy as np
+from services.deadline import Deadline
+from services.face_service_opencv import FaceServiceOpenCV
+
+class CountingCascade:
+    def __init__(self):
+        self.calls = 0
+
+    def detectMultiScale(self, image, **params):
+        self.calls += 1
+        return []
+
+class SinglePool:
+    def __init__(self, cascade):
+        self.cascade = cascade
+
+    def get(self):
+        return self.cascade
+
+def test_unbounded_deadline_never_expires():
+    deadline = Deadline()
+
+    assert not deadline.bounded
+    assert deadline.remaining() is None
+    assert not deadline.expired()
+    assert not deadline.partial
+
+def test_expired_deadline_records_each_skip_once():
+    deadline = Deadline(0.5, started=0)
+
+    assert deadline.expired()
+    assert deadline.remaining() == 0.0
+    deadline.skip('match')
+    deadline.skip('match')
+    assert deadline.skipped == ['match']
+    assert deadline.partial
+
+def test_expired_deadline_stops_the_cascade_fallback_chain():
+    service = FaceServiceOpenCV()
+    cascade = CountingCascade()
+    service.detectors = SinglePool(cascade)
+    gray = np.zeros((60, 60), dtype=np.uint8)
+
+    deadline = Deadline(0.5, started=0)
+    assert list(service._detect(gray, {}, deadline)) == []
+    assert cascade.calls == 1
+    assert deadline.skipped == ['detect_fallback']
+
+    cascade.calls = 0
+    service._detect(gray, {}, Deadline())
+    assert cascade.calls == len(FaceServiceOpenCV.DETECTION_PARAMS)
@@ -0,0 +1,36 @@
+import threading
+from services.detector_pool import DetectorPool
+from services.thread_config import native_threads_per_worker
+
+def test_each_thread_gets_its_own_classifier():
+    pool = DetectorPool()
+    main = pool.get()
+    others = []
+
+    def worker():
+        others.append(pool.get())
+        assert pool.get() is others[-1]
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert pool.get() is main
+    assert len({id(cascade) for cascade in others + [main]}) == 4
+    assert pool.stats()['instances'] == 4
+    assert not main.empty()
+
+def test_native_threads_are_shared_across_workers(monkeypatch):
+    monkeypatch.setattr('os.cpu_count', lambda: 16)
+    monkeypatch.delenv('NATIVE_THREADS', raising=False)
+    monkeypatch.setenv('WORKER_PROCESSES', '2')
+    monkeypatch.setenv('WORKER_THREADS', '4')
+    assert native_threads_per_worker() == 2
+
+    monkeypatch.setenv('WORKER_THREADS', '64')
+    assert native_threads_per_worker() == 1
+
+    monkeypatch.setenv('NATIVE_THREADS', '3')
+    assert native_threads_per_worker() == 3
@@ -0,0 +1,59 @@
+import pytest
+from models.database import db_instance
+from services.event_log_service import RecognitionEventLog
+
+@pytest.fixture
+def event_log(monkeypatch):
+    monkeypatch.setenv('RECOGNITION_EVENTS_ENABLED', 'true')
+    monkeypatch.setenv('RECOGNITION_EVENTS_MAX_BUFFER', '3')
+    monkeypatch.setenv('RECOGNITION_EVENTS_BATCH_SIZE', '2')
+    log = RecognitionEventLog()
+    # Flushed explicitly by the tests instead of by the writer thread
+    monkeypatch.setattr(log, '_start', lambda: None)
+    return log
+
+def test_flush_writes_buffered_events_in_batches(event_log):
+    for i in range(3):
+        event_log.record({'operation': 'detect', 'n': i})
+
+    assert event_log.flush()
+    stored = db_instance.get_collection('recognition_events').find({}, {'_id': 0, 'n': 1})
+    assert [event['n'] for event in stored] == [0, 1, 2]
+    assert event_log.stats()['buffered'] == 0
+
+def test_full_buffer_drops_the_oldest_events(event_log):
+    for i in range(5):
+        event_log.record({'n': i})
+
+    assert [event['n'] for event in event_log._buffer] == [2, 3, 4]
+    assert event_log.stats()['dropped'] == 2
+
+def test_full_buffer_can_drop_the_newest_events(event_log):
+    event_log.overflow = 'drop_newest'
+    for i in range(5):
+        event_log.record({'n': i})
+
+    assert [event['n'] for event in event_log._buffer] == [0, 1, 2]
+
+def test_failed_batches_go_back_to_the_buffer(monkeypatch, event_log):
+    event_log.record({'n': 0})
+    event_log.record({'n': 1})
+    monkeypatch.setattr(event_log, '_insert', lambda batch: False)
+
+    assert not event_log.flush()
+    assert [event['n'] for event in event_log._buffer] == [0, 1]
+
+def test_failed_batches_are_spilled_and_replayed(monkeypatch, tmp_path, event_log):
+    event_log.spill_dir = str(tmp_path)
+    event_log.record({'n': 0})
+    insert = event_log._insert
+    monkeypatch.setattr(event_log, '_insert', lambda batch: False)
+
+    assert not event_log.flush()
+    assert len(list(tmp_path.iterdir())) == 1
+    assert event_log.stats()['buffered'] == 0
+
+    monkeypatch.setattr(event_log, '_insert', insert)
+    assert event_log.flush()
+    assert list(tmp_path.iterdir()) == []
+    assert db_instance.get_collection('recognition_events').count_documents({}) == 1
@@ -0,0 +1,32 @@
+import threading
+import services.face_service_loader as loader
+from services.face_service_loader import LazyFaceService
+
+def test_service_is_built_once_on_first_use(monkeypatch, face_service):
+    calls = []
+
+    def create_face_service():
+        calls.append(True)
+        return face_service, 'stub'
+    monkeypatch.setattr(loader, 'create_face_service', create_face_service)
+
+    lazy = LazyFaceService()
+    assert not lazy.is_loaded and calls == []
+
+    threads = [threading.Thread(target=lazy.load) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [True]
+    assert lazy.method == 'stub'
+    # Attributes are forwarded to the real service
+    assert lazy.encoding_tag() == face_service.encoding_tag()
+
+def test_missing_service_is_reported_as_unavailable(monkeypatch):
+    monkeypatch.setattr(loader, 'create_face_service', lambda: (None, 'none'))
+
+    lazy = LazyFaceService()
+    assert not lazy.available
+    assert lazy.method == 'none'
@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+import pytest
+from services import metrics
+from services.face_service_opencv import FaceServiceOpenCV
+
+@pytest.fixture
+def service(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    return FaceServiceOpenCV()
+
+@pytest.fixture
+def photo(tmp_path):
+    path = str(tmp_path / 'photo.png')
+    cv2.imwrite(path, np.random.default_rng(0).integers(0, 256, (120, 160), dtype=np.uint8))
+    return path
+
+def test_enrollment_encodes_the_largest_face_of_the_fallback_chain(monkeypatch, service, photo):
+    calls = []
+
+    def detect(gray, options, deadline=None):
+        calls.append(options)
+        return np.array([[0, 0, 20, 20], [30, 10, 60, 60], [100, 50, 30, 30]])
+
+    monkeypatch.setattr(service, '_detect', detect)
+
+    encoding = service.extract_face_encoding(photo)
+
+    assert calls == [{}]
+    assert encoding['coordinates'] == (30, 10, 60, 60)
+    assert encoding['histogram'].shape == (service.ENCODING_SIZE,)
+
+def test_detection_chain_is_timed_as_the_detect_stage(service, photo):
+    def detect_count():
+        state = metrics.stage_seconds._values.get(('detect',))
+        return state[2] if state else 0
+
+    before = detect_count()
+    metrics.begin_request_timings()
+
+    service._detect(cv2.imread(photo, cv2.IMREAD_GRAYSCALE), {})
+
+    assert detect_count() == before + 1
+    assert list(metrics.request_timings()) == ['detect']
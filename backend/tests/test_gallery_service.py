@@ -0,0 +1,203 @@
+import threading
+import numpy as np
+import pytest
+from conftest import vector
+from services.gallery_service import GalleryService
+
+def enroll(user_model, face_service, name, *encodings, tenant=None):
+    """Register a user with a primary encoding and any further templates"""
+    user_id = user_model.create_user(name, f'{name}.jpg', encodings[0], encoding_tag=face_service.encoding_tag())
+    for index, encoding in enumerate(encodings[1:]):
+        assert user_model.add_face_template(user_id, encoding, f'{name}_{index}.jpg', 5,
+                                            encoding_tag=face_service.encoding_tag())
+    if tenant:
+        user_model.update_user(user_id, {'tenant': tenant})
+    return user_id
+
+@pytest.fixture
+def gallery(user_model, face_service):
+    return GalleryService(user_model, face_service)
+
+def test_matches_every_probe_in_one_pass(user_model, face_service, gallery):
+    alice = enroll(user_model, face_service, 'alice', vector(0, 0, 0, 0))
+    bob = enroll(user_model, face_service, 'bob', vector(10, 0, 0, 0))
+
+    matches = gallery.match([vector(10, 0.1, 0, 0), vector(5, 5, 5, 5), vector(0, 0.2, 0, 0)], tolerance=0.5)
+
+    assert matches[0]['user_id'] == bob
+    assert matches[0]['distance'] == pytest.approx(0.1)
+    assert matches[1] is None
+    assert matches[2]['user_id'] == alice
+    assert matches[2]['confidence'] == pytest.approx(0.8)
+
+def test_unusable_probes_get_no_match(user_model, face_service, gallery):
+    enroll(user_model, face_service, 'alice', vector(0, 0, 0, 0))
+
+    assert gallery.match([None, vector(0, 0, 0, 0)], tolerance=0.5)[0] is None
+    assert gallery.match([None]) == [None]
+
+def test_min_aggregation_uses_closest_template(user_model, face_service, gallery):
+    # Templates far apart: the probe is near one of them but far from their centroid
+    carol = enroll(user_model, face_service, 'carol', vector(0, 0, 0, 0), vector(4, 0, 0, 0))
+
+    distances = gallery.user_distances(np.array([[3.9, 0, 0, 0]]), aggregation='min')
+    assert distances[0, 0] == pytest.approx(0.1)
+    assert gallery.match([vector(3.9, 0, 0, 0)], 0.5, aggregation='min')[0]['user_id'] == carol
+
+    distances = gallery.user_distances(np.array([[3.9, 0, 0, 0]]), aggregation='centroid')
+    assert distances[0, 0] == pytest.approx(1.9)
+    assert gallery.match([vector(3.9, 0, 0, 0)], 0.5, aggregation='centroid') == [None]
+
+def test_padding_slots_never_win(user_model, face_service, gallery):
+    # dave has one template and erin three, so dave's row is padded with zero vectors
+    enroll(user_model, face_service, 'dave', vector(5, 5, 5, 5))
+    enroll(user_model, face_service, 'erin', vector(9, 0, 0, 0), vector(9, 1, 0, 0), vector(9, 2, 0, 0))
+
+    templates, mask = gallery.snapshot()[:2]
+    assert templates.shape == (2, 3, 4)
+    assert mask.tolist() == [[True, False, False], [True, True, True]]
+
+    # A probe at the origin sits exactly on dave's padding
+    assert gallery.match([vector(0, 0, 0, 0)], tolerance=0.5) == [None]
+    distances = gallery.user_distances(np.zeros((1, 4)))
+    assert distances[0, 0] == pytest.approx(10.0)
+
+def test_centroid_ignores_padding(user_model, face_service, gallery):
+    enroll(user_model, face_service, 'frank', vector(2, 0, 0, 0))
+    enroll(user_model, face_service, 'gina', vector(0, 2, 0, 0), vector(0, 4, 0, 0))
+
+    centroids = gallery.snapshot()[2]
+    assert centroids.tolist() == [[2, 0, 0, 0], [0, 3, 0, 0]]
+
+def test_templates_are_capped_per_user(monkeypatch, user_model, face_service):
+    monkeypatch.setenv('MAX_TEMPLATES_PER_USER', '2')
+    gallery = GalleryService(user_model, face_service)
+    user_id = enroll(user_model, face_service, 'hana', vector(0, 0, 0, 0), vector(1, 0, 0, 0), vector(2, 0, 0, 0))
+
+    templates, mask = gallery.snapshot()[:2]
+    assert mask.sum() == 2
+    assert gallery.user_templates(user_id)[1].shape == (2, 4)
+
+def test_missing_encoding_is_encoded_once_and_persisted(user_model, face_service, gallery):
+    user_id = user_model.create_user_simple('ivan', 'ivan.jpg')
+    face_service.encodings['ivan.jpg'] = vector(1, 1, 1, 1)
+
+    assert gallery.match([vector(1, 1, 1, 1)])[0]['user_id'] == user_id
+    stored = user_model.get_user_with_encoding(user_id)
+    assert stored['face_encoding'].tolist() == [1, 1, 1, 1]
+    assert stored['face_encoding_method'] == 'stub'
+    assert 'reencode_claimed_at' not in stored
+
+    gallery.invalidate()
+    gallery.snapshot()
+    assert face_service.extract_calls == ['ivan.jpg']
+
+def test_photo_without_face_is_not_retried(user_model, face_service, gallery):
+    user_id = user_model.create_user_simple('jude', 'jude.jpg')
+
+    gallery.snapshot()
+    stored = user_model.get_user_with_encoding(user_id)
+    assert stored['face_encoding_error'] == face_service.encoding_tag()
+    # The lease is released, and no early rebuild is scheduled for a terminal failure
+    assert 'reencode_claimed_at' not in stored
+    assert not gallery._reencode_pending
+
+    gallery.invalidate()
+    gallery.snapshot()
+    assert gallery.user_templates(user_id) == ('jude', None)
+    assert face_service.extract_calls == ['jude.jpg']
+
+def test_no_face_marker_expires_with_the_encoding_version(user_model, face_service, gallery):
+    user_model.create_user_simple('kira', 'kira.jpg')
+    gallery.snapshot()
+
+    face_service.ENCODING_VERSION = 2
+    face_service.encodings['kira.jpg'] = vector(0, 0, 0, 1)
+    gallery.invalidate()
+
+    assert gallery.match([vector(0, 0, 0, 1)])[0]['user_name'] == 'kira'
+    assert face_service.extract_calls == ['kira.jpg', 'kira.jpg']
+
+def test_user_leased_by_another_process_is_deferred(user_model, face_service, gallery):
+    user_id = user_model.create_user_simple('liam', 'liam.jpg')
+    assert user_model.claim_reencode(user_id)
+
+    gallery.snapshot()
+
+    assert face_service.extract_calls == []
+    assert gallery._reencode_pending
+
+def test_matching_is_not_blocked_by_re_encoding(monkeypatch, user_model, face_service, gallery):
+    alice = enroll(user_model, face_service, 'alice', vector(0, 0, 0, 0))
+    user_model.create_user_simple('bob', 'bob.jpg')
+    face_service.encodings['bob.jpg'] = vector(5, 0, 0, 0)
+    extracting = threading.Event()
+    release = threading.Event()
+    extract = face_service.extract_face_encoding
+
+    def slow_extract(image_path):
+        extracting.set()
+        assert release.wait(5)
+        return extract(image_path)
+
+    monkeypatch.setattr(face_service, 'extract_face_encoding', slow_extract)
+    rebuild = threading.Thread(target=gallery.snapshot)
+    rebuild.start()
+    assert extracting.wait(5)
+
+    # Served by the gallery built without bob while his photo is encoded
+    assert gallery.match([vector(0, 0, 0, 0)])[0]['user_id'] == alice
+    assert gallery.match([vector(5, 0, 0, 0)]) == [None]
+
+    release.set()
+    rebuild.join(5)
+    assert gallery.match([vector(5, 0, 0, 0)])[0]['user_name'] == 'bob'
+    assert face_service.extract_calls == ['bob.jpg']
+
+def test_user_templates_is_a_single_lookup(user_model, face_service, gallery):
+    user_id = enroll(user_model, face_service, 'mona', vector(1, 0, 0, 0), vector(2, 0, 0, 0))
+
+    name, templates = gallery.user_templates(user_id)
+    assert name == 'mona'
+    assert templates.tolist() == [[1, 0, 0, 0], [2, 0, 0, 0]]
+    assert gallery._templates is None
+    assert gallery.user_templates('000000000000000000000000') is None
+
+def test_partition_only_holds_its_tenant(user_model, face_service, gallery):
+    enroll(user_model, face_service, 'nina', vector(0, 0, 0, 0), tenant='acme')
+    olaf = enroll(user_model, face_service, 'olaf', vector(0, 0, 0, 0.1), tenant='globex')
+
+    acme = gallery.partition('acme')
+    assert acme.match([vector(0, 0, 0, 0.1)])[0]['user_name'] == 'nina'
+    assert acme.user_count() == 1
+    assert acme.user_templates(olaf) is None
+    assert gallery.partition(None) is gallery
+    assert gallery.user_count() == 2
+
+def test_partitions_are_evicted_least_recently_used(monkeypatch, user_model, face_service):
+    monkeypatch.setenv('GALLERY_MAX_PARTITIONS', '2')
+    gallery = GalleryService(user_model, face_service)
+
+    first = gallery.partition('a')
+    gallery.partition('b')
+    assert gallery.partition('a') is first
+    gallery.partition('c')
+
+    stats = gallery.partition_stats()
+    assert set(stats['users']) == {'a', 'c'}
+    assert stats['evicted'] == 1
+    assert gallery.partition('a') is first
+
+def test_invalidate_reaches_only_the_given_tenant(user_model, face_service, gallery):
+    acme = gallery.partition('acme')
+    globex = gallery.partition('globex')
+    for built in (gallery, acme, globex):
+        built.snapshot()
+
+    gallery.invalidate('acme')
+    assert acme._dirty and not globex._dirty
+    # The gallery of every user catches up at its periodic rebuild instead
+    assert not gallery._dirty
+
+    gallery.invalidate()
+    assert gallery._dirty and globex._dirty
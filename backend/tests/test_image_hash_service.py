@@ -0,0 +1,59 @@
+import io
+import cv2
+import numpy as np
+from conftest import synthetic_photo
+from services.image_hash_service import ImageHashService
+
+def decode(data):
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def test_reencoded_and_resized_copies_stay_within_the_duplicate_distance():
+    hash_service = ImageHashService()
+    image = decode(synthetic_photo(1))
+    ok, jpeg = cv2.imencode('.jpg', cv2.resize(image, (320, 240)), [cv2.IMWRITE_JPEG_QUALITY, 70])
+
+    original = hash_service.compute_dhash(image)
+    copy = hash_service.compute_dhash(decode(jpeg.tobytes()))
+
+    assert len(original) == 16
+    assert hash_service.hamming_distance(original, copy) <= hash_service.max_distance
+
+def test_different_photos_are_far_apart():
+    hash_service = ImageHashService()
+    first = hash_service.compute_dhash(decode(synthetic_photo(1)))
+    second = hash_service.compute_dhash(decode(synthetic_photo(2)))
+
+    assert hash_service.hamming_distance(first, second) > hash_service.max_distance
+
+def test_hashes_within_seven_bits_share_a_band():
+    hash_service = ImageHashService()
+    image_hash = '0123456789abcdef'
+    # Flip one bit in each of seven bands; the eighth band is untouched
+    flipped = ''.join(
+        format(int(image_hash[i:i + 2], 16) ^ (1 if i < 14 else 0), '02x') for i in range(0, 16, 2)
+    )
+
+    assert hash_service.hamming_distance(image_hash, flipped) == 7
+    assert hash_service.hash_bands(image_hash) == ['0:01', '1:23', '2:45', '3:67', '4:89', '5:ab', '6:cd', '7:ef']
+    assert set(hash_service.hash_bands(image_hash)) & set(hash_service.hash_bands(flipped)) == {'7:ef'}
+
+def test_hash_from_file_rewinds_and_rejects_garbage():
+    hash_service = ImageHashService()
+    upload = io.BytesIO(synthetic_photo(3))
+
+    assert hash_service.compute_hash_from_file(upload) is not None
+    assert upload.tell() == 0
+    assert hash_service.compute_hash_from_file(io.BytesIO(b'not an image')) is None
+
+def test_candidates_are_found_by_band(user_model):
+    hash_service = ImageHashService()
+    image_hash = hash_service.compute_dhash(decode(synthetic_photo(4)))
+    user_model.create_user_simple('alice', 'alice.jpg', image_hash=image_hash,
+                                  image_hash_bands=hash_service.hash_bands(image_hash))
+    other = hash_service.compute_dhash(decode(synthetic_photo(5)))
+    user_model.create_user_simple('bob', 'bob.jpg', image_hash=other, image_hash_bands=hash_service.hash_bands(other))
+
+    candidates = user_model.find_users_by_hash_bands(hash_service.hash_bands(image_hash))
+    assert [candidate['name'] for candidate in candidates] == ['alice']
+    assert candidates[0]['image_hash'] == image_hash
+    assert user_model.find_users_by_hash_bands([]) == []
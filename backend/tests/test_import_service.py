@@ -0,0 +1,123 @@
+import pytest
+from conftest import vector
+from services.checkpoint import JsonlCheckpoint
+from services.file_service import FileService
+from services.image_hash_service import ImageHashService
+from services.import_service import ImportService
+import services.import_service as import_service_module
+
+hash_service = ImageHashService()
+
+def person(name, image_hash, tenant=None, templates=()):
+    user = {
+        'name': name,
+        'image_path': f'{name}.jpg',
+        'face_encoding': vector(0, 0, 0, 0),
+        'image_hash': image_hash,
+        'image_hash_bands': hash_service.hash_bands(image_hash),
+        'face_templates': [
+            {'encoding': vector(0, 0, 0, 0), 'image_path': f'{name}_{i}.jpg', 'image_hash': template_hash}
+            for i, template_hash in enumerate(templates)
+        ]
+    }
+    if tenant:
+        user['tenant'] = tenant
+    return user
+
+@pytest.fixture
+def import_service(user_model):
+    return ImportService(user_model, FileService())
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    return JsonlCheckpoint(str(tmp_path / 'import.checkpoint.jsonl'))
+
+def summary():
+    return {'total': 0, 'imported': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+
+def test_flush_drops_photos_enrolled_under_another_name(import_service, user_model, checkpoint):
+    user_model.create_user_simple('alice', 'alice.jpg', image_hash='ffff0000ffff0000',
+                                  image_hash_bands=hash_service.hash_bands('ffff0000ffff0000'))
+    result = summary()
+
+    # One bit away from alice's photo
+    import_service._flush([person('bob', 'ffff0000ffff0001'), person('carol', '0123456789abcdef')],
+                          [], checkpoint, result)
+
+    assert result['imported'] == 1 and result['failed'] == 1
+    assert result['errors'][0] == {'name': 'bob', 'status': 'failed',
+                                   'error': 'This photo is already registered to another user'}
+    assert user_model.get_user_by_name('bob') is None
+    assert checkpoint.processed == {'bob', 'carol'}
+
+def test_flush_drops_duplicates_within_the_batch(import_service, user_model, checkpoint):
+    result = summary()
+
+    import_service._flush([
+        person('dave', '00000000000000ff'),
+        person('erin', '1111111111111111', templates=['00000000000000fe'])
+    ], [], checkpoint, result)
+
+    assert result['imported'] == 1
+    assert [error['name'] for error in result['errors']] == ['erin']
+    assert user_model.get_user_by_name('dave') is not None
+
+def test_flush_looks_up_enrolled_photos_once_per_batch(monkeypatch, import_service, user_model, checkpoint):
+    lookups = []
+    find = user_model.find_users_by_hash_bands
+    monkeypatch.setattr(user_model, 'find_users_by_hash_bands',
+                        lambda bands, tenant=None: lookups.append(bands) or find(bands, tenant))
+
+    import_service._flush([person('gail', '0000ffff0000ffff', templates=['0f0f0f0f0f0f0f0f']),
+                           person('hank', 'f0f0f0f0f0f0f0f0')], [], checkpoint, summary())
+
+    assert len(lookups) == 1
+    assert len(lookups[0]) == len(set(lookups[0]))
+
+def test_flush_keeps_a_persons_own_photos(import_service, user_model, checkpoint):
+    result = summary()
+
+    import_service._flush([person('fay', 'abcdefabcdefabcd', templates=['abcdefabcdefabce'])], [], checkpoint, result)
+
+    assert result == {'total': 0, 'imported': 1, 'skipped': 0, 'failed': 0, 'errors': []}
+
+def test_flush_stores_the_tenant(import_service, user_model, checkpoint):
+    import_service._flush([person('gus', '1234123412341234', tenant='acme')], [], checkpoint, summary(), 'acme')
+
+    assert user_model.get_user_by_name('gus', 'acme')['tenant'] == 'acme'
+    assert user_model.get_user_by_name('gus') is None
+
+def test_start_import_is_refused_at_the_job_limit(monkeypatch, user_model):
+    monkeypatch.setenv('IMPORT_MAX_CONCURRENT_JOBS', '1')
+    import_service = ImportService(user_model, FileService())
+    import_service.jobs['earlier'] = {'status': 'running'}
+
+    assert import_service.running_jobs() == 1
+    assert import_service.start_import('/nonexistent.zip') is None
+
+    import_service.jobs['earlier']['status'] = 'completed'
+    job_id = import_service.start_import('/nonexistent.zip')
+    assert job_id is not None
+
+def test_run_import_spawns_its_workers(monkeypatch, tmp_path, user_model):
+    contexts = []
+
+    class Pool:
+        def __init__(self, max_workers=None, initializer=None, mp_context=None):
+            contexts.append(mp_context)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            return False
+
+        def map(self, function, tasks, chunksize=1):
+            return []
+
+    monkeypatch.setattr(import_service_module, 'ProcessPoolExecutor', Pool)
+    (tmp_path / 'photos').mkdir()
+
+    ImportService(user_model, FileService()).run_import(str(tmp_path / 'photos'), str(tmp_path / 'checkpoint.jsonl'))
+
+    assert [context.get_start_method() for context in contexts] == ['spawn']
@@ -0,0 +1,46 @@
+import itertools
+import os
+import sys
+import cv2
+import numpy as np
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+from backend.loadtest.harness import LoadTest, distinct_images, parse_mix
+from services.image_hash_service import ImageHashService
+
+def test_synthetic_registrations_are_not_duplicate_photos():
+    hash_service = ImageHashService()
+    images = list(itertools.islice(distinct_images((160, 120)), 40))
+
+    hashes = [hash_service.compute_dhash(cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR))
+              for _, content in images]
+    for first, second in itertools.combinations(hashes, 2):
+        assert hash_service.hamming_distance(first, second) > hash_service.max_distance
+    assert len({name for name, _ in images}) == 40
+
+def test_register_conflicts_count_as_errors():
+    load_test = LoadTest(None, {'register': 1, 'users': 1}, [])
+    load_test.results = [
+        ('register', 0.1, 201, None),
+        ('register', 0.1, 409, None),
+        ('users', 0.1, 200, None),
+        ('users', 0.1, None, 'connection refused')
+    ]
+
+    report = load_test.report(1.0)
+
+    assert report['error_rate'] == 0.5
+    assert report['conflicts'] == 1
+    assert report['operations']['register']['error_rate'] == 0.5
+    assert report['status_counts'] == {'201': 1, '409': 1, '200': 1, 'exception': 1}
+
+def test_parse_mix():
+    assert parse_mix('register=1,detect=8') == {'register': 1.0, 'detect': 8.0}
+    with pytest.raises(ValueError):
+        parse_mix('upload=1')
+    with pytest.raises(ValueError):
+        parse_mix('detect=0')
@@ -0,0 +1,32 @@
+import json
+import logging
+import queue
+from services.logging_service import DroppingQueueHandler, JsonFormatter, RequestIdFilter, set_request_id
+
+def make_record(message='Registration failed', **extra):
+    record = logging.LogRecord('facedetection.test', logging.INFO, __file__, 1, message, (), None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+def test_json_lines_carry_the_request_id_and_extra_fields():
+    set_request_id('req-1')
+    record = make_record(user_id='abc')
+    RequestIdFilter().filter(record)
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry['message'] == 'Registration failed'
+    assert entry['level'] == 'INFO'
+    assert entry['request_id'] == 'req-1'
+    assert entry['user_id'] == 'abc'
+    set_request_id(None)
+
+def test_full_queue_drops_records_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+
+    handler.enqueue(make_record())
+    handler.enqueue(make_record())
+
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
@@ -0,0 +1,49 @@
+import time
+from services import metrics
+from services.metrics import Counter, Gauge, MetricsRegistry
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    requests = registry.counter('requests_total', 'Requests', ('endpoint',))
+    latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+    registry.gauge('queue_depth', 'Queue depth', function=lambda: 3)
+
+    requests.inc(endpoint='/api/detect')
+    requests.inc(2, endpoint='/api/detect')
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    lines = registry.render().splitlines()
+    assert '# TYPE requests_total counter' in lines
+    assert 'requests_total{endpoint="/api/detect"} 3' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'latency_seconds_count 3' in lines
+    assert 'queue_depth 3' in lines
+
+def test_label_values_are_escaped():
+    counter = Counter('errors_total', 'Errors', ('message',))
+    counter.inc(message='say "hi"\n')
+
+    assert counter.render()[-1] == 'errors_total{message="say \\"hi\\"\\n"} 1'
+
+def test_failing_gauge_function_renders_no_sample():
+    gauge = Gauge('broken', 'Broken', function=lambda: 1 / 0)
+    assert gauge.render() == ['# HELP broken Broken', '# TYPE broken gauge']
+
+def test_stage_timings_are_collected_per_request():
+    metrics.record_timing('detect', 1.0)
+    metrics._request_timings.set(None)
+    assert metrics.request_timings() == {}
+
+    metrics.begin_request_timings()
+    metrics.record_timing('detect', 0.25)
+    metrics.record_timing('detect', 0.25)
+    with metrics.stage_timer('match'):
+        time.sleep(0.001)
+
+    timings = metrics.request_timings()
+    assert timings['detect'] == 0.5
+    assert timings['match'] > 0
@@ -0,0 +1,60 @@
+import json
+import pytest
+from services.checkpoint import JsonlCheckpoint
+from services.migration_service import MigrationService
+
+@pytest.fixture
+def migration(user_model, face_service):
+    return MigrationService(user_model, face_service)
+
+class NoThrottle:
+    def wait(self, writes):
+        pass
+
+def update(user_id, face_service):
+    return {'user_id': user_id, 'encoding_tag': face_service.encoding_tag(), 'face_encoding': None, 'templates': {}}
+
+def summary():
+    return {'migrated': 0, 'failed': 0, 'errors': []}
+
+def test_flush_checkpoints_only_migrated_users(monkeypatch, tmp_path, migration, face_service):
+    monkeypatch.setattr(migration.user_model, 'apply_encoding_updates', lambda updates: True)
+    checkpoint = JsonlCheckpoint(str(tmp_path / 'migration.jsonl'), key='user_id')
+    result = summary()
+
+    migration._flush([update('a', face_service)], [{'user_id': 'b', 'status': 'failed', 'error': 'No face'}],
+                     checkpoint, NoThrottle(), result)
+
+    assert checkpoint.processed == {'a'}
+    assert result['migrated'] == 1 and result['failed'] == 1
+    records = [json.loads(line) for line in open(checkpoint.path)]
+    assert records == [{'user_id': 'a', 'status': 'migrated', 'method': 'stub', 'version': 1}]
+
+def test_flush_leaves_unwritten_batches_for_a_retry(monkeypatch, tmp_path, migration, face_service):
+    monkeypatch.setattr(migration.user_model, 'apply_encoding_updates', lambda updates: False)
+    checkpoint = JsonlCheckpoint(str(tmp_path / 'migration.jsonl'), key='user_id')
+    result = summary()
+
+    migration._flush([update('a', face_service)], [], checkpoint, NoThrottle(), result)
+
+    assert checkpoint.processed == set()
+    assert result['migrated'] == 0
+    assert result['errors'] == [{'user_id': 'a', 'status': 'failed', 'error': 'Database write failed'}]
+
+def test_checkpoint_is_per_method_and_version(monkeypatch, tmp_path, migration, face_service):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'encoding_migration.stub-v1.checkpoint.jsonl').write_text(json.dumps({'user_id': 'old'}) + '\n')
+    excluded = []
+
+    def find_users_needing_reencode(tag, exclude_ids=None):
+        excluded.append(set(exclude_ids))
+        return iter([])
+    monkeypatch.setattr(migration.user_model, 'find_users_needing_reencode', find_users_needing_reencode)
+
+    migration.run()
+    face_service.ENCODING_VERSION = 2
+    result = migration.run()
+
+    # Users migrated to v1 are not skipped when migrating to v2
+    assert excluded == [{'old'}, set()]
+    assert result['version'] == 2
@@ -0,0 +1,37 @@
+import pytest
+from config import Config
+from services.profile_service import ProfileService
+
+def test_request_profile_wins_over_tenant_and_default():
+    profiles = ProfileService(default_profile='balanced', tenant_profiles={'acme': 'fast'})
+
+    assert profiles.resolve('accurate', 'acme')[0] == 'accurate'
+    assert profiles.resolve(None, 'acme')[0] == 'fast'
+    assert profiles.resolve(None, 'globex')[0] == 'balanced'
+
+def test_unknown_profiles_are_rejected():
+    profiles = ProfileService(tenant_profiles={})
+
+    with pytest.raises(ValueError):
+        profiles.resolve('turbo')
+    assert ProfileService(default_profile='turbo', tenant_profiles={}).default_profile == 'balanced'
+
+def test_resolved_profiles_are_copies():
+    profiles = ProfileService(tenant_profiles={})
+
+    _, profile = profiles.resolve('fast')
+    profile['tolerance']['opencv'] = 0
+    assert profiles.resolve('fast')[1]['tolerance']['opencv'] != 0
+
+def test_default_profile_runs_at_full_resolution():
+    assert Config.PIPELINE_PROFILES['balanced']['max_dimension'] is None
+    assert Config.PIPELINE_PROFILES['balanced']['cascade_passes'] == 4
+
+def test_tolerance_and_pipeline_options():
+    profiles = ProfileService(tenant_profiles={})
+    _, profile = profiles.resolve('accurate')
+
+    assert 'tolerance' not in profiles.pipeline_options(profile)
+    assert profiles.tolerance(profile, 'opencv') == pytest.approx(Config.OPENCV_RECOGNITION_TOLERANCE - 0.1)
+    assert profiles.tolerance({'tolerance': 0.3}, 'opencv') == 0.3
+    assert profiles.tolerance({}, 'opencv') is None
@@ -0,0 +1,65 @@
+import pytest
+from services.quality_controller import QualityController
+
+class QueueStub:
+    def __init__(self, depth=0):
+        self.depth = depth
+
+    def stats(self):
+        return {'queue_depth': self.depth}
+
+@pytest.fixture
+def controller(monkeypatch):
+    monkeypatch.setenv('QUALITY_TARGET_P95_MS', '100')
+    monkeypatch.setenv('QUALITY_COOLDOWN_SECONDS', '0')
+    monkeypatch.setenv('QUALITY_MIN_SAMPLES', '5')
+    monkeypatch.setenv('QUALITY_HIGH_QUEUE_DEPTH', '4')
+    return QualityController(QueueStub())
+
+def test_steps_down_when_p95_exceeds_the_target(controller):
+    for _ in range(4):
+        controller.record(0.5)
+    assert controller.level == 0
+
+    controller.record(0.5)
+    assert controller.level == 1
+
+def test_steps_down_when_the_queue_backs_up(controller):
+    controller.admission_controller.depth = 4
+    controller.record(0.01)
+    assert controller.level == 1
+
+def test_steps_back_up_once_recovered(controller):
+    for _ in range(5):
+        controller.record(0.5)
+    assert controller.level == 1
+
+    for _ in range(5):
+        controller.record(0.01)
+    assert controller.level == 0
+    assert controller.stats()['step_ups'] == 1
+
+def test_cooldown_holds_the_level(controller):
+    controller.cooldown_seconds = 60
+    controller.admission_controller.depth = 10
+    controller._changed_at = float('-inf')
+    controller.record(0.01)
+    controller.record(0.01)
+    assert controller.level == 1
+
+def test_options_only_make_a_profile_cheaper(controller):
+    controller._level = 2
+
+    options = controller.options({'cascade_passes': 4, 'max_dimension': 640, 'num_jitters': 5, 'upsample': 1})
+    assert options == {'cascade_passes': 1, 'max_dimension': 640, 'num_jitters': 1, 'upsample': 1,
+                       'detection_model': 'hog'}
+
+    # A full-resolution profile (max_dimension None) is capped by the level
+    assert controller.options({'max_dimension': None})['max_dimension'] == 800
+
+def test_disabled_controller_leaves_options_alone(monkeypatch):
+    monkeypatch.setenv('QUALITY_ADAPTIVE', 'false')
+    controller = QualityController()
+    controller._level = 3
+
+    assert controller.options({'cascade_passes': 4}) == {'cascade_passes': 4}
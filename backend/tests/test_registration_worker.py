@@ -0,0 +1,38 @@
+import pytest
+from conftest import vector
+from services.gallery_service import GalleryService
+from services.registration_worker import RegistrationWorker
+
+@pytest.fixture
+def worker(user_model, face_service):
+    return RegistrationWorker(user_model, face_service, GalleryService(user_model, face_service))
+
+def test_pending_user_becomes_ready_and_matchable(user_model, face_service, worker):
+    user_id = user_model.create_user_simple('alice', 'alice.jpg', registration_status='pending')
+    gallery = worker.gallery_service
+    assert gallery.match([vector(1, 0, 0, 0)]) == [None]
+
+    face_service.faces['alice.jpg'] = [{'coordinates': [0, 0, 10, 10], 'encoding': vector(1, 0, 0, 0)}]
+    face_service.encodings['alice.jpg'] = vector(1, 0, 0, 0)
+    worker._process(user_id, 'alice.jpg')
+
+    assert user_model.get_user_by_id(user_id)['registration_status'] == 'ready'
+    assert gallery.match([vector(1, 0, 0, 0)])[0]['user_id'] == user_id
+    assert worker.stats()['completed'] == 1
+
+def test_photo_without_a_face_fails_the_registration(user_model, worker):
+    user_id = user_model.create_user_simple('bob', 'bob.jpg', registration_status='pending')
+
+    worker._process(user_id, 'bob.jpg')
+
+    user = user_model.get_user_by_id(user_id)
+    assert user['registration_status'] == 'failed'
+    assert user['registration_error'] == 'No face detected in photo'
+    assert worker.stats()['failed'] == 1
+
+def test_pending_users_are_not_matched_or_lazily_encoded(user_model, face_service, worker):
+    user_model.create_user_simple('carol', 'carol.jpg', registration_status='pending')
+    face_service.encodings['carol.jpg'] = vector(1, 0, 0, 0)
+
+    assert worker.gallery_service.match([vector(1, 0, 0, 0)]) == [None]
+    assert face_service.extract_calls == []
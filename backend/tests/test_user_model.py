@@ -0,0 +1,128 @@
+import pytest
+from conftest import vector
+from models.user import DuplicateUserError
+
+TAG = {'method': 'stub', 'version': 1}
+
+def test_add_face_template_stops_at_the_cap(user_model):
+    user_id = user_model.create_user('alice', 'alice.jpg', vector(0, 0, 0, 0), encoding_tag=TAG)
+
+    # The registration photo is the first of max_templates=3
+    assert user_model.add_face_template(user_id, vector(1, 0, 0, 0), 'a1.jpg', 3, encoding_tag=TAG)
+    assert user_model.add_face_template(user_id, vector(2, 0, 0, 0), 'a2.jpg', 3, encoding_tag=TAG)
+    assert not user_model.add_face_template(user_id, vector(3, 0, 0, 0), 'a3.jpg', 3, encoding_tag=TAG)
+
+    templates = user_model.get_user_with_encoding(user_id)['face_templates']
+    assert [template['image_path'] for template in templates] == ['a1.jpg', 'a2.jpg']
+    assert templates[0]['method'] == 'stub'
+
+def test_add_face_template_without_room_for_extras(user_model):
+    user_id = user_model.create_user('bob', 'bob.jpg', vector(0, 0, 0, 0))
+
+    assert not user_model.add_face_template(user_id, vector(1, 0, 0, 0), 'b1.jpg', 1)
+    assert not user_model.add_face_template('000000000000000000000000', vector(1, 0, 0, 0), 'x.jpg', 5)
+
+def test_add_face_template_extends_hash_bands(user_model):
+    user_id = user_model.create_user('carl', 'carl.jpg', vector(0, 0, 0, 0),
+                                     image_hash='00000000000000ff', image_hash_bands=['0:00', '7:ff'])
+
+    user_model.add_face_template(user_id, vector(1, 0, 0, 0), 'c1.jpg', 5,
+                                 image_hash='ab00000000000000', image_hash_bands=['0:ab', '7:00'])
+
+    assert [user['name'] for user in user_model.find_users_by_hash_bands(['0:ab'])] == ['carl']
+    stored = user_model.collection.find_one({'name': 'carl'})
+    assert sorted(stored['image_hash_bands']) == ['0:00', '0:ab', '7:00', '7:ff']
+
+def test_duplicate_names_are_rejected_by_the_unique_index(user_model):
+    user_model.create_user_simple('dana', 'dana.jpg')
+
+    with pytest.raises(DuplicateUserError):
+        user_model.create_user_simple('dana', 'dana2.jpg')
+    with pytest.raises(DuplicateUserError):
+        user_model.create_user('dana', 'dana3.jpg', vector(0, 0, 0, 0))
+    assert user_model.collection.count_documents({'name': 'dana'}) == 1
+
+def test_names_and_photo_lookups_are_scoped_to_the_tenant(user_model):
+    acme = user_model.create_user_simple('dora', 'dora.jpg', image_hash='00000000000000ff',
+                                         image_hash_bands=['0:00', '7:ff'], tenant='acme')
+    globex = user_model.create_user_simple('dora', 'dora2.jpg', tenant='globex')
+
+    with pytest.raises(DuplicateUserError):
+        user_model.create_user_simple('dora', 'dora3.jpg', tenant='acme')
+    assert user_model.get_user_by_name('dora', 'globex')['_id'] == globex
+    assert [user['_id'] for user in user_model.find_users_by_hash_bands(['0:00'], 'acme')] == [acme]
+    assert user_model.find_users_by_hash_bands(['0:00'], 'globex') == []
+    assert user_model.find_users_by_hash_bands(['0:00']) == []
+
+def test_ensure_indexes_replaces_the_global_unique_name_index(user_model):
+    user_model.collection.drop_indexes()
+    user_model.collection.create_index('name', unique=True)
+
+    user_model.ensure_indexes()
+
+    user_model.create_user_simple('dora', 'dora.jpg', tenant='acme')
+    user_model.create_user_simple('dora', 'dora2.jpg', tenant='globex')
+    assert user_model.collection.count_documents({'name': 'dora'}) == 2
+
+def test_name_cache_confirms_hits_and_forgets_deleted_names(user_model):
+    user_model.load_name_cache()
+    user_id = user_model.create_user_simple('eve', 'eve.jpg')
+
+    assert user_model.find_cached_name('eve')['_id'] == user_id
+    assert user_model.find_cached_name('nobody') is None
+    assert user_model.find_cached_name('eve', 'acme') is None
+
+    # Deleted behind the cache's back (e.g. by another process)
+    user_model.collection.delete_many({'name': 'eve'})
+    assert user_model.find_cached_name('eve') is None
+    assert 'eve' not in user_model._names
+
+def test_insert_users_reports_only_inserted_names(user_model):
+    user_model.create_user_simple('fay', 'fay.jpg')
+
+    inserted = user_model.insert_users([
+        {'name': 'gus', 'image_path': 'gus.jpg', 'tenant': 'acme', 'face_encoding': vector(0, 0, 0, 0),
+         'encoding_tag': TAG},
+        {'name': 'fay', 'image_path': 'fay2.jpg'}
+    ])
+
+    assert inserted == ['gus']
+    gus = user_model.collection.find_one({'name': 'gus'})
+    assert gus['tenant'] == 'acme'
+    assert gus['face_encoding_method'] == 'stub'
+
+def test_registration_status_lifecycle(user_model):
+    ready = user_model.create_user_simple('hal', 'hal.jpg', registration_status='pending', tenant='acme')
+    failed = user_model.create_user_simple('ida', 'ida.jpg', registration_status='pending')
+
+    pending = user_model.find_pending_registrations()
+    assert {user['_id'] for user in pending} == {ready, failed}
+    assert next(user for user in pending if user['_id'] == ready)['tenant'] == 'acme'
+
+    user_model.complete_registration(ready, vector(1, 2, 3, 4), TAG)
+    user_model.fail_registration(failed, 'No faces detected in the image')
+
+    assert user_model.find_pending_registrations() == []
+    hal = user_model.get_user_with_encoding(ready)
+    assert hal['registration_status'] == 'ready'
+    assert hal['face_encoding'].tolist() == [1, 2, 3, 4]
+    assert user_model.get_user_by_id(failed)['registration_error'] == 'No faces detected in the image'
+
+def test_reencode_lease_is_exclusive_until_released(user_model):
+    user_id = user_model.create_user_simple('jon', 'jon.jpg')
+
+    assert user_model.claim_reencode(user_id)
+    assert not user_model.claim_reencode(user_id)
+    user_model.release_reencode(user_id)
+    assert user_model.claim_reencode(user_id)
+
+def test_find_users_needing_reencode(user_model):
+    current = user_model.create_user('kim', 'kim.jpg', vector(0, 0, 0, 0), encoding_tag=TAG)
+    stale = user_model.create_user('lou', 'lou.jpg', vector(0, 0, 0, 0), encoding_tag={'method': 'stub', 'version': 0})
+    stale_template = user_model.create_user('max', 'max.jpg', vector(0, 0, 0, 0), encoding_tag=TAG)
+    user_model.add_face_template(stale_template, vector(0, 0, 0, 0), 'max1.jpg', 5, encoding_tag={'method': 'old', 'version': 1})
+
+    found = {user['_id'] for user in user_model.find_users_needing_reencode(TAG)}
+    assert found == {stale, stale_template}
+    assert current not in found
+    assert {user['_id'] for user in user_model.find_users_needing_reencode(TAG, exclude_ids={stale})} == {stale_template}